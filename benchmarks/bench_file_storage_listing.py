@@ -0,0 +1,110 @@
+"""Compares existence checks in FileStorage on a simulated high latency file system (e.g. an SMB share).
+
+Every os.stat and os.scandir call on the target directory is delayed by --latency milliseconds. The script compares one
+exists() per resource (the old behaviour) with one listing per target directory and package, and with the directory
+listings cached by FileStorage for the whole run. The size of already existing files is compared using
+os.DirEntry.stat, which is free on Windows but not counted here.
+
+    python benchmarks/bench_file_storage_listing.py --packages 200 --files 5 --days 10 --latency 2
+"""
+import argparse
+import contextlib
+import os
+import pathlib
+import tempfile
+import time
+
+from svea_data_manager.frameworks import FileStorage, Package, Resource
+
+
+@contextlib.contextmanager
+def simulated_latency(root_directory, latency):
+    counter = dict(round_trips=0)
+    original_stat = os.stat
+    original_scandir = os.scandir
+
+    def delay(path):
+        if str(path).startswith(root_directory):
+            counter['round_trips'] += 1
+            time.sleep(latency)
+
+    def stat(path, *args, **kwargs):
+        delay(path)
+        return original_stat(path, *args, **kwargs)
+
+    def scandir(path='.'):
+        delay(path)
+        return original_scandir(path)
+
+    os.stat = stat
+    os.scandir = scandir
+    try:
+        yield counter
+    finally:
+        os.stat = original_stat
+        os.scandir = original_scandir
+
+
+def create_packages(source_directory, target_directory, nr_packages, nr_files, nr_days):
+    packages = []
+    for nr in range(nr_packages):
+        day_directory = pathlib.PurePosixPath('IFCB', 'data_raw', 'D2024', f'D202401{nr % nr_days + 1:02d}')
+        package = Package(f'D2024_{nr}', instrument='IFCB')
+        for file_nr in range(nr_files):
+            name = f'D2024_{nr}_{file_nr}.txt'
+            path = pathlib.Path(source_directory, name)
+            path.write_text(name)
+            resource = Resource(source_directory, name)
+            resource.target_path = day_directory / name
+            package.resources.add(resource)
+            # Every second package is already in the storage.
+            if nr % 2:
+                target_path = pathlib.Path(target_directory, resource.target_path)
+                target_path.parent.mkdir(parents=True, exist_ok=True)
+                target_path.write_text(name)
+        packages.append(package)
+    return packages
+
+
+def check_with_exists(storage, packages):
+    return sum(storage._resolve_path(resource.target_path).exists()
+               for package in packages for resource in package.resources)
+
+
+def check_with_listing_per_package(storage, packages):
+    nr_existing = 0
+    for package in packages:
+        storage.clear_directory_listings()
+        nr_existing += sum(item.action != 'copy' for item in storage.plan(package).items)
+    return nr_existing
+
+
+def check_with_cached_listings(storage, packages):
+    storage.clear_directory_listings()
+    return sum(item.action != 'copy' for package in packages for item in storage.plan(package).items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packages', type=int, default=200)
+    parser.add_argument('--files', type=int, default=5, help='Files per package')
+    parser.add_argument('--days', type=int, default=10, help='Number of target directories')
+    parser.add_argument('--latency', type=float, default=2, help='Latency in ms per file system call')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as source_directory, tempfile.TemporaryDirectory() as target_directory:
+        packages = create_packages(source_directory, target_directory, args.packages, args.files, args.days)
+        storage = FileStorage(target_directory)
+        for name, func in [('exists() per file', check_with_exists),
+                           ('listing per package', check_with_listing_per_package),
+                           ('cached listings', check_with_cached_listings)]:
+            with simulated_latency(str(storage._root_directory), args.latency / 1000) as counter:
+                t0 = time.perf_counter()
+                nr_existing = func(storage, packages)
+                duration = time.perf_counter() - t0
+            print(f'{name:<22}{duration:8.3f} s {counter["round_trips"]:8d} round trips '
+                  f'{nr_existing:6d} existing')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import itertools
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+SVN_EXECUTABLES = ['svnadmin', 'svn', 'svnmucc']
+TMPFS_DIRECTORY = '/dev/shm'
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench-scale', type=int, default=1,
+                     help='Multiplies the size of the synthetic datasets used in the benchmarks')
+    parser.addoption('--bench-filesystem', action='append', default=[], metavar='DIRECTORY',
+                     help='Directory on another file system (e.g. a loopback mounted btrfs or XFS image) to run the '
+                          'copy benchmarks on. Can be given several times.')
+
+
+def pytest_generate_tests(metafunc):
+    # The copy benchmarks run on the file system of tmp_path, on tmpfs if available and on the given file systems.
+    if 'filesystem_root' in metafunc.fixturenames:
+        roots = [None]
+        if os.path.isdir(TMPFS_DIRECTORY):
+            roots.append(TMPFS_DIRECTORY)
+        roots.extend(metafunc.config.getoption('--bench-filesystem'))
+        metafunc.parametrize('filesystem_root', roots, ids=['tmp' if root is None else root for root in roots])
+
+
+@pytest.fixture
+def scale(request):
+    return max(1, request.config.getoption('--bench-scale'))
+
+
+@pytest.fixture
+def svn_repo_factory(tmp_path):
+    """Function creating empty local subversion repositories with svnadmin. Returns the URL to the repository."""
+    missing = [name for name in SVN_EXECUTABLES if not shutil.which(name)]
+    if missing:
+        pytest.skip(f'Subversion executables not found: {", ".join(missing)}')
+    counter = itertools.count()
+
+    def create():
+        path = tmp_path / f'svn_repo_{next(counter)}'
+        subprocess.run(['svnadmin', 'create', str(path)], check=True, capture_output=True)
+        return path.as_uri()
+
+    return create
+
+
+@pytest.fixture
+def svn_repo_url(svn_repo_factory):
+    return svn_repo_factory()
+
+
+@pytest.fixture(autouse=True)
+def sdm_directories(tmp_path, monkeypatch):
+    """Keeps temp files and caches of the benchmarked code out of the home directory"""
+    from svea_data_manager import helpers
+    monkeypatch.setattr(helpers, 'TEMP_DIRECTORY', tmp_path / 'sdm_temp')
+    monkeypatch.setattr(helpers, 'CACHE_DIRECTORY', tmp_path / 'sdm_cache')
+
+
+class SimpleBenchmark:
+    """Minimal stand-in for the benchmark fixture of pytest-benchmark. Runs the function a few rounds and prints the
+    best time. Install pytest-benchmark to get statistics, saved runs and comparison between runs."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __call__(self, func, *args, **kwargs):
+        return self.pedantic(func, args=args, kwargs=kwargs)
+
+    def pedantic(self, func, args=(), kwargs=None, setup=None, rounds=3, iterations=1, warmup_rounds=0):
+        durations = []
+        result = None
+        for nr in range(warmup_rounds + rounds):
+            call_args, call_kwargs = args, kwargs or {}
+            if setup:
+                call_args, call_kwargs = setup() or (args, kwargs or {})
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = func(*call_args, **call_kwargs)
+            if nr >= warmup_rounds:
+                durations.append((time.perf_counter() - start) / iterations)
+        print(f'\n{self._name}: min {min(durations):.4f} s, max {max(durations):.4f} s ({rounds} rounds)')
+        return result
+
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark(request):
+        return SimpleBenchmark(request.node.name)
@@ -0,0 +1,97 @@
+"""Generators of synthetic source trees that look like the output of the instruments on a cruise. File content is
+dummy data of the given size, only names and directory layout are realistic."""
+import datetime
+import pathlib
+
+START_TIME = datetime.datetime(2024, 1, 10, 6, 0)
+
+
+def _write(path, size, text=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if text is not None:
+        path.write_text(text)
+    else:
+        path.write_bytes(b'\x00' * size)
+    return path
+
+
+def make_ctd_tree(root, nr_casts=10, file_size=1024):
+    """SBE casts: raw files and up/down cast cnv files. Example: SBE09_1387_20240110_0600_77SE_01_0001.hex"""
+    root = pathlib.Path(root)
+    for nr in range(nr_casts):
+        time = START_TIME + datetime.timedelta(hours=6 * nr)
+        stem = f'SBE09_1387_{time:%Y%m%d_%H%M}_77SE_01_{nr + 1:04d}'
+        for suffix in ['.hex', '.hdr', '.bl', '.btl', '.ros', '.xmlcon']:
+            _write(root / 'raw' / f'{stem}{suffix}', file_size)
+        _write(root / 'cnv' / f'{stem}.cnv', file_size)
+        _write(root / 'cnv' / f'u{stem}.cnv', file_size)
+    return root
+
+
+def make_mvp_tree(root, nr_transects=2, nr_casts=10, file_size=1024):
+    """MVP casts under SMHI_ cruise directories with one directory per transect and a RAWDATA sub directory"""
+    root = pathlib.Path(root)
+    for transect_nr in range(nr_transects):
+        transect = f'T{transect_nr + 1}'
+        directory = root / 'MVP' / 'SMHI_2024_01' / transect
+        for nr in range(nr_casts):
+            time = START_TIME + datetime.timedelta(minutes=30 * (transect_nr * nr_casts + nr))
+            stem = f'MVP_{time:%Y-%m-%d_%H%M%S}'
+            for suffix in ['.raw', '.log', '.m1']:
+                _write(directory / 'RAWDATA' / f'{stem}{suffix}', file_size)
+            _write(directory / f'{stem}_{transect}-B.cnv', file_size)
+            _write(directory / f'd{stem}_{transect}-B.cnv', file_size)
+            _write(directory / f'{stem}_{transect}-B.jpg', file_size)
+    return root
+
+
+def make_ferrybox_tree(root, nr_days=10, file_size=1024):
+    """Ferrybox daily files: All_sensors, GPS and CO2FT device data"""
+    root = pathlib.Path(root)
+    for nr in range(nr_days):
+        date = START_TIME + datetime.timedelta(days=nr)
+        _write(root / 'Ferrybox' / f'All_sensors_{date:%Y-%m-%d}.txt', file_size)
+        _write(root / 'Ferrybox' / 'Working' / 'GPS' / f'GPS_{date:%Y%m%d}.txt', file_size)
+        _write(root / 'Ferrybox' / 'Working' / 'CO2FT_A' / f'CO2FT {date:%Y%m%d} 120000.txt', file_size)
+    return root
+
+
+def make_adcp_tree(root, nr_files=10, file_size=1024, cruises=(('01', '2022/01/11'), ('03', '2022/02/09'))):
+    """ADCP raw files per cruise with a LOG file holding the start date, processed files and a readme"""
+    root = pathlib.Path(root)
+    for cruise, date_str in cruises:
+        for nr in range(nr_files):
+            stem = f'ADCPOS150_77SE_2022_{cruise}_000_{nr:05d}'
+            _write(root / 'raw' / cruise / f'{stem}.LOG', 0, text=f'header\nstart {date_str} 12:00\n')
+            _write(root / 'raw' / cruise / f'{stem}.ENX', file_size)
+            _write(root / 'raw' / cruise / f'{stem}.STA', file_size)
+        processed = root / f'ADCPOS150_77SE_2022_{cruise}_processed' / 'OS_LTA'
+        for sub_dir in ['BB', 'NB']:
+            _write(processed / sub_dir / f'contour_{sub_dir}.nc', file_size)
+            _write(processed / sub_dir / f'vector_{sub_dir}.png', file_size)
+    _write(root / 'readme.txt', 0, text='readme')
+    return root
+
+
+def make_ifcb_tree(root, nr_samples=20, file_size=1024, instrument='IFCB134'):
+    """IFCB D...T..._IFCB... triplets (adc, hdr, roi) per sample, classifier mat files and summary files"""
+    root = pathlib.Path(root)
+    for nr in range(nr_samples):
+        time = START_TIME + datetime.timedelta(minutes=20 * nr)
+        stem = f'D{time:%Y%m%dT%H%M%S}_{instrument}'
+        directory = root / 'data' / f'{time:%Y}' / f'D{time:%Y%m%d}'
+        _write(directory / f'{stem}.adc', file_size)
+        _write(directory / f'{stem}.roi', file_size)
+        _write(directory / f'{stem}.hdr', 0, text=make_hdr_content(time))
+        _write(root / 'class' / f'{time:%Y}' / f'{stem}_class_v1.mat', file_size)
+    _write(root / 'summary' / 'biovolume.csv', file_size)
+    _write(root / 'summary' / 'classcount.csv', file_size)
+    return root
+
+
+def make_hdr_content(time, nr_extra_fields=60):
+    lines = [f'softwareVersion: Imaging FlowCytobot Acquisition Software version 2.4.6.3',
+             f'sampleTime: {time:%Y-%m-%d %H:%M:%S}']
+    lines.extend(f'field{nr}: {nr * 0.5}' for nr in range(nr_extra_fields))
+    lines.extend(['gpsLatitude: 57.1234', 'gpsLongitude: 11.5678'])
+    return '\n'.join(lines) + '\n'
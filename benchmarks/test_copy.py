@@ -0,0 +1,51 @@
+"""Benchmarks of the copy strategies of FileStorage (reflink, copy_file_range, sendfile and buffered) on the file
+system of tmp_path, on tmpfs and on the file systems given with --bench-filesystem. Strategies that are not supported
+on a file system are skipped."""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from svea_data_manager.frameworks import file_copy
+
+FILE_SIZE = 8 * 1024 * 1024
+NR_FILES = 8
+
+
+@pytest.fixture
+def copy_directory(tmp_path, filesystem_root):
+    if filesystem_root is None:
+        yield tmp_path
+        return
+    directory = Path(tempfile.mkdtemp(prefix='sdm_bench_copy_', dir=filesystem_root))
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.mark.parametrize('strategy', file_copy.COPY_STRATEGIES)
+def test_copy_strategy(benchmark, copy_directory, scale, strategy):
+    source_directory = copy_directory / 'source'
+    target_directory = copy_directory / 'target'
+    source_directory.mkdir()
+    target_directory.mkdir()
+    sources = []
+    for nr in range(NR_FILES * scale):
+        path = source_directory / f'file_{nr}.bin'
+        path.write_bytes(os.urandom(FILE_SIZE))
+        sources.append(path)
+
+    try:
+        file_copy.copy_file(sources[0], target_directory / sources[0].name, [strategy])
+    except (OSError, file_copy.CopyStrategyNotSupported) as e:
+        pytest.skip(f'{strategy} is not supported on {copy_directory}: {e}')
+
+    def copy():
+        return [file_copy.copy_file(path, target_directory / path.name, [strategy]) for path in sources]
+
+    strategies = benchmark(copy)
+    assert set(strategies) == {strategy}
+    assert (target_directory / sources[-1].name).stat().st_size == FILE_SIZE
@@ -0,0 +1,40 @@
+"""Benchmark of IFCBSummaryFile: loading a mat summary file, hdr files and classifier mat files"""
+import pytest
+
+import generators
+
+np = pytest.importorskip('numpy')
+scipy_io = pytest.importorskip('scipy.io')
+
+CLASSES = [f'taxon_{nr}' for nr in range(50)]
+
+
+def _make_summary_tree(root, nr_samples):
+    source = generators.make_ifcb_tree(root, nr_samples=nr_samples)
+    ids = sorted(path.stem for path in source.rglob('*.hdr'))
+    for path in source.rglob('*_class_v1.mat'):
+        scipy_io.savemat(path, dict(classifierName='C:\\classifiers\\Baltic_Trees_v1'))
+    summary_path = root / 'summary' / 'summary_allTB_2024.mat'
+    scipy_io.savemat(summary_path, dict(
+        filelist=np.array([dict(name=f'{_id}.roi') for _id in ids], dtype=object),
+        ml_analyzed=np.full(len(ids), 5.0),
+        class2use=np.array(CLASSES, dtype=object),
+        classcount=np.ones((len(ids), len(CLASSES))),
+        classbiovol=np.full((len(ids), len(CLASSES)), 0.5),
+    ))
+    return summary_path
+
+
+def test_create_summary_file(benchmark, tmp_path, scale):
+    from ifcb.ifcb_summary import create_summary_file
+
+    root = tmp_path / 'source'
+    summary_path = _make_summary_tree(root, 100 * scale)
+    output_path = tmp_path / 'summary.txt'
+    benchmark(create_summary_file,
+              mat_summary_file_path=summary_path,
+              hdr_root_directory=root / 'data',
+              mat_root_directory=root / 'class',
+              output_file_path=output_path,
+              overwrite=True)
+    assert output_path.exists()
@@ -0,0 +1,31 @@
+"""Import time of the package, measured in a fresh interpreter with python -X importtime. That heavy modules are not
+imported is tested in tests/test_imports.py."""
+import os
+import subprocess
+import sys
+
+
+def _run_python(code, *options):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    return subprocess.run([sys.executable, *options, '-c', code], env=env, check=True, capture_output=True,
+                          text=True)
+
+
+def _get_import_times(stderr):
+    """Returns a dict with module name as key and cumulative import time in microseconds as value"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time(benchmark):
+    def import_package():
+        return _get_import_times(_run_python('import svea_data_manager', '-X', 'importtime').stderr)
+
+    times = benchmark(import_package)
+    print(f'\nimport svea_data_manager: {times["svea_data_manager"] / 1000:.1f} ms')
+
@@ -0,0 +1,78 @@
+"""Benchmarks of the read phase: discovery of source files and classification of them into resources and packages.
+The read_packages benchmarks run with and without the persistent classification cache. With the cache, only the first
+round classifies the files."""
+import pytest
+
+import generators
+from svea_data_manager.instruments.adcp import ADCP
+from svea_data_manager.instruments.ctd import CTDResource
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.instruments.ifcb import IFCB
+from svea_data_manager.instruments.mvp import MVPResource
+
+
+with_classification_cache = pytest.mark.parametrize('classification_cache', [False, True], ids=['uncached', 'cached'])
+
+
+def _relative_files(root):
+    return [path.relative_to(root) for path in root.rglob('*') if path.is_file()]
+
+
+@pytest.fixture
+def ifcb_instrument(tmp_path, scale):
+    source = generators.make_ifcb_tree(tmp_path / 'source', nr_samples=200 * scale)
+    target = tmp_path / 'target'
+    target.mkdir()
+    return IFCB(dict(source_directory=str(source), target_directory=str(target)))
+
+
+def test_source_files(benchmark, ifcb_instrument, scale):
+    files = benchmark(lambda: ifcb_instrument.source_files)
+    assert len(files) == 200 * scale * 4 + 2
+
+
+@with_classification_cache
+def test_read_packages_ifcb(benchmark, ifcb_instrument, classification_cache):
+    ifcb_instrument.config['classification_cache'] = classification_cache
+    benchmark(ifcb_instrument.read_packages)
+    assert len(ifcb_instrument.packages) > 0
+
+
+@with_classification_cache
+def test_read_packages_adcp(benchmark, tmp_path, scale, classification_cache):
+    source = generators.make_adcp_tree(tmp_path / 'source', nr_files=100 * scale)
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument = ADCP(dict(source_directory=str(source), target_directory=str(target),
+                           classification_cache=classification_cache))
+    benchmark(instrument.read_packages)
+    assert len(instrument.packages) > 0
+
+
+@with_classification_cache
+def test_read_packages_ferrybox(benchmark, tmp_path, scale, classification_cache):
+    source = generators.make_ferrybox_tree(tmp_path / 'source', nr_days=100 * scale)
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument = Ferrybox(dict(source_directory=str(source), target_directory=str(target),
+                               classification_cache=classification_cache))
+    benchmark(instrument.read_packages)
+    assert len(instrument.packages) > 0
+
+
+@pytest.mark.parametrize('make_tree, resource_class', [
+    (generators.make_ctd_tree, CTDResource),
+    (generators.make_mvp_tree, MVPResource),
+], ids=['ctd', 'mvp'])
+def test_classify_svn_instruments(benchmark, tmp_path, scale, make_tree, resource_class):
+    # CTD and MVP write to subversion and can not be created without svn, so the resource classes are used directly.
+    source = make_tree(tmp_path / 'source')
+    for nr in range(1, scale):
+        make_tree(tmp_path / 'source' / f'copy_{nr}')
+    files = _relative_files(source)
+
+    def classify():
+        return [resource_class.from_source_file(source, path) for path in files]
+
+    resources = benchmark(classify)
+    assert any(resources)
@@ -0,0 +1,48 @@
+"""Benchmarks of whole runs, phased (SveaDataManager.run) and pipelined (SveaDataManager.run_pipelined) with and
+without streaming of the packages. Every file written to the storage gets a simulated latency as for a network share,
+so that the benefit of overlapping the phases shows also on a fast local disk."""
+import itertools
+import time
+
+import pytest
+
+import generators
+from svea_data_manager import SveaDataManager
+from svea_data_manager.frameworks import FileStorage
+
+WRITE_LATENCY = 0.002
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def slow_file_storage(monkeypatch):
+    write_file = FileStorage._write_file
+
+    def _write_file(*args):
+        time.sleep(WRITE_LATENCY)
+        return write_file(*args)
+
+    monkeypatch.setattr(FileStorage, '_write_file', staticmethod(_write_file))
+
+
+@pytest.mark.parametrize('mode', ['phased', 'pipelined', 'streamed'])
+def test_run_ifcb_and_ferrybox(benchmark, tmp_path, scale, slow_file_storage, mode):
+    sources = dict(IFCB=generators.make_ifcb_tree(tmp_path / 'ifcb', nr_samples=50 * scale),
+                   Ferrybox=generators.make_ferrybox_tree(tmp_path / 'ferrybox', nr_days=30 * scale))
+
+    def setup():
+        config = {}
+        for name, source in sources.items():
+            target = tmp_path / f'target_{next(_counter)}'
+            target.mkdir()
+            config[name] = dict(source_directory=str(source), target_directory=str(target))
+        return (SveaDataManager.from_config(config),), {}
+
+    def run(sdm):
+        if mode == 'phased':
+            sdm.run()
+        else:
+            sdm.run_pipelined(transform_workers=2, stream=mode == 'streamed')
+
+    benchmark.pedantic(run, setup=setup, rounds=3)
@@ -0,0 +1,41 @@
+"""Benchmarks of the transform phase: hdr parsing and metadata files for IFCB, start dates and cruises for ADCP"""
+import pytest
+
+import generators
+from ifcb.hdr_file import read_hdr_table
+from svea_data_manager.instruments.adcp import ADCP
+from svea_data_manager.instruments.ifcb import IFCB
+
+
+def _read_instrument(instrument_class, source, tmp_path, **config):
+    target = tmp_path / 'target'
+    target.mkdir(exist_ok=True)
+    instrument = instrument_class(dict(source_directory=str(source), target_directory=str(target), **config))
+    instrument.read_packages()
+    return instrument
+
+
+@pytest.mark.parametrize('transform_workers', [1, 4])
+def test_transform_ifcb(benchmark, tmp_path, scale, transform_workers):
+    source = generators.make_ifcb_tree(tmp_path / 'source', nr_samples=200 * scale)
+
+    def setup():
+        return (_read_instrument(IFCB, source, tmp_path, transform_workers=transform_workers),), {}
+
+    benchmark.pedantic(lambda instrument: instrument.transform_packages(), setup=setup, rounds=3)
+
+
+def test_transform_adcp(benchmark, tmp_path, scale):
+    source = generators.make_adcp_tree(tmp_path / 'source', nr_files=100 * scale)
+
+    def setup():
+        return (_read_instrument(ADCP, source, tmp_path),), {}
+
+    benchmark.pedantic(lambda instrument: instrument.transform_packages(), setup=setup, rounds=3)
+
+
+def test_read_hdr_table(benchmark, tmp_path, scale):
+    source = generators.make_ifcb_tree(tmp_path / 'source', nr_samples=500 * scale)
+    paths = sorted(source.rglob('*.hdr'))
+    table = benchmark(read_hdr_table, paths, ['gpsLatitude', 'gpsLongitude', 'sampleTime'])
+    assert len(table['path']) == len(paths)
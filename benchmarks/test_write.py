@@ -0,0 +1,116 @@
+"""Benchmarks of the write phase to file storage and to a local subversion repository"""
+import itertools
+
+import pytest
+
+import generators
+from svea_data_manager.frameworks import FileStorage, Package, SubversionStorage
+from svea_data_manager.instruments.ctd import CTDResource
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.instruments.ifcb import IFCB
+
+_counter = itertools.count()
+
+
+def _ifcb_instrument(source, tmp_path, **config):
+    target = tmp_path / f'target_{next(_counter)}'
+    target.mkdir()
+    instrument = IFCB(dict(source_directory=str(source), target_directory=str(target), **config))
+    instrument.read_packages()
+    instrument.transform_packages()
+    return instrument
+
+
+def _ctd_packages(source):
+    packages = {}
+    for path in sorted(source.rglob('*')):
+        if not path.is_file():
+            continue
+        resource = CTDResource.from_source_file(source, path.relative_to(source))
+        if not resource:
+            continue
+        package = packages.setdefault(resource.package_key, Package(resource.package_key, instrument='CTD'))
+        package.resources.add(resource)
+    return list(packages.values())
+
+
+STORAGE_CONFIGS = {
+    'files': {},
+    'containers': dict(container_storage=True),
+    'compressed': dict(compressed_storage=True),
+}
+
+
+@pytest.mark.parametrize('storage', list(STORAGE_CONFIGS))
+@pytest.mark.parametrize('write_workers', [1, 4])
+def test_write_ifcb_to_file_storage(benchmark, tmp_path, scale, write_workers, storage):
+    if storage == 'compressed':
+        pytest.importorskip('zstandard')
+    source = generators.make_ifcb_tree(tmp_path / 'source', nr_samples=100 * scale, file_size=16 * 1024)
+
+    def setup():
+        return (_ifcb_instrument(source, tmp_path, write_workers=write_workers, **STORAGE_CONFIGS[storage]),), {}
+
+    benchmark.pedantic(lambda instrument: instrument.write_packages(), setup=setup, rounds=3)
+
+
+def test_plan_ifcb_already_in_file_storage(benchmark, tmp_path, scale):
+    # Second run over the same data: every file already exists in the storage.
+    source = generators.make_ifcb_tree(tmp_path / 'source', nr_samples=200 * scale)
+    instrument = _ifcb_instrument(source, tmp_path)
+    instrument.write_packages()
+
+    storage = instrument.get_storage(next(iter(instrument.packages)))
+
+    def plan():
+        storage.clear_directory_listings()
+        return instrument.plan_packages()
+
+    plan = benchmark(plan)
+    assert all(not package_plan.items_to_copy for key, package_plan in plan.items() if not key.startswith('result'))
+
+
+def test_append_to_grown_ferrybox_files(benchmark, tmp_path, scale):
+    # Intra-day run: the daily All_sensors and CO2FT files have grown since they were written.
+    source = generators.make_ferrybox_tree(tmp_path / 'source', nr_days=10 * scale, file_size=1024 * 1024)
+    target = tmp_path / 'target'
+    target.mkdir()
+    config = dict(source_directory=str(source), target_directory=str(target))
+    instrument = Ferrybox(config)
+    instrument.read_packages()
+    instrument.write_packages()
+    grown = sorted(source.rglob('All_sensors_*')) + sorted(source.rglob('CO2FT *'))
+
+    def setup():
+        for path in grown:
+            with open(path, 'ab') as fid:
+                fid.write(b'0' * 4096)
+        instrument = Ferrybox(config)
+        instrument.read_packages()
+        return (instrument,), {}
+
+    benchmark.pedantic(lambda instrument: instrument.write_packages(), setup=setup, rounds=3)
+    assert all(next(target.rglob(path.name)).stat().st_size == path.stat().st_size for path in grown)
+
+
+def test_plan_ctd_in_subversion(benchmark, tmp_path, scale, svn_repo_url):
+    source = generators.make_ctd_tree(tmp_path / 'source', nr_casts=20 * scale)
+    packages = _ctd_packages(source)
+    storage = SubversionStorage(svn_repo_url)
+    storage.write(packages[0])
+
+    def plan():
+        storage.clear_directory_listings()
+        return [storage.plan(package) for package in packages]
+
+    benchmark(plan)
+
+
+def test_write_ctd_to_subversion(benchmark, tmp_path, scale, svn_repo_factory):
+    source = generators.make_ctd_tree(tmp_path / 'source', nr_casts=5 * scale)
+    packages = _ctd_packages(source)
+
+    def setup():
+        return (SubversionStorage(svn_repo_factory()),), {}
+
+    benchmark.pedantic(lambda storage: [storage.write(package) for package in packages], setup=setup, rounds=3)
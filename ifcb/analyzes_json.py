@@ -1,12 +1,10 @@
 from __future__ import annotations
 import pathlib
-import pandas as pd
-import numpy as np
 import datetime
 from ifcb.basin import BasinIterator
-from shapely import Point
 import json
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +23,7 @@ class IfcbJsonFormat:
         self._load_file()
 
     def _load_file(self):
+        import pandas as pd
         self._df = pd.read_csv(path, sep='\t')
         self._day_data = {}
         for g in self._df.groupby('filelist'):
@@ -113,14 +112,14 @@ class DayData:
     @property
     def lat(self):
         value = self._df['lat'].values[0]
-        if np.isnan(value):
+        if math.isnan(value):
             value = None
         return value
 
     @property
     def lon(self):
         value = self._df['lon'].values[0]
-        if np.isnan(value):
+        if math.isnan(value):
             value = None
         return value
 
@@ -130,6 +129,7 @@ class DayData:
 
     @property
     def point(self) -> Point:
+        from shapely import Point
         return Point(float(self.lon), float(self.lat))
 
     @property
@@ -175,6 +175,7 @@ if __name__ == '__main__':
     obj = IfcbJsonFormat(path, basin_geojson_file=basin_file)
     obj.create_files(export_dir)
 
+    import pandas as pd
     df = pd.read_csv(path, sep='\t')
     dd = list(df.groupby('filelist'))
     tmp, d = dd[0]
@@ -1,8 +1,19 @@
+import functools
+import json
 import pathlib
 import shutil
+import tarfile
 
 RAW_SUFFIXES = ['.adc', '.hdr', '.roi', '.txt']
 
+# Day containers written by svea_data_manager ContainerStorage: data_raw/D<year>/D<date>.tar with an index beside it
+CONTAINER_SUFFIX = '.tar'
+INDEX_SUFFIX = '.index.json'
+
+# Files compressed by svea_data_manager CompressedFileStorage: <name>.zst listed in a manifest in the directory
+ZSTD_SUFFIX = '.zst'
+MANIFEST_NAME = '.sdm_manifest.json'
+
 
 class DataRaw:
     def __init__(self, root_directory: pathlib.Path | str):
@@ -11,16 +22,20 @@ class DataRaw:
             self._directory = pathlib.Path(self._directory, 'data_raw')
         if not self._directory.exists():
             raise NotADirectoryError(self._directory)
+        self._containers = {}
+        self._manifests = {}
 
     @property
     def directory(self) -> pathlib.Path:
         return self._directory
 
     def get_paths_for_keys(self, *keys) -> list[tuple[pathlib.Path, pathlib.Path]]:
+        """Returns (source path, relative target path) for the raw files of the keys that are stored as separate
+        files. Files stored compressed are given by get_compressed_paths_for_keys and files stored in day containers
+        by get_container_members_for_keys"""
         paths = []
         for key in keys:
-            time, instrument = key.split('_')
-            rel_target_parent = pathlib.Path(time[:5], time[:9])
+            rel_target_parent = self._get_rel_parent(key)
             parent = self.directory / rel_target_parent
             for suffix in RAW_SUFFIXES:
                 name = f'{key}{suffix}'
@@ -31,13 +46,147 @@ class DataRaw:
                 paths.append((path, rel_target_path))
         return paths
 
+    def get_compressed_paths_for_keys(self, *keys) -> list[tuple[pathlib.Path, pathlib.Path]]:
+        """Returns (path to the compressed object, relative target path) for the raw files of the keys that are
+        stored compressed with zstd"""
+        paths = []
+        for key in keys:
+            rel_target_parent = self._get_rel_parent(key)
+            parent = self.directory / rel_target_parent
+            manifest = self._get_manifest(parent)
+            for suffix in RAW_SUFFIXES:
+                name = f'{key}{suffix}'
+                if (parent / name).exists():
+                    continue
+                item = manifest.get(name)
+                path = parent / (item['object'] if item else f'{name}{ZSTD_SUFFIX}')
+                if not path.exists():
+                    continue
+                paths.append((path, rel_target_parent / name))
+        return paths
+
+    def _get_manifest(self, directory: pathlib.Path) -> dict:
+        if directory not in self._manifests:
+            try:
+                with open(directory / MANIFEST_NAME, encoding='utf8') as fid:
+                    self._manifests[directory] = json.load(fid)['files']
+            except (OSError, ValueError, KeyError):
+                self._manifests[directory] = {}
+        return self._manifests[directory]
+
+    def get_container_members_for_keys(self, *keys) -> list[tuple['DayContainer', str, pathlib.Path]]:
+        """Returns (container, member name, relative target path) for the raw files of the keys that are stored in
+        day containers and not as separate files"""
+        members = []
+        for key in keys:
+            rel_target_parent = self._get_rel_parent(key)
+            container = self._get_container(self.directory / rel_target_parent)
+            if not container:
+                continue
+            for suffix in RAW_SUFFIXES:
+                name = f'{key}{suffix}'
+                if (self.directory / rel_target_parent / name).exists():
+                    continue
+                if (self.directory / rel_target_parent / f'{name}{ZSTD_SUFFIX}').exists():
+                    continue
+                if name not in container.members:
+                    continue
+                members.append((container, name, rel_target_parent / name))
+        return members
+
+    @staticmethod
+    def _get_rel_parent(key: str) -> pathlib.Path:
+        time, instrument = key.split('_')
+        return pathlib.Path(time[:5], time[:9])
+
+    def _get_container(self, day_directory: pathlib.Path) -> 'DayContainer | None':
+        if day_directory not in self._containers:
+            path = day_directory.with_name(f'{day_directory.name}{CONTAINER_SUFFIX}')
+            self._containers[day_directory] = DayContainer(path) if path.exists() else None
+        return self._containers[day_directory]
+
     def copy_keys_to_data_directory(self, keys: list[str], directory: pathlib.Path | str) -> int:
+        # (function writing the file to a given path, relative target path)
+        items = [(functools.partial(shutil.copy2, source_path), rel_target_path)
+                 for source_path, rel_target_path in self.get_paths_for_keys(*keys)]
+        items.extend((functools.partial(decompress_file, source_path), rel_target_path)
+                     for source_path, rel_target_path in self.get_compressed_paths_for_keys(*keys))
+        items.extend((functools.partial(container.extract_member, name), rel_target_path)
+                     for container, name, rel_target_path in self.get_container_members_for_keys(*keys))
         nr = 0
-        for nr, (source_path, rel_target_path) in enumerate(self.get_paths_for_keys(*keys)):
+        for nr, (write_file, rel_target_path) in enumerate(items):
             target_path = pathlib.Path(directory, rel_target_path)
             if target_path.exists():
                 raise FileExistsError(target_path)
             target_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(source_path, target_path)
+            write_file(target_path)
         return nr + 1
 
+
+def decompress_file(source_path: pathlib.Path | str, target_path: pathlib.Path | str) -> None:
+    """Decompresses the zstd file source_path to target_path, streamed in chunks"""
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f'zstandard is needed to read the compressed file {source_path}. '
+                          f'Install it with: pip install zstandard')
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        zstandard.ZstdDecompressor().copy_stream(source, target)
+
+
+class DayContainer:
+    """Read access to an uncompressed tar file with the raw files of one day. Members are read at the offsets given
+    in the index file beside the tar file. Without an index the tar file is scanned."""
+
+    def __init__(self, path: pathlib.Path | str):
+        self._path = pathlib.Path(path)
+        self._index_path = self._path.with_name(f'{self._path.name}{INDEX_SUFFIX}')
+        self._members = None
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    @property
+    def members(self) -> dict[str, tuple[int, int]]:
+        """Dict with member name as key and (offset, size) as value"""
+        if self._members is None:
+            self._members = self._read_members()
+        return self._members
+
+    def _read_members(self) -> dict[str, tuple[int, int]]:
+        try:
+            with open(self._index_path, encoding='utf8') as fid:
+                return {name: tuple(item) for name, item in json.load(fid)['members'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        members = {}
+        file_size = self._path.stat().st_size
+        try:
+            with tarfile.open(self._path, 'r:') as tar:
+                for info in tar:
+                    if info.offset_data + info.size > file_size:
+                        # Incomplete member left by an interrupted append
+                        break
+                    if info.isfile():
+                        members[info.name] = (info.offset_data, info.size)
+        except tarfile.ReadError:
+            pass
+        return members
+
+    def read_member(self, name: str) -> bytes:
+        offset, size = self.members[name]
+        with open(self._path, 'rb') as fid:
+            fid.seek(offset)
+            return fid.read(size)
+
+    def extract_member(self, name: str, target_path: pathlib.Path | str) -> None:
+        offset, size = self.members[name]
+        with open(self._path, 'rb') as source, open(target_path, 'wb') as target:
+            source.seek(offset)
+            while size > 0:
+                data = source.read(min(size, 1024 * 1024))
+                if not data:
+                    raise EOFError(f'{name} is truncated in {self._path}')
+                target.write(data)
+                size -= len(data)
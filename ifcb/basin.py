@@ -4,8 +4,6 @@ from pathlib import Path
 from functools import cached_property
 import json
 
-from shapely.geometry import Point, shape
-
 
 @dataclass
 class Basin:
@@ -15,6 +13,7 @@ class Basin:
 
     @classmethod
     def from_feature(cls, feature) -> Basin:
+        from shapely.geometry import shape
         name = feature['properties']['name']
         id = feature['properties']['id']
         geometry = shape(feature['geometry'])
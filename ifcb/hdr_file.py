@@ -1,9 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
 import logging
-import time
-import csv
+import os
 logger = logging
 
+NOT_AVAILABLE = 'N/A'
+
+POSITION_KEYS = ('gpsLatitude', 'gpsLongitude')
+
+
+def read_hdr_fields(path, keys=None):
+    """Reads "key: value" fields from a hdr-file as strings. Only the first colon on each line separates key and
+    value so values containing colons (timestamps etc.) are kept intact. If keys are given, only those fields are
+    returned and reading stops as soon as all of them are found."""
+    keys = set(keys) if keys else None
+    fields = {}
+    with open(path, errors='replace') as fid:
+        for line in fid:
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key = key.strip()
+            if keys is not None and key not in keys:
+                continue
+            fields[key] = value.strip()
+            if keys is not None and len(fields) == len(keys):
+                break
+    return fields
+
+
+def convert_hdr_value(value):
+    """Converts a hdr-file value string to int, float, bool or None (for N/A). Other values are returned as is"""
+    if value == NOT_AVAILABLE:
+        return None
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    for typ in (int, float):
+        try:
+            return typ(value)
+        except ValueError:
+            pass
+    return value
+
+
+def read_hdr_table(paths, keys, max_workers=None):
+    """Reads the given keys from many hdr-files using a thread pool. Returns a columnar table as a dict with the
+    column "path" and one column per key. Missing fields are given as None."""
+    paths = [Path(path) for path in paths]
+    keys = list(keys)
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    table = dict(path=paths)
+    for key in keys:
+        table[key] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for fields in executor.map(lambda path: read_hdr_fields(path, keys), paths):
+            for key in keys:
+                value = fields.get(key)
+                table[key].append(None if value is None else convert_hdr_value(value))
+    return table
+
 
 class HdrFile:
 
@@ -13,10 +69,6 @@ class HdrFile:
             msg = f'{self._path} is not a hdr-file'
             logger.error(msg)
             raise Exception(msg)
-        self._lat = None
-        self._lon = None
-
-        self._save_info()
 
     @property
     def path(self):
@@ -24,11 +76,11 @@ class HdrFile:
 
     @property
     def lat(self):
-        return self._lat
+        return self._position['gpsLatitude']
 
     @property
     def lon(self):
-        return self._lon
+        return self._position['gpsLongitude']
 
     @property
     def metadata(self):
@@ -40,16 +92,24 @@ class HdrFile:
             meta['quality_flag'] = 'B'
         return meta
 
-    def _save_info(self):
-        with open(self._path) as fid:
-            reader = csv.reader(fid, delimiter=':')
-            data = {row[0]: row[1] for row in reader}
-        self._lat = data.get('gpsLatitude')
-        self._lon = data.get('gpsLongitude')
-        if self._lat == 'N/A':
-            self._lat = ''
-        if self._lon == 'N/A':
-            self._lon = ''
+    @cached_property
+    def fields(self):
+        """All fields in the hdr-file converted with convert_hdr_value. Reads the whole file on first access."""
+        return {key: convert_hdr_value(value) for key, value in read_hdr_fields(self._path).items()}
+
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+    @cached_property
+    def _position(self):
+        data = read_hdr_fields(self._path, POSITION_KEYS)
+        position = {}
+        for key in POSITION_KEYS:
+            value = data.get(key)
+            if value == NOT_AVAILABLE:
+                value = ''
+            position[key] = value
+        return position
 
 
 
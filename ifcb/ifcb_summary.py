@@ -1,6 +1,4 @@
-import scipy.io
 import pathlib
-import numpy as np
 import os
 import logging
 import datetime
@@ -174,6 +172,7 @@ class IFCBSummaryFile:
                 self._all_data.append(common_line[:] + [taxon, 'classifier_run_date', date])
 
     def _load_mat_summary_data(self):
+        import scipy.io
         self._mat_summary_data = scipy.io.loadmat(self._mat_summary_path, simplify_cells=True)
 
         self._id_list = [file['name'].split('.')[0] for file in self._mat_summary_data[FILE_PAR]]
@@ -1,6 +1,5 @@
 from pathlib import Path
 import logging
-import scipy
 
 logger = logging
 
@@ -27,12 +26,14 @@ class ClassifierMatFile:
         return self._classifier_name
 
     def _save_info(self):
+        import scipy.io
         mat = scipy.io.loadmat(self.path, simplify_cells=True)
         self._classifier_name = Path(mat['classifierName']).name
 
 
 def load_individual_mat_files(self, directory):
     """Individual mat-files are result from the classification"""
+    import scipy.io
     self._classifiers = {}
     for root, dirs, files in os.walk(directory, topdown=False):
         for name in files:
@@ -1,20 +1,42 @@
+import functools
 import logging
 import os
 import string
 
-import yaml
-
 from svea_data_manager.frameworks import Instrument
+from svea_data_manager.frameworks import CancellationToken
+from svea_data_manager.frameworks import WritePlan
 from svea_data_manager import helpers
-from svea_data_manager.sdm_event import post_event
+from svea_data_manager.sdm_event import post_event, run_context
+from svea_data_manager.sdm_instrumentation import SDMInstrumentation, timed
 
 logger = logging.getLogger(__name__)
 
+INSTRUMENTATION_CONFIG_KEY = 'instrumentation'
+
+# Top level keys in the config that are not instruments
+RESERVED_CONFIG_KEYS = [INSTRUMENTATION_CONFIG_KEY]
+
+
+def _in_run_context(method):
+    """Posts the events of the method, and of the threads it starts, as events of the run of the manager"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with run_context(self):
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class SveaDataManager:
 
-    def __init__(self, instruments=[]):
+    def __init__(self, instruments=[], instrumentation=None):
         self._instruments = {}
+        self._cancel_token = CancellationToken()
+        self._instrumentation = instrumentation
+        if instrumentation:
+            # Only the events of this manager are counted, also when several managers run at the same time.
+            instrumentation.run = self
+        self._watcher = None
 
         for instrument in instruments:
             self.register_instrument(instrument)
@@ -34,6 +56,7 @@ class SveaDataManager:
             raise ValueError(msg)
         
         self._instruments[instrument_type] = instrument
+        instrument.cancel_token = self._cancel_token
         post_event('log', dict(msg=f'Instrument registered: {instrument_type}'))
     
     def unregister_instrument(self, instrument):
@@ -64,73 +87,177 @@ class SveaDataManager:
     def instruments(self):
         return list(self._instruments.values())
 
+    @property
+    def instrumentation(self):
+        """SDMInstrumentation collecting timers and counters of the run. None if not configured."""
+        return self._instrumentation
+
+    @property
+    def cancel_token(self):
+        return self._cancel_token
+
+    def cancel(self):
+        """Requests all registered instruments to stop. Can be called from another thread than the one running."""
+        post_event('log', dict(msg=f'Cancelling run'))
+        self._cancel_token.cancel()
+
+    @_in_run_context
     def read_packages(self, **kwargs):
         post_event('before_read_packages')
         post_event('log', dict(msg=f'Reading packages...'))
         for instrument in self.instruments:
-            instrument.read_packages(**kwargs)
+            with timed('read', instrument.name):
+                instrument.read_packages(**kwargs)
         post_event('after_read_packages')
 
+    @_in_run_context
     def transform_packages(self, **kwargs):
         post_event('before_transform_packages')
         post_event('log', dict(msg=f'Transforming packages...'))
         for instrument in self.instruments:
-            instrument.transform_packages(**kwargs)
+            with timed('transform', instrument.name):
+                instrument.transform_packages(**kwargs)
         post_event('after_transform_packages')
 
-    def write_packages(self):
+    @_in_run_context
+    def write_packages(self, clear_temp_dir=True, resume=False):
         post_event('before_write_packages')
         post_event('log', dict(msg=f'Writing packages...'))
         for instrument in self.instruments:
-            instrument.write_packages()
-        helpers.clear_temp_dir()
+            with timed('write', instrument.name):
+                instrument.write_packages(resume=resume)
+        if clear_temp_dir:
+            helpers.clear_temp_dir()
         post_event('after_write_packages')
 
-    def run(self):
+    @_in_run_context
+    def plan(self):
+        """Reads and transforms the packages and returns a WritePlan telling what write_packages would do. Nothing
+        is written. The plan can be reviewed and then written with execute."""
+        post_event('log', dict(msg=f'Planning run'))
+        self.read_packages()
+        self.transform_packages()
+        return self.plan_packages()
+
+    @_in_run_context
+    def plan_packages(self):
+        """Returns a WritePlan for the packages already read and transformed"""
+        plan = WritePlan()
+        for instrument in self.instruments:
+            for package_plan in instrument.plan_packages().values():
+                plan.add(instrument.name, package_plan)
+        return plan
+
+    @_in_run_context
+    def execute(self, plan, clear_temp_dir=True, resume=False):
+        """Writes the packages in a WritePlan made by plan"""
+        post_event('before_write_packages')
+        post_event('log', dict(msg=f'Writing planned packages...'))
+        for instrument in self.instruments:
+            with timed('write', instrument.name):
+                instrument.write_packages(resume=resume, plan=plan.get_instrument_plan(instrument.name))
+        if clear_temp_dir:
+            helpers.clear_temp_dir()
+        post_event('after_write_packages')
+
+    @_in_run_context
+    def run(self, resume=False):
         post_event('log', dict(msg=f'Running all'))
         # Step 1 - extract packages for each registered instrument.
         self.read_packages()
         # Step 2 - transform packages for each registered instrument.
         self.transform_packages()
         # Step 3 - load packages for each registered instrument.
-        self.write_packages()
+        self.write_packages(resume=resume)
 
-    @classmethod
-    def from_config(cls, config):
-        instance = cls()
+    @_in_run_context
+    def run_pipelined(self, resume=False, transform_workers=2, queue_size=50, clear_temp_dir=True, stream=True):
+        """Same as run but the read, transform and write phases overlap. Packages are passed on through bounded
+        queues as soon as they are ready for the next phase. With stream=True, instruments that support it are read
+        one directory at a time and their packages are released when written. See sdm_pipeline.Pipeline."""
+        from svea_data_manager.sdm_pipeline import Pipeline
 
-        import svea_data_manager.instruments
+        post_event('log', dict(msg=f'Running all pipelined'))
+        Pipeline(self, transform_workers=transform_workers, queue_size=queue_size, resume=resume,
+                 stream=stream).run()
+        if clear_temp_dir:
+            helpers.clear_temp_dir()
 
-        instruments = {instrument.name.upper(): instrument for instrument in Instrument.__subclasses__()}
+    @_in_run_context
+    def watch(self, **kwargs):
+        """Archives files continuously as they appear in the source directories of the registered instruments.
+        Blocks until stop_watch or cancel is called. See sdm_watch.Watcher for the keyword arguments."""
+        from svea_data_manager.sdm_watch import Watcher
 
-        for instrument_type in config:
-            try:
-                instrument_cls = instruments[instrument_type.upper()]
-            except AttributeError:
-                msg = f'Could not resolve instrument class for key {instrument_type} found in config.'
-                logger.error(msg)
-                raise ValueError(msg)
+        post_event('log', dict(msg=f'Starting watch'))
+        self._watcher = Watcher(self, **kwargs)
+        try:
+            self._watcher.run()
+        finally:
+            self._watcher = None
+            if self._instrumentation:
+                self._instrumentation.finish()
+        post_event('log', dict(msg=f'Watch stopped'))
+
+    def stop_watch(self):
+        """Stops a running watch after the packages collected so far have been written. Can be called from
+        another thread or a signal handler."""
+        if self._watcher:
+            self._watcher.stop()
 
+    @classmethod
+    def from_config(cls, config):
+        instrumentation = None
+        if config.get(INSTRUMENTATION_CONFIG_KEY):
+            instrumentation = SDMInstrumentation.from_config(config[INSTRUMENTATION_CONFIG_KEY])
+        instance = cls(instrumentation=instrumentation)
+
+        for instrument_type in config:
+            if instrument_type in RESERVED_CONFIG_KEYS:
+                continue
+            instrument_cls = cls._get_instrument_class(instrument_type)
             instrument = instrument_cls(config[instrument_type])
             instance.register_instrument(instrument)
 
         return instance
 
+    @staticmethod
+    def _get_instrument_class(instrument_type):
+        from svea_data_manager import instruments
+
+        if instrument_type.upper() in instruments.INSTRUMENT_CLASSES:
+            return instruments.get_instrument_class(instrument_type)
+
+        # Instruments defined outside of this package
+        for instrument_cls in Instrument.__subclasses__():
+            if instrument_cls.name.upper() == instrument_type.upper():
+                return instrument_cls
+
+        msg = f'Could not resolve instrument class for key {instrument_type} found in config.'
+        logger.error(msg)
+        raise ValueError(msg)
+
     @classmethod
     def from_yaml(cls, config_path, config_vars={}):
-        config_content = ''
-        with open(config_path, 'r', encoding='utf8') as config_file:
-            config_content = config_file.read()
+        return cls.from_config(load_config(config_path, config_vars))
+
+
+def load_config(config_path, config_vars={}):
+    """Loads the yaml config file. ${NAME} in the file is substituted with the value of config_vars[NAME] or the
+    environment variable NAME if it starts with SVEA_."""
+    config_content = ''
+    with open(config_path, 'r', encoding='utf8') as config_file:
+        config_content = config_file.read()
 
-        env_vars = {
-            env_key: env_val for env_key, env_val
-            in os.environ.items() if env_key.startswith('SVEA_')
-        }
+    env_vars = {
+        env_key: env_val for env_key, env_val
+        in os.environ.items() if env_key.startswith('SVEA_')
+    }
 
-        config_template = string.Template(config_content)
+    import yaml
 
-        config = yaml.safe_load(
-            config_template.safe_substitute(env_vars, **config_vars)
-        )
+    config_template = string.Template(config_content)
 
-        return cls.from_config(config)
+    return yaml.safe_load(
+        config_template.safe_substitute(env_vars, **config_vars)
+    )
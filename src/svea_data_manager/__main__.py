@@ -0,0 +1,5 @@
+import sys
+
+from svea_data_manager.cli import main
+
+sys.exit(main())
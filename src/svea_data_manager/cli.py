@@ -0,0 +1,360 @@
+"""Command line interface for running the archiving without a GUI, e.g. from cron or over ssh.
+
+    svea-data-manager run config.yaml --instrument CTD --instrument MVP --incremental
+    svea-data-manager watch config.yaml --instrument IFCB
+
+Progress is written to stdout as one json object per line. The last line is a summary of the run with the counters
+of the SDMLogger. Log messages are written to stderr. Exit code is 0 if all jobs finished, 1 if any job failed, 2 for
+bad arguments or config and 130 if the run was cancelled (SIGINT or SIGTERM)."""
+import argparse
+import datetime
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+
+from svea_data_manager import INSTRUMENTATION_CONFIG_KEY
+from svea_data_manager import RESERVED_CONFIG_KEYS
+from svea_data_manager import SveaDataManager
+from svea_data_manager import load_config
+from svea_data_manager.frameworks import WritePlan
+from svea_data_manager.sdm_event import subscribe
+from svea_data_manager.sdm_instrumentation import SDMInstrumentation
+from svea_data_manager.sdm_logger import SDMLogger
+from svea_data_manager.sdm_watch import WATCH_METHODS
+from svea_data_manager.sdm_worker import ArchiveJob, JobWorker, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BAD_CONFIG = 2
+EXIT_CANCELLED = 130
+
+
+class JsonLineWriter:
+    """Writes events as json lines. Progress events are only written when the message or percentage of the
+    instrument has changed since the last line."""
+
+    def __init__(self, stream=None):
+        self._stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._last_progress = {}
+
+    def write(self, event, **data):
+        line = dict(event=event, time=datetime.datetime.now().isoformat(timespec='seconds'), **data)
+        with self._lock:
+            self._stream.write(json.dumps(line, default=str) + '\n')
+            self._stream.flush()
+
+    def on_progress(self, data):
+        instrument = data.get('instrument')
+        progress = (data.get('msg'), data.get('percentage'))
+        with self._lock:
+            if self._last_progress.get(instrument) == progress:
+                return
+            self._last_progress[instrument] = progress
+        self.write('progress', instrument=instrument, msg=progress[0], percentage=progress[1])
+
+    def on_log(self, data):
+        self.write('log', msg=data.get('msg'))
+
+
+def _add_common_arguments(parser):
+    parser.add_argument('config', help='Path to yaml config file')
+    parser.add_argument('-i', '--instrument', action='append', default=[], dest='instruments',
+                        help='Instrument (key in the config) to run. Can be given several times. Default is all '
+                             'instruments with a source_directory.')
+    parser.add_argument('--transform-workers', type=int,
+                        help='Number of threads transforming packages within an instrument. Overrides '
+                             'transform_workers in the config.')
+    parser.add_argument('--write-workers', type=int,
+                        help='Number of threads writing packages within an instrument. Overrides write_workers in '
+                             'the config.')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='Value to substitute ${NAME} with in the config file. Can be given several times.')
+    parser.add_argument('--report-directory', help='Writes the SDMLogger reports to this directory')
+    parser.add_argument('--no-progress', action='store_true',
+                        help='Only writes the summary to stdout, no progress or log lines')
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        help='Level of the log messages written to stderr. Default is WARNING.')
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='svea-data-manager',
+                                     description='Archives data from the instruments on RV Svea')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Reads, transforms and writes the packages of the instruments in the '
+                                            'config file')
+    _add_common_arguments(run)
+    run.add_argument('-w', '--workers', type=int, default=1,
+                     help='Number of instruments archived in parallel. Default is 1.')
+    run.add_argument('-n', '--dry-run', action='store_true',
+                     help='Only plan the run. Nothing is written. The summary holds the plan summary.')
+    run.add_argument('--plan-file', help='Writes the full plan of a dry run as json to this path')
+    run.add_argument('--incremental', action='store_true',
+                     help='Skips packages written in an earlier run that have not changed since')
+    run.add_argument('--pipelined', action='store_true',
+                     help='Overlaps reading, transforming and writing. Packages are transformed by '
+                          '--transform-workers threads (default 2).')
+
+    watch = subparsers.add_parser('watch', help='Archives files continuously as they appear in the source '
+                                                'directories. Stop with SIGINT or SIGTERM.')
+    _add_common_arguments(watch)
+    watch.add_argument('--settle-time', type=float, default=5,
+                       help='Seconds a file must be unchanged before it is archived. Default is 5.')
+    watch.add_argument('--package-idle-time', type=float, default=30,
+                       help='Seconds without new files before a package is written. Default is 30.')
+    watch.add_argument('--max-latency', type=float, default=600,
+                       help='Seconds after which a package is written even if files are still added. '
+                            'Default is 600.')
+    watch.add_argument('--method', default='auto', choices=WATCH_METHODS,
+                       help='How to detect new files. Default is inotify with polling as fallback.')
+    watch.add_argument('--poll-interval', type=float, default=10,
+                       help='Seconds between scans when polling. Default is 10.')
+    watch.add_argument('--no-initial-scan', action='store_true',
+                       help='Only archives files created or changed after the watch has started')
+    return parser
+
+
+def _parse_vars(items):
+    config_vars = {}
+    for item in items:
+        name, sep, value = item.partition('=')
+        if not sep or not name:
+            raise ValueError(f'Variable must be given as NAME=VALUE, not {item}')
+        config_vars[name] = value
+    return config_vars
+
+
+def _get_instrument_configs(config, instruments, transform_workers=None, write_workers=None):
+    """Returns a dict with the config of every instrument to run"""
+    keys = {key.upper(): key for key in config if key not in RESERVED_CONFIG_KEYS}
+    if instruments:
+        unknown = [inst for inst in instruments if inst.upper() not in keys]
+        if unknown:
+            raise ValueError(f'Instrument not found in config: {", ".join(unknown)}')
+        selected = [keys[inst.upper()] for inst in instruments]
+    else:
+        selected = [key for key in keys.values() if (config[key] or {}).get('source_directory')]
+    instrument_configs = {}
+    for key in selected:
+        instrument_config = dict(config[key] or {})
+        if transform_workers:
+            instrument_config['transform_workers'] = transform_workers
+        if write_workers:
+            instrument_config['write_workers'] = write_workers
+        instrument_configs[key] = instrument_config
+    return instrument_configs
+
+
+def _merge_plans(jobs):
+    plan = WritePlan()
+    for job in jobs:
+        if not job.plan:
+            continue
+        for instrument_name in job.plan.instruments:
+            for package_plan in job.plan.get_instrument_plan(instrument_name).values():
+                plan.add(instrument_name, package_plan)
+    return plan
+
+
+def _get_job_status(job):
+    if isinstance(job.error, JobCancelled):
+        return 'cancelled'
+    if job.error:
+        return 'failed'
+    return 'ok'
+
+
+def _load_config(args, writer):
+    """Returns the config and a dict with the config of every instrument to run. Returns None for both and writes
+    a summary if the config is bad."""
+    try:
+        config = load_config(args.config, _parse_vars(args.var)) or {}
+        instrument_configs = _get_instrument_configs(config, args.instruments,
+                                                     transform_workers=args.transform_workers,
+                                                     write_workers=args.write_workers)
+    except (OSError, ValueError) as e:
+        logger.error(e)
+        writer.write('summary', status='bad_config', error=str(e))
+        return None, None
+    if not instrument_configs:
+        msg = 'No instrument with a source_directory found in config'
+        logger.error(msg)
+        writer.write('summary', status='bad_config', error=msg)
+        return None, None
+    return config, instrument_configs
+
+
+def _get_job_config(config, instrument_configs, with_instrumentation=True):
+    job_config = dict(instrument_configs)
+    for reserved_key in RESERVED_CONFIG_KEYS:
+        if reserved_key == INSTRUMENTATION_CONFIG_KEY and not with_instrumentation:
+            continue
+        if reserved_key in config:
+            job_config[reserved_key] = config[reserved_key]
+    return job_config
+
+
+def _get_logger_summary(sdm_logger):
+    return dict(
+        resources_added=sdm_logger.get_nr_resources_added(),
+        resources_rejected=sdm_logger.get_nr_resources_rejected(),
+        transform_added_files=sdm_logger.get_nr_transform_added_files(),
+        files_copied=sdm_logger.get_nr_files_copied(),
+        files_appended=sdm_logger.get_nr_files_appended(),
+        svn_prepared=sdm_logger.get_nr_svn_prepared(),
+        target_path_exists=sdm_logger.get_nr_target_path_exists(),
+    )
+
+
+def _start_logging(args, writer):
+    sdm_logger = SDMLogger(report_directory=args.report_directory)
+    if not args.no_progress:
+        subscribe('on_progress', writer.on_progress)
+        subscribe('log', writer.on_log)
+    return sdm_logger
+
+
+def run(args, writer):
+    config, instrument_configs = _load_config(args, writer)
+    if config is None:
+        return EXIT_BAD_CONFIG
+
+    sdm_logger = _start_logging(args, writer)
+    start = time.monotonic()
+    # One instrumentation for all jobs. Each job would otherwise count the events of every job.
+    instrumentation = None
+    if config.get(INSTRUMENTATION_CONFIG_KEY):
+        instrumentation = SDMInstrumentation.from_config(config[INSTRUMENTATION_CONFIG_KEY], finish_after_write=False)
+    worker = JobWorker(nr_threads=args.workers)
+
+    def on_job_finished(job):
+        status = _get_job_status(job)
+        if not args.no_progress:
+            writer.write('job_finished', instruments=job.instruments, status=status,
+                         error=str(job.error) if job.error else None)
+
+    def on_signal(signum, frame):
+        logger.warning(f'Received signal {signum}. Cancelling run.')
+        worker.cancel_all()
+
+    previous_handlers = {signum: signal.signal(signum, on_signal) for signum in [signal.SIGINT, signal.SIGTERM]}
+    jobs = []
+    try:
+        for key, instrument_config in instrument_configs.items():
+            # One job per instrument so that the instruments can be archived in parallel.
+            job = ArchiveJob(_get_job_config(config, {key: instrument_config}, with_instrumentation=False),
+                             on_finished=on_job_finished,
+                             dry_run=args.dry_run, resume=args.incremental, pipelined=args.pipelined,
+                             transform_workers=args.transform_workers or 2)
+            if not args.no_progress:
+                writer.write('job_started', instruments=job.instruments)
+            jobs.append(worker.submit(job))
+        for job in jobs:
+            # Waits with a timeout so that the signal handler gets to run in the main thread.
+            while not job.wait(0.5):
+                pass
+    finally:
+        worker.stop()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        if instrumentation:
+            instrumentation.finish()
+
+    statuses = [_get_job_status(job) for job in jobs]
+    if 'failed' in statuses:
+        status, exit_code = 'failed', EXIT_FAILED
+    elif 'cancelled' in statuses:
+        status, exit_code = 'cancelled', EXIT_CANCELLED
+    else:
+        status, exit_code = 'ok', EXIT_OK
+
+    summary = dict(
+        status=status,
+        dry_run=args.dry_run,
+        incremental=args.incremental,
+        duration=round(time.monotonic() - start, 3),
+        jobs=[dict(instruments=job.instruments, status=_get_job_status(job),
+                   error=str(job.error) if job.error else None) for job in jobs],
+        **_get_logger_summary(sdm_logger),
+    )
+    if args.dry_run:
+        plan = _merge_plans(jobs)
+        summary['plan'] = plan.get_summary()
+        if args.plan_file:
+            with open(args.plan_file, 'w', encoding='utf8') as fid:
+                json.dump(plan.to_dict(), fid, indent=2)
+            summary['plan_file'] = args.plan_file
+    if args.report_directory:
+        summary['report_directory'] = str(sdm_logger.write_reports())
+    if instrumentation and instrumentation.report_path:
+        summary['timing_report'] = str(instrumentation.report_path)
+    writer.write('summary', **summary)
+    return exit_code
+
+
+def watch(args, writer):
+    config, instrument_configs = _load_config(args, writer)
+    if config is None:
+        return EXIT_BAD_CONFIG
+
+    sdm_logger = _start_logging(args, writer)
+    start = time.monotonic()
+    try:
+        sdm = SveaDataManager.from_config(_get_job_config(config, instrument_configs))
+    except Exception as e:
+        logger.error(e)
+        writer.write('summary', status='bad_config', error=str(e))
+        return EXIT_BAD_CONFIG
+
+    def on_signal(signum, frame):
+        logger.warning(f'Received signal {signum}. Stopping watch.')
+        sdm.stop_watch()
+
+    previous_handlers = {signum: signal.signal(signum, on_signal) for signum in [signal.SIGINT, signal.SIGTERM]}
+    status, exit_code, error = 'ok', EXIT_OK, None
+    try:
+        sdm.watch(settle_time=args.settle_time, package_idle_time=args.package_idle_time,
+                  max_latency=args.max_latency, method=args.method, poll_interval=args.poll_interval,
+                  initial_scan=not args.no_initial_scan)
+    except JobCancelled as e:
+        status, exit_code, error = 'cancelled', EXIT_CANCELLED, str(e)
+    except Exception as e:
+        logger.exception(e)
+        status, exit_code, error = 'failed', EXIT_FAILED, str(e)
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
+    summary = dict(
+        status=status,
+        error=error,
+        instruments=list(instrument_configs),
+        duration=round(time.monotonic() - start, 3),
+        **_get_logger_summary(sdm_logger),
+    )
+    if args.report_directory:
+        summary['report_directory'] = str(sdm_logger.write_reports())
+    writer.write('summary', **summary)
+    return exit_code
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level, stream=sys.stderr,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    writer = JsonLineWriter()
+    if args.command == 'run':
+        return run(args, writer)
+    if args.command == 'watch':
+        return watch(args, writer)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,9 @@
+from svea_data_manager.frameworks.cancellation import CancellationToken
+from svea_data_manager.frameworks.journal import WriteJournal
+from svea_data_manager.frameworks.classification import ClassificationCache
 from svea_data_manager.frameworks.resource import Resource, ResourceCollection
 from svea_data_manager.frameworks.package import Package, PackageCollection
+from svea_data_manager.frameworks.plan import PlanItem, PackagePlan, WritePlan
 from svea_data_manager.frameworks.instrument import Instrument
-from svea_data_manager.frameworks.storage import Storage, FileStorage, SubversionStorage
+from svea_data_manager.frameworks.storage import Storage, FileStorage, ContainerStorage, CompressedFileStorage, SubversionStorage
 from svea_data_manager.frameworks import exceptions
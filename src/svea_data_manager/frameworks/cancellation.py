@@ -0,0 +1,26 @@
+import logging
+import threading
+
+from svea_data_manager.frameworks import exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class CancellationToken:
+    """Shared between the manager, the instruments and the storages of a run. cancel can be called from any thread
+    and the loops of the run call check between files and packages."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self, msg='Run was cancelled'):
+        if self.cancelled:
+            logger.warning(msg)
+            raise exceptions.RunCancelled(msg)
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import pathlib
+
+from svea_data_manager import helpers
+
+logger = logging.getLogger(__name__)
+
+
+class ClassificationCache:
+    """Remembers the resource class that prepare_resource chose for each source file, and the attributes parsed from
+    the file name, so that unchanged files are not classified again in later runs. A file is identified by its path
+    relative to the source directory, its size and its modification time. Files that were rejected are remembered
+    as well. The whole cache is dropped when the PATTERNS of the resource classes change. Files that were not looked
+    up during a read of the whole source directory have been deleted or moved, and are dropped with remove_unseen."""
+
+    FINGERPRINT_KEY = '__patterns__'
+
+    def __init__(self, name, source_directory, resource_classes):
+        self._cache = helpers.PersistentCache(f'classification_{name}')
+        self._source_directory = source_directory
+        self._resource_classes = {cls.__name__: cls for cls in resource_classes}
+        self._fingerprint = self.get_fingerprint(resource_classes)
+        self._checked = False
+        # Keys of the files looked up since the last remove_unseen
+        self._seen = set()
+
+    @staticmethod
+    def get_fingerprint(resource_classes):
+        items = []
+        for cls in resource_classes:
+            patterns = [f'{pattern.pattern}|{pattern.flags}' for pattern in getattr(cls, 'PATTERNS', [])]
+            suffixes = getattr(cls, 'RAW_FILE_SUFFIXES', [])
+            items.append(f'{cls.__module__}.{cls.__qualname__}|{patterns}|{suffixes}')
+        return hashlib.sha1('\n'.join(items).encode('utf8')).hexdigest()
+
+    def _check_fingerprint(self):
+        if self._checked:
+            return
+        if self._cache.get(self.FINGERPRINT_KEY) != self._fingerprint:
+            if self._cache.path.exists():
+                logger.info(f'Resource patterns have changed. Clearing classification cache {self._cache.path}')
+            self._cache.clear()
+            self._cache.set(self.FINGERPRINT_KEY, self._fingerprint)
+        self._checked = True
+
+    def get(self, source_file, stat):
+        """Returns a tuple (hit, resource). resource is None for a file that was rejected. hit is False if the file
+        has not been classified before or has changed since."""
+        self._check_fingerprint()
+        key = self._get_key(source_file)
+        self._seen.add(key)
+        item = self._cache.get(key)
+        if not item:
+            return False, None
+        size, mtime, class_name, attributes = item
+        if size != stat.st_size or mtime != stat.st_mtime_ns:
+            return False, None
+        if class_name is None:
+            return True, None
+        cls = self._resource_classes.get(class_name)
+        if cls is None:
+            return False, None
+        return True, cls(self._source_directory, source_file, dict(attributes))
+
+    def set(self, source_file, stat, resource):
+        """Remembers the result of prepare_resource for source_file. Resources of other classes than the given
+        resource classes, or with attributes that can not be stored as json, are not remembered."""
+        self._check_fingerprint()
+        class_name = None
+        attributes = {}
+        if resource is not None:
+            class_name = type(resource).__name__
+            if self._resource_classes.get(class_name) is not type(resource):
+                return
+            attributes = dict(resource.attributes)
+            if not all(isinstance(value, (str, int, float, bool, type(None))) for value in attributes.values()):
+                return
+        key = self._get_key(source_file)
+        self._seen.add(key)
+        self._cache.set(key, [stat.st_size, stat.st_mtime_ns, class_name, attributes])
+
+    def remove_unseen(self):
+        """Removes the files that have not been looked up since the last call. Call it when all files of the source
+        directory have been read."""
+        for key in list(self._cache.data):
+            if key != self.FINGERPRINT_KEY and key not in self._seen:
+                self._cache.remove(key)
+        self._seen = set()
+
+    @staticmethod
+    def _get_key(source_file):
+        if isinstance(source_file, pathlib.PurePath):
+            return source_file.as_posix()
+        return str(source_file).replace('\\', '/')
+
+    def save(self):
+        self._cache.save()
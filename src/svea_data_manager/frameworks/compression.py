@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+ZSTD = 'zstd'
+ZSTD_SUFFIX = '.zst'
+MANIFEST_NAME = '.sdm_manifest.json'
+
+DEFAULT_LEVEL = 3
+# Number of compression threads used by zstd for each file. -1 for the number of logical CPUs, 0 for no threads.
+DEFAULT_THREADS = -1
+
+
+def get_zstandard():
+    """Returns the zstandard module. It is an optional dependency only needed for compressed storage."""
+    try:
+        import zstandard
+    except ImportError:
+        msg = 'Compressed storage needs zstandard. Install it with: pip install zstandard'
+        logger.error(msg)
+        raise
+    return zstandard
+
+
+def compress_to_file(source, target_path, size=-1, level=DEFAULT_LEVEL, threads=DEFAULT_THREADS):
+    """Compresses the content of the binary file object source to a zstd frame at target_path. The file is written
+    to a temporary name first. Returns the size of the compressed file."""
+    zstandard = get_zstandard()
+    target_path = pathlib.Path(target_path)
+    part_path = target_path.with_name(f'{target_path.name}.part')
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads, write_content_size=True)
+    try:
+        with open(part_path, 'wb') as target:
+            nr_read, nr_written = compressor.copy_stream(source, target, size=size)
+        os.replace(part_path, target_path)
+    finally:
+        if part_path.exists():
+            os.remove(part_path)
+    return nr_written
+
+
+class CompressionManifest:
+    """Maps the names of the files in a directory of a compressed storage to the compressed objects holding them.
+    Stored as MANIFEST_NAME in the directory:
+
+        {"files": {name: {"object": "<name>.zst", "codec": "zstd", "size": size, "compressed_size": size}}}
+
+    "size" is the size of the uncompressed file. Changes are kept in memory until save is called."""
+
+    def __init__(self, directory):
+        self._directory = pathlib.Path(directory)
+        self._path = self._directory / MANIFEST_NAME
+        self._files = None
+        self._changed = False
+        self.lock = threading.RLock()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def files(self):
+        if self._files is None:
+            self._files = self._load()
+        return self._files
+
+    def _load(self):
+        try:
+            with open(self._path, encoding='utf8') as fid:
+                return json.load(fid)['files']
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            # The objects are still there. Files missing from the manifest are compressed again by the next write.
+            logger.warning(f'Could not read compression manifest {self._path}: {e}')
+            return {}
+
+    def get_object_path(self, name):
+        item = self.files.get(name)
+        if item is None:
+            return None
+        return self._directory / item['object']
+
+    def add(self, name, object_name, size, compressed_size, codec=ZSTD):
+        with self.lock:
+            self.files[name] = dict(object=object_name, codec=codec, size=size, compressed_size=compressed_size)
+            self._changed = True
+
+    def remove(self, name):
+        with self.lock:
+            item = self.files.pop(name, None)
+            if item is not None:
+                self._changed = True
+            return item
+
+    def save(self):
+        with self.lock:
+            if not self._changed:
+                return
+            temp_path = self._path.with_name(f'{self._path.name}.part')
+            with open(temp_path, 'w', encoding='utf8') as fid:
+                json.dump(dict(files=self._files), fid, indent=1)
+            os.replace(temp_path, self._path)
+            self._changed = False
@@ -0,0 +1,153 @@
+import io
+import json
+import logging
+import os
+import pathlib
+import tarfile
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_SUFFIX = '.tar'
+INDEX_SUFFIX = '.index.json'
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+END_OF_ARCHIVE = b'\0' * (2 * BLOCK_SIZE)
+
+
+class TarContainer:
+    """An append-only, uncompressed tar file with a json index beside it. The index holds the offset and size of
+    every member, so that single members can be read without scanning the tar file.
+
+        <directory>.tar             the members, readable with any tar program
+        <directory>.tar.index.json  {"end": offset, "members": {name: [offset, size]}}
+
+    "end" is where the next member is written. Members are appended after it and the index is replaced when they
+    have been written, so members written by an interrupted append are overwritten by the next one. If the index is
+    missing it is rebuilt from the tar file."""
+
+    def __init__(self, path):
+        self._path = pathlib.Path(path)
+        self._index_path = self._path.with_name(f'{self._path.name}{INDEX_SUFFIX}')
+        self._index = None
+
+    @classmethod
+    def for_directory(cls, directory):
+        """Returns the container holding the files of the given directory"""
+        directory = pathlib.Path(directory)
+        return cls(directory.with_name(f'{directory.name}{CONTAINER_SUFFIX}'))
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def index_path(self):
+        return self._index_path
+
+    @property
+    def members(self):
+        """Dict with member name as key and size as value"""
+        return {name: size for name, (offset, size) in self._get_index()['members'].items()}
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self):
+        if not self._path.exists():
+            return dict(end=0, members={})
+        if self._index_path.exists():
+            try:
+                with open(self._index_path, encoding='utf8') as fid:
+                    return json.load(fid)
+            except (ValueError, OSError) as e:
+                logger.warning(f'Could not read container index {self._index_path}. Rebuilding it: {e}')
+        return self._build_index()
+
+    def _build_index(self):
+        logger.warning(f'Rebuilding the index of container {self._path}')
+        members = {}
+        end = 0
+        file_size = self._path.stat().st_size
+        try:
+            with tarfile.open(self._path, 'r:') as tar:
+                for info in tar:
+                    if info.offset_data + info.size > file_size:
+                        raise tarfile.ReadError(f'{info.name} is truncated')
+                    if info.isfile():
+                        members[info.name] = [info.offset_data, info.size]
+                    end = info.offset_data + _padded(info.size)
+        except tarfile.ReadError as e:
+            # Left by an interrupted append. Overwritten by the next append.
+            logger.warning(f'Container {self._path} ends with an incomplete member: {e}')
+        self._index = dict(end=end, members=members)
+        self._save_index()
+        return self._index
+
+    def _save_index(self):
+        temp_path = self._index_path.with_name(f'{self._index_path.name}.part')
+        with open(temp_path, 'w', encoding='utf8') as fid:
+            json.dump(self._index, fid)
+        os.replace(temp_path, self._index_path)
+
+    def append(self, members):
+        """Appends members given as a list of (name, file object, size). The file objects are read from their current
+        position. Names already in the container are replaced in the index, the old data is left in the file."""
+        index = self._get_index()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        mode = 'r+b' if self._path.exists() else 'w+b'
+        with open(self._path, mode) as fid:
+            fid.seek(index['end'])
+            offset = index['end']
+            added = {}
+            for name, source, size in members:
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = int(time.time())
+                info.mode = 0o644
+                header = info.tobuf(format=tarfile.PAX_FORMAT)
+                fid.write(header)
+                offset += len(header)
+                nr_bytes = _copy_exactly(source, fid, size)
+                if nr_bytes != size:
+                    raise OSError(f'Expected {size} bytes for {name} in container {self._path}, got {nr_bytes}')
+                fid.write(b'\0' * (_padded(size) - size))
+                added[name] = [offset, size]
+                offset += _padded(size)
+            fid.write(END_OF_ARCHIVE)
+            fid.truncate()
+            fid.flush()
+            os.fsync(fid.fileno())
+        index['members'].update(added)
+        index['end'] = offset
+        self._save_index()
+
+    def open_member(self, name):
+        """Returns a binary file object with the content of the member"""
+        offset, size = self._get_index()['members'][name]
+        with open(self._path, 'rb') as fid:
+            fid.seek(offset)
+            return io.BytesIO(fid.read(size))
+
+    def extract_member(self, name, target_path):
+        offset, size = self._get_index()['members'][name]
+        with open(self._path, 'rb') as source, open(target_path, 'wb') as target:
+            source.seek(offset)
+            _copy_exactly(source, target, size)
+
+
+def _padded(size):
+    return (size + BLOCK_SIZE - 1) // BLOCK_SIZE * BLOCK_SIZE
+
+
+def _copy_exactly(source, target, size, buffer_size=1024 * 1024):
+    nr_bytes = 0
+    while nr_bytes < size:
+        data = source.read(min(buffer_size, size - nr_bytes))
+        if not data:
+            break
+        target.write(data)
+        nr_bytes += len(data)
+    return nr_bytes
@@ -41,3 +41,14 @@ class CruiseError(Exception):
 class ShipError(Exception):
     """Not allowed to force"""
     pass
+
+class RunCancelled(Exception):
+    """The run was cancelled before it was finished"""
+    pass
+
+class PackagesNotWritten(Exception):
+    """One or more packages could not be written. errors holds the exception for each package key"""
+
+    def __init__(self, msg, errors=None):
+        super().__init__(msg)
+        self.errors = errors or {}
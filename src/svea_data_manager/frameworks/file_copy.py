@@ -0,0 +1,209 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+REFLINK = 'reflink'
+COPY_FILE_RANGE = 'copy_file_range'
+SENDFILE = 'sendfile'
+BUFFERED = 'buffered'
+
+# In order of preference. A strategy that is not supported between two file systems falls back to the next one.
+COPY_STRATEGIES = [REFLINK, COPY_FILE_RANGE, SENDFILE, BUFFERED]
+
+# Bytes copied by the kernel per call to copy_file_range and sendfile
+CHUNK_SIZE = 64 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+# Bytes at the end of the existing part of a file compared when checking that a file has only grown (see is_prefix)
+TAIL_HASH_SIZE = 1024 * 1024
+
+# ioctl request for a copy-on-write clone of a whole file (linux/fs.h). Supported by e.g. btrfs and XFS.
+FICLONE = 0x40049409
+
+# Raised when a strategy is not supported for the given files. The next strategy is tried.
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY,
+                   errno.EBADF, errno.ENOTSOCK, errno.EPERM}
+
+# (strategy, source device, target device) of strategies known not to work, so that they are not tried again
+_unsupported = set()
+_unsupported_lock = threading.Lock()
+
+
+class CopyStrategyNotSupported(Exception):
+    """The copy strategy can not be used on this platform"""
+    pass
+
+
+class IncompleteCopy(CopyStrategyNotSupported):
+    """The copy strategy stopped before the whole file was copied. The next strategy is tried, but the strategy is
+    not remembered as unsupported."""
+    pass
+
+
+def get_available_strategies():
+    """Returns the copy strategies that can be used on this platform"""
+    strategies = []
+    if sys.platform.startswith('linux'):
+        strategies.append(REFLINK)
+    if hasattr(os, 'copy_file_range'):
+        strategies.append(COPY_FILE_RANGE)
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        strategies.append(SENDFILE)
+    strategies.append(BUFFERED)
+    return strategies
+
+
+def copy_file(source_path, target_path, strategies=None):
+    """Copies the content of source_path to target_path with the first of the given strategies (default all
+    available COPY_STRATEGIES) that works for the two files. Returns the name of the strategy used. Raises the last
+    error if none of the strategies work."""
+    if strategies is None:
+        strategies = get_available_strategies()
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        source_stat = os.fstat(source.fileno())
+        target_device = os.fstat(target.fileno()).st_dev
+        error = None
+        for strategy in strategies:
+            key = (strategy, source_stat.st_dev, target_device)
+            if key in _unsupported:
+                continue
+            try:
+                _copy_functions[strategy](source, target, source_stat.st_size)
+                return strategy
+            except (OSError, CopyStrategyNotSupported) as e:
+                if isinstance(e, OSError) and e.errno not in FALLBACK_ERRNOS:
+                    raise
+                logger.debug(f'Copy strategy {strategy} not supported for {source_path} -> {target_path}: {e}')
+                if not isinstance(e, IncompleteCopy):
+                    with _unsupported_lock:
+                        _unsupported.add(key)
+                error = e
+                # Anything written by the failed strategy is discarded
+                target.seek(0)
+                target.truncate()
+        if error is None:
+            error = CopyStrategyNotSupported(f'None of the copy strategies {strategies} are available')
+        raise error
+
+
+def is_prefix(target_path, source_path, size):
+    """True if the first size bytes of source_path are the same as target_path, which has the given size. Only the
+    last TAIL_HASH_SIZE bytes are compared. Used to check that a file has grown since it was copied, and not been
+    changed."""
+    if os.path.getsize(source_path) < size:
+        return False
+    offset = max(0, size - TAIL_HASH_SIZE)
+    return _hash_range(target_path, offset, size - offset) == _hash_range(source_path, offset, size - offset)
+
+
+def _hash_range(path, offset, size):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as fid:
+        fid.seek(offset)
+        while size > 0:
+            data = fid.read(min(BUFFER_SIZE, size))
+            if not data:
+                break
+            digest.update(data)
+            size -= len(data)
+    return digest.digest()
+
+
+def append_file(source_path, target_path, offset):
+    """Appends the content of source_path from offset to the end of target_path, which must have size offset.
+    Returns the number of bytes appended. If interrupted, target_path is still the beginning of source_path."""
+    with open(source_path, 'rb') as source, open(target_path, 'r+b') as target:
+        target_size = os.fstat(target.fileno()).st_size
+        if target_size != offset:
+            raise OSError(errno.EAGAIN, f'Expected size {offset} of {target_path} to append to, found {target_size}')
+        size = os.fstat(source.fileno()).st_size - offset
+        if hasattr(os, 'copy_file_range'):
+            try:
+                copied = 0
+                while copied < size:
+                    nr = os.copy_file_range(source.fileno(), target.fileno(), min(CHUNK_SIZE, size - copied),
+                                            offset + copied, offset + copied)
+                    if nr == 0:
+                        break
+                    copied += nr
+                if copied == size:
+                    return copied
+                # Stopped early. The rest is copied with the buffered loop below.
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS:
+                    raise
+            target.truncate(offset)
+        source.seek(offset)
+        target.seek(offset)
+        copied = 0
+        while copied < size:
+            data = source.read(min(BUFFER_SIZE, size - copied))
+            if not data:
+                break
+            target.write(data)
+            copied += len(data)
+        return copied
+
+
+def _copy_reflink(source, target, size):
+    try:
+        import fcntl
+    except ImportError:
+        raise CopyStrategyNotSupported('fcntl is not available')
+    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    return size
+
+
+def _copy_file_range(source, target, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise CopyStrategyNotSupported('os.copy_file_range is not available')
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(source.fileno(), target.fileno(), min(CHUNK_SIZE, size - offset), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    _check_copied(offset, size)
+    return offset
+
+
+def _copy_sendfile(source, target, size):
+    if not hasattr(os, 'sendfile'):
+        raise CopyStrategyNotSupported('os.sendfile is not available')
+    offset = 0
+    while offset < size:
+        copied = os.sendfile(target.fileno(), source.fileno(), offset, min(CHUNK_SIZE, size - offset))
+        if copied == 0:
+            break
+        offset += copied
+    _check_copied(offset, size)
+    return offset
+
+
+def _copy_buffered(source, target, size):
+    source.seek(0)
+    shutil.copyfileobj(source, target, BUFFER_SIZE)
+    return target.tell()
+
+
+def _check_copied(copied, size):
+    """Raises if fewer than size bytes were copied, so that copy_file discards the target and tries the next
+    strategy. Nothing copied at all means that the strategy does not work for the files (as in shutil)."""
+    if copied == 0 and size > 0:
+        raise CopyStrategyNotSupported(f'Nothing copied of {size} bytes')
+    if copied < size:
+        raise IncompleteCopy(f'Copied {copied} of {size} bytes')
+
+
+_copy_functions = {
+    REFLINK: _copy_reflink,
+    COPY_FILE_RANGE: _copy_file_range,
+    SENDFILE: _copy_sendfile,
+    BUFFERED: _copy_buffered,
+}
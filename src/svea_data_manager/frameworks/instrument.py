@@ -1,11 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import hashlib
 import logging
 import datetime
+import os
+import threading
 
 from svea_data_manager.frameworks import PackageCollection, Package
 from svea_data_manager.frameworks import Resource
+from svea_data_manager.frameworks import CancellationToken, WriteJournal, ClassificationCache
 from svea_data_manager.frameworks import exceptions
-from svea_data_manager.sdm_event import post_event
+from svea_data_manager.sdm_event import post_event, post_events, collect_events, bind_run
+from svea_data_manager.sdm_instrumentation import timed, count
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +19,22 @@ logger = logging.getLogger(__name__)
 class Instrument:
     name = None
     desc = None
+    # Set to True if transform_package of one package does not depend on any other package. Packages are then
+    # transformed by a thread pool with size given by the configuration transform_workers.
+    parallel_transform = False
+    # Set to True if the packages can not be transformed one by one because transform_packages needs all packages
+    # at once. The pipelined executor then transforms all packages of the instrument together after they have been
+    # read, before any of them is written.
+    transform_barrier = False
+    # Set to True if the packages may be split into one package per source directory. The pipelined executor then
+    # reads the packages with iter_packages and writes and releases each package as soon as the directory walk has
+    # left its directory, instead of holding all packages in memory.
+    stream_packages = False
+    # The resource classes that prepare_resource can return. If given, the result of prepare_resource is kept in a
+    # persistent ClassificationCache and unchanged files are not classified again. The resource classes must be
+    # possible to create with cls(source_directory, source_file, attributes). Turned off with the configuration
+    # classification_cache: false.
+    resource_classes = []
 
     def __init__(self, config={}):
         if not type(self.name) is str or len(self.desc) == 0:
@@ -32,20 +54,77 @@ class Instrument:
 
         self._config = config
         self._packages = None
+        self._cancel_token = CancellationToken()
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._classification_cache = None
+        # Held when writing to storages that do not support concurrent writes
+        self._serial_write_lock = threading.Lock()
 
     def __str__(self):
         return self.__class__.name
 
+    @property
+    def cancel_token(self):
+        """Token checked between files and packages. Pass it on to the storage when writing packages."""
+        return self._cancel_token
+
+    @cancel_token.setter
+    def cancel_token(self, token):
+        if not isinstance(token, CancellationToken):
+            msg = f'cancel_token must be an instance of CancellationToken, not {type(token)}'
+            logger.error(msg)
+            raise TypeError(msg)
+        self._cancel_token = token
+
+    def cancel(self):
+        """Requests the instrument to stop. The running read, transform or write loop stops before the next file or
+        package by raising RunCancelled."""
+        self._cancel_token.cancel()
+
+    def _check_cancelled(self):
+        self._cancel_token.check(f'Run for instrument {self.name} was cancelled')
+
+    @property
+    def journal(self):
+        """Journal of the packages written from the source directory of this instrument"""
+        with self._journal_lock:
+            if not self._journal:
+                source_id = hashlib.sha1(str(self.source_directory.resolve()).encode('utf8')).hexdigest()[:12]
+                self._journal = WriteJournal(f'{self.name}_{source_id}')
+        return self._journal
+
+    @property
+    def classification_cache(self):
+        """Cache of the results of prepare_resource. None if the instrument does not use one."""
+        if not self.resource_classes or not self.config.get('classification_cache', True):
+            return None
+        if not self._classification_cache:
+            source_id = hashlib.sha1(str(self.source_directory.resolve()).encode('utf8')).hexdigest()[:12]
+            self._classification_cache = ClassificationCache(f'{self.name}_{source_id}', self.source_directory,
+                                                             self.resource_classes)
+        return self._classification_cache
+
+    def save_classification_cache(self, all_files_read=False):
+        """Saves the classification cache. With all_files_read the files not read since the last save with
+        all_files_read are removed from the cache, since they have been deleted or moved."""
+        if self._classification_cache:
+            if all_files_read:
+                self._classification_cache.remove_unseen()
+            self._classification_cache.save()
+
     def read_packages(self):
         self._packages = PackageCollection()
         source_files = self.source_files
         tot_nr_files = len(source_files)
-        for nr, source_file in enumerate(source_files):
-            post_event('on_progress', dict(instrument=self.name,
-                                           msg='Reading files...',
-                                           percentage=int((nr+1)/tot_nr_files*100)
-                                           ))
-            self.add_file(source_file)
+        with timed('classify', self.name):
+            for nr, source_file in enumerate(source_files):
+                self._check_cancelled()
+                post_event('on_progress', dict(instrument=self.name,
+                                               msg='Reading files...',
+                                               percentage=int((nr+1)/tot_nr_files*100)
+                                               ))
+                self.add_file(source_file)
             # resource = self.prepare_resource(source_file)
             # if not isinstance(resource, Resource):
             #     logger.warning(
@@ -66,6 +145,39 @@ class Instrument:
             #
             # package.resources.add(resource)
             # post_event('on_resource_added', dict(instrument=self.name, resource=resource, path=resource.absolute_source_path))
+        self.save_classification_cache(all_files_read=True)
+        post_event('on_progress', dict(instrument=self.name,
+                                       msg='Done reading files',
+                                       percentage=100
+                                       ))
+
+    def iter_packages(self):
+        """Walks the source directory one directory at a time and yields the packages with resources in each
+        directory when the walk leaves it. Resources with the same package key in another directory end up in
+        another package. The yielded packages are removed from the collection, so they can be released once
+        written."""
+        self._packages = PackageCollection()
+        source_directory = self.source_directory
+        top_level_names = sorted(path.name for path in source_directory.iterdir() if path.is_dir())
+        nr_top_level_done = 0
+        for root, dirs, files in os.walk(source_directory):
+            dirs.sort()
+            self._check_cancelled()
+            count('syscalls_scandir', self.name)
+            directory = Path(root).relative_to(source_directory)
+            if directory.parts and directory.parts[0] in top_level_names:
+                nr_top_level_done = top_level_names.index(directory.parts[0])
+            post_event('on_progress', dict(instrument=self.name,
+                                           msg='Reading files...',
+                                           percentage=int(nr_top_level_done / max(1, len(top_level_names)) * 100)
+                                           ))
+            with timed('classify', self.name):
+                for name in sorted(files):
+                    self.add_file(directory / name)
+            for package in self.detach_packages([str(package) for package in self.packages]):
+                package.journal_key = f'{directory.as_posix()}/{package}'
+                yield package
+        self.save_classification_cache(all_files_read=True)
         post_event('on_progress', dict(instrument=self.name,
                                        msg='Done reading files',
                                        percentage=100
@@ -73,7 +185,7 @@ class Instrument:
 
     def add_file(self, source_file):
         """Adds the source_file to the correct package"""
-        resource = self.prepare_resource(source_file)
+        resource = self._prepare_resource_cached(source_file)
 
         if not isinstance(resource, Resource):
             logger.warning(
@@ -84,6 +196,24 @@ class Instrument:
                        dict(instrument=self.name, path=Path(self.source_directory, source_file)))
             return
 
+        return self.add_resource(resource)
+
+    def _prepare_resource_cached(self, source_file):
+        cache = self.classification_cache
+        if cache is None:
+            return self.prepare_resource(source_file)
+        stat = os.stat(os.path.join(self.config['source_directory'], source_file))
+        count('syscalls_stat', self.name)
+        hit, resource = cache.get(source_file, stat)
+        if hit:
+            count('classification_cache_hits', self.name)
+            return resource
+        resource = self.prepare_resource(source_file)
+        cache.set(source_file, stat, resource if isinstance(resource, Resource) else None)
+        return resource
+
+    def add_resource(self, resource):
+        """Adds an already prepared resource to the correct package"""
         self._add_config_attributes_to_resource(resource)
 
         package_key = self.get_package_key_for_resource(resource)
@@ -101,17 +231,149 @@ class Instrument:
         return resource
 
     def transform_packages(self, **kwargs):
-        for package in self.packages:
+        nr_workers = self._get_nr_workers('transform_workers') if self.parallel_transform else 1
+        if nr_workers <= 1:
+            for package in self.packages:
+                self._check_cancelled()
+                self.transform_package(package, **kwargs)
+        else:
+            with ThreadPoolExecutor(max_workers=nr_workers) as executor:
+                transform_package = bind_run(self._transform_package_collecting_events)
+                futures = [executor.submit(transform_package, package, **kwargs)
+                           for package in self.packages]
+                # Events are posted in package order so that the outcome does not depend on thread scheduling.
+                for future in futures:
+                    post_events(future.result())
+        self.finish_transform(**kwargs)
+
+    def finish_transform(self, **kwargs):
+        """Called once after all packages have been transformed. Override to add resources or packages that depend
+        on all the other packages (e.g. a summary of the run)."""
+        return
+
+    def _transform_package_collecting_events(self, package, **kwargs):
+        self._check_cancelled()
+        with collect_events() as events:
             self.transform_package(package, **kwargs)
+        return events
 
-    def write_packages(self):
-        for package in self.packages:
-            self.write_package(package)
+    def write_packages(self, resume=False, plan=None):
+        """Writes all packages. Written packages are recorded in the journal, which is cleared again when all packages
+        have been written. If resume is True, packages recorded as written in an earlier (e.g. cancelled) run are
+        skipped unless they have changed since. plan is a dict
+        with package key as key and PackagePlan as value (see plan_packages). Planned packages are written without
+        checking the storage again.
+
+        With the configuration write_workers > 1 the packages are written by a thread pool. Packages to storages
+        without concurrent_writes are still written one at a time. A failing package does not stop the others.
+        The failures are raised together as PackagesNotWritten when all packages have been tried."""
+        nr_workers = self._get_nr_workers('write_workers')
+        try:
+            if nr_workers <= 1:
+                for package in self.packages:
+                    self._check_cancelled()
+                    self.write_journaled_package(package, resume=resume, plan=plan)
+            else:
+                self._write_packages_in_parallel(nr_workers, resume=resume, plan=plan)
+            self.journal.clear()
+        finally:
+            self.journal.save()
         post_event('on_stop_write', dict(time=datetime.datetime.now()))
 
+    def _write_packages_in_parallel(self, nr_workers, resume=False, plan=None):
+        errors = {}
+        nr_written = 0
+        with ThreadPoolExecutor(max_workers=nr_workers) as executor:
+            write_package = bind_run(self.write_package_collecting_events)
+            futures = [(package, executor.submit(write_package, package, resume=resume, plan=plan))
+                       for package in self.packages]
+            # Events are posted in package order so that the outcome does not depend on thread scheduling.
+            for package, future in futures:
+                events, written, error = future.result()
+                post_events(events)
+                if error is not None:
+                    errors[str(package)] = error
+                elif written:
+                    nr_written += 1
+        msg = f'{self.name}: {nr_written} of {len(futures)} packages written with {nr_workers} write workers'
+        logger.info(msg)
+        post_event('log', dict(msg=msg))
+        failed = {key: error for key, error in errors.items() if not isinstance(error, exceptions.RunCancelled)}
+        if failed:
+            msg = f'{len(failed)} of {len(futures)} packages could not be written: ' + \
+                  '; '.join(f'{key}: {error}' for key, error in failed.items())
+            logger.error(msg)
+            raise exceptions.PackagesNotWritten(msg, errors=failed)
+        if errors:
+            raise next(iter(errors.values()))
+
+    def write_package_collecting_events(self, package, resume=False, plan=None):
+        """Writes one package as write_journaled_package, but safe to call from several threads at once. The events
+        posted while writing are collected instead of posted. Returns a tuple (events, written, error) where error is
+        the exception raised when writing the package, or None."""
+        written = False
+        with collect_events() as events:
+            try:
+                self._check_cancelled()
+                if self._get_package_storage(package, plan).concurrent_writes:
+                    written = self.write_journaled_package(package, resume=resume, plan=plan)
+                else:
+                    with self._serial_write_lock:
+                        written = self.write_journaled_package(package, resume=resume, plan=plan)
+            except Exception as e:
+                return events, written, e
+        return events, written, None
+
+    def _get_package_storage(self, package, plan=None):
+        if plan is not None and str(package) in plan:
+            return plan[str(package)].storage
+        return self.get_storage(package)
+
+    def write_journaled_package(self, package, resume=False, plan=None):
+        """Writes one package (see write_packages) and records it in the journal. The journal is not saved.
+        Returns True if the package was written."""
+        if resume and self.journal.is_written(package):
+            msg = f'Package {package} was written in an earlier run. Skipping package.'
+            logger.info(msg)
+            post_event('log', dict(msg=msg))
+            return False
+        if plan is None:
+            self.write_package(package)
+        elif str(package) in plan:
+            self.write_planned_package(package, plan[str(package)])
+        else:
+            msg = f'Package {package} is not in the write plan. Skipping package.'
+            logger.warning(msg)
+            post_event('log', dict(msg=msg))
+            return False
+        self.journal.set_written(package)
+        return True
+
+    def plan_packages(self):
+        """Returns a dict with package key as key and PackagePlan as value telling what write_packages would do"""
+        plan = {}
+        with timed('plan', self.name):
+            for package in self.packages:
+                self._check_cancelled()
+                plan[str(package)] = self.get_storage(package).plan(package, force=self.config.get('force', False))
+        return plan
+
+    def write_planned_package(self, package, package_plan):
+        return package_plan.storage.write(package, self.config.get('force', False), cancel_token=self.cancel_token,
+                                          plan=package_plan)
+
     def get_package_key_for_resource(self, resource):
         return resource.source_path.stem
 
+    def _get_nr_workers(self, key):
+        nr_workers = self.config.get(key) or 1
+        try:
+            return max(1, int(nr_workers))
+        except ValueError:
+            msg = f'Configuration {key} must be an integer, not {nr_workers}.'
+            logger.error(msg)
+            raise exceptions.ImproperlyConfiguredInstrument(msg)
+
     def _add_config_attributes_to_resource(self, resource):
         """Adds config attributes given to the instrument class to the given resource. If value is given in the
         config attributes this value will replace any old value in the resource attributes. If value is missing the
@@ -138,6 +400,15 @@ class Instrument:
         logger.error(msg)
         raise NotImplementedError(msg)
 
+    def get_storage(self, package):
+        """Returns the storage that the package is written to"""
+        storage = getattr(self, '_storage', None)
+        if storage is None:
+            msg = f'Class {self.__class__.__name__} has not implemented get_storage method.'
+            logger.error(msg)
+            raise NotImplementedError(msg)
+        return storage
+
     @property
     def packages(self) -> PackageCollection:
         if not isinstance(self._packages, PackageCollection):
@@ -148,6 +419,26 @@ class Instrument:
 
         return self._packages
 
+    @packages.setter
+    def packages(self, packages):
+        if not isinstance(packages, PackageCollection):
+            msg = f'packages must be an instance of PackageCollection, not {type(packages)}'
+            logger.error(msg)
+            raise TypeError(msg)
+        self._packages = packages
+
+    def detach_packages(self, package_keys):
+        """Removes the packages with the given keys from the collection and returns them in a new
+        PackageCollection. Keys not in the collection are ignored."""
+        detached = PackageCollection()
+        for key in package_keys:
+            if not self.packages.has(key):
+                continue
+            package = self.packages.get(key)
+            self.packages.remove(package)
+            detached.add(package)
+        return detached
+
     @property
     def config(self):
         return self._config
@@ -163,11 +454,17 @@ class Instrument:
                         msg='Looking for source files...',
                         percentage=10,
                         ))
-        found_files = self.source_directory.glob('**/*')
-        all_files = [
-            file.relative_to(self.source_directory)
-            for file in found_files if file.is_file()
-        ]
+        all_files = []
+        nr_paths = 0
+        with timed('discover', self.name):
+            for file in self.source_directory.glob('**/*'):
+                self._check_cancelled()
+                nr_paths += 1
+                if file.is_file():
+                    all_files.append(file.relative_to(self.source_directory))
+        # One stat call per path found. The directories are listed with scandir.
+        count('syscalls_stat', self.name, nr_paths)
+        count('syscalls_scandir', self.name, nr_paths - len(all_files) + 1)
         post_event('on_progress',
                    dict(instrument=self.name,
                         msg='Done looking for source files!',
@@ -177,3 +474,4 @@ class Instrument:
 
     ImproperlyConfigured = exceptions.ImproperlyConfiguredInstrument
     PackagesNotExtracted = exceptions.PackagesNotExtracted
+    RunCancelled = exceptions.RunCancelled
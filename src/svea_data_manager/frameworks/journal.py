@@ -0,0 +1,44 @@
+import hashlib
+import logging
+import os
+
+from svea_data_manager import helpers
+
+logger = logging.getLogger(__name__)
+
+
+class WriteJournal:
+    """Keeps track of the packages that have been completely written to storage, so that an interrupted run can be
+    resumed without checking the storage again for the packages that were already done. A package is identified by
+    its key and a fingerprint of its resources, so packages that have changed since they were written are written
+    again. Only an interrupted run needs the journal, so it is cleared when all packages of a run have been
+    written."""
+
+    def __init__(self, name):
+        self._cache = helpers.PersistentCache(f'journal_{name}')
+
+    @staticmethod
+    def get_fingerprint(package):
+        items = []
+        for resource in package.resources:
+            item = f'{resource.source_path}|{resource.target_path}'
+            if resource.content is not None:
+                item = f'{item}|{hashlib.sha1(resource.content).hexdigest()}'
+            elif not resource.is_generated:
+                stat = os.stat(resource.absolute_source_path)
+                item = f'{item}|{stat.st_mtime_ns}|{stat.st_size}'
+            items.append(item)
+        return hashlib.sha1('\n'.join(sorted(items)).encode('utf8')).hexdigest()
+
+    def is_written(self, package):
+        return self._cache.get(package.journal_key) == self.get_fingerprint(package)
+
+    def set_written(self, package):
+        self._cache.set(package.journal_key, self.get_fingerprint(package))
+
+    def clear(self):
+        if self._cache.data:
+            self._cache.clear()
+
+    def save(self):
+        self._cache.save()
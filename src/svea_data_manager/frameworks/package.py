@@ -21,6 +21,7 @@ class Package:
         self._package_key = package_key
         self._instrument = instrument
         self._resources = ResourceCollection()
+        self._journal_key = None
 
     def __str__(self):
         return self._package_key
@@ -33,6 +34,16 @@ class Package:
     def resources(self):
         return self._resources
 
+    @property
+    def journal_key(self):
+        """Key of the package in the write journal. Differs from the package key when the package is one of several
+        parts of the same package (see Instrument.iter_packages)"""
+        return self._journal_key or self._package_key
+
+    @journal_key.setter
+    def journal_key(self, key):
+        self._journal_key = key
+
 
 class PackageCollection:
 
@@ -56,6 +67,15 @@ class PackageCollection:
             raise exceptions.PackageAlreadyInCollection(msg)
         self._packages[str(package)] = package
 
+    def remove(self, package):
+        for key, value in self._packages.items():
+            if value is package:
+                del self._packages[key]
+                return
+        msg = 'Package {} does not exist in this collection.'.format(package)
+        logger.debug(msg)
+        raise exceptions.PackageNotInCollection(msg)
+
     def has(self, package):
         return str(package) in self._packages.keys()
 
@@ -0,0 +1,125 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PlanItem:
+    """What a storage will do with one resource of a package"""
+    COPY = 'copy'
+    # The target file is a copy of the beginning of the source file. Only the rest of the source file is written.
+    APPEND = 'append'
+    SKIP = 'skip'
+    CONFLICT = 'conflict'
+    NO_TARGET = 'no_target'
+
+    def __init__(self, action, resource, target_path=None, size=None, reason='', new_directories=(), offset=None):
+        self.action = action
+        self.resource = resource
+        self.target_path = target_path
+        # Size in bytes of the resource. None if not known before the resource is written (e.g. generated zip files).
+        self.size = size
+        self.reason = reason
+        # Directories missing in the storage when the plan was made, that has to be created before the resource can
+        # be written. Another package written in between may already have created them.
+        self.new_directories = list(new_directories)
+        # Size of the existing target file for APPEND. Bytes from this offset of the source file are appended.
+        self.offset = offset
+
+    def __repr__(self):
+        return f'PlanItem({self.action}: {self.resource.source_path} -> {self.target_path})'
+
+    def to_dict(self):
+        return dict(
+            action=self.action,
+            source_path=str(self.resource.absolute_source_path),
+            target_path=None if self.target_path is None else str(self.target_path),
+            size=self.size,
+            offset=self.offset,
+            reason=self.reason,
+        )
+
+
+class PackagePlan:
+    """The planned write of one package to a storage. Executing the plan writes the package without checking the
+    storage again."""
+
+    def __init__(self, package, storage, items):
+        self.package = package
+        self.storage = storage
+        self.items = list(items)
+
+    def __str__(self):
+        return str(self.package)
+
+    def get_items(self, action):
+        return [item for item in self.items if item.action == action]
+
+    @property
+    def items_to_copy(self):
+        return self.get_items(PlanItem.COPY)
+
+    @property
+    def items_to_append(self):
+        return self.get_items(PlanItem.APPEND)
+
+    @property
+    def nr_bytes_to_copy(self):
+        return sum(item.size or 0 for item in self.items_to_copy)
+
+    @property
+    def nr_bytes_to_append(self):
+        return sum(item.size - item.offset for item in self.items_to_append)
+
+    def to_dict(self):
+        return dict(
+            package=str(self.package),
+            storage=type(self.storage).__name__,
+            nr_bytes_to_copy=self.nr_bytes_to_copy,
+            nr_bytes_to_append=self.nr_bytes_to_append,
+            items=[item.to_dict() for item in self.items],
+        )
+
+
+class WritePlan:
+    """The planned writes of all packages of a run, grouped by instrument name"""
+
+    def __init__(self):
+        self._instruments = {}
+
+    def __iter__(self):
+        for package_plans in self._instruments.values():
+            yield from package_plans.values()
+
+    @property
+    def instruments(self):
+        return list(self._instruments)
+
+    def add(self, instrument_name, package_plan):
+        self._instruments.setdefault(instrument_name, {})[str(package_plan)] = package_plan
+
+    def get_instrument_plan(self, instrument_name):
+        """Returns a dict with package key as key and PackagePlan as value"""
+        return self._instruments.get(instrument_name, {})
+
+    @property
+    def items(self):
+        return [item for package_plan in self for item in package_plan.items]
+
+    def get_summary(self):
+        summary = {action: 0 for action in [PlanItem.COPY, PlanItem.APPEND, PlanItem.SKIP, PlanItem.CONFLICT,
+                                            PlanItem.NO_TARGET]}
+        for item in self.items:
+            summary[item.action] += 1
+        summary['nr_packages'] = sum(1 for _ in self)
+        summary['nr_bytes_to_copy'] = sum(package_plan.nr_bytes_to_copy for package_plan in self)
+        summary['nr_bytes_to_append'] = sum(package_plan.nr_bytes_to_append for package_plan in self)
+        summary['nr_files_unknown_size'] = sum(1 for item in self.items if item.action == PlanItem.COPY and
+                                               item.size is None)
+        return summary
+
+    def to_dict(self):
+        return dict(
+            summary=self.get_summary(),
+            instruments={name: [package_plan.to_dict() for package_plan in package_plans.values()]
+                         for name, package_plans in self._instruments.items()},
+        )
@@ -1,12 +1,18 @@
 from pathlib import Path
+import io
 import logging
 import datetime
+import shutil
+import uuid
 
 from svea_data_manager.frameworks import exceptions
 from svea_data_manager import helpers
 
 logger = logging.getLogger(__name__)
 
+# Generated content larger than this (in bytes) is spilled to the temp directory instead of being kept in memory.
+MAX_IN_MEMORY_CONTENT_SIZE = 16 * 1024 * 1024
+
 
 class Resource:
 
@@ -23,6 +29,8 @@ class Resource:
             raise TypeError(msg)
 
         self._attributes = attributes
+        self._content = None
+        self._content_writer = None
 
     def __str__(self):
         return str(self.source_path)
@@ -52,6 +60,65 @@ class Resource:
     def target_path(self, path):
         self._target_path = helpers.check_path(path)
 
+    @property
+    def is_generated(self):
+        """True if the content of the resource is held in memory or produced when it is written, rather than read
+        from the source file"""
+        return self._content is not None or self._content_writer is not None
+
+    @property
+    def content(self):
+        """The in memory content of the resource as bytes. None if the resource is not held in memory."""
+        return self._content
+
+    @property
+    def size(self):
+        """Size of the resource in bytes. None if the content is produced first when the resource is written."""
+        if self._content is not None:
+            return len(self._content)
+        if self._content_writer:
+            return None
+        return self.absolute_source_path.stat().st_size
+
+    def set_content(self, content):
+        """Keeps the given bytes in memory as the content of the resource"""
+        self._content = bytes(content)
+
+    def set_string_content(self, string):
+        """Keeps the given string in memory as the content of the resource. The string is encoded the same way as if
+        written to a file opened in text mode."""
+        buffer = io.BytesIO()
+        wrapper = io.TextIOWrapper(buffer)
+        wrapper.write(string)
+        wrapper.flush()
+        wrapper.detach()
+        self.set_content(buffer.getvalue())
+
+    def set_content_writer(self, content_writer):
+        """Sets a callable that writes the content of the resource to a given binary file object. The content is
+        then produced first when the resource is written to a storage."""
+        self._content_writer = content_writer
+
+    def write_content(self, fid):
+        """Writes the content of the resource to the given binary file object"""
+        if self._content is not None:
+            fid.write(self._content)
+            return
+        if self._content_writer:
+            self._content_writer(fid)
+            return
+        with open(self.absolute_source_path, 'rb') as source:
+            shutil.copyfileobj(source, fid)
+
+    def materialize(self):
+        """Makes sure the content of the resource exists at absolute_source_path and returns the path"""
+        path = self.absolute_source_path
+        if self.is_generated and not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as fid:
+                self.write_content(fid)
+        return path
+
     @property
     def date(self):
         try:
@@ -75,14 +142,22 @@ class Resource:
 
     @classmethod
     def from_string_content(cls, string, file_name=None, attributes={}):
-        import uuid
-        if file_name:
-            temp_path = Path(helpers.get_temp_directory(), file_name)
-        else:
-            temp_path = Path(helpers.get_temp_directory(), str(uuid.uuid4()))
-        with open(temp_path, 'w') as fid:
-            fid.write(string)
-        return cls(temp_path.parent, temp_path.name, attributes=attributes)
+        """Creates a resource with the given string as content. The content is kept in memory and written directly
+        by the storages. Content larger than MAX_IN_MEMORY_CONTENT_SIZE is spilled to a file in the temp directory."""
+        resource = cls(helpers.TEMP_DIRECTORY, file_name or str(uuid.uuid4()), attributes=attributes)
+        resource.set_string_content(string)
+        if len(resource.content) > MAX_IN_MEMORY_CONTENT_SIZE:
+            resource.spill()
+        return resource
+
+    def spill(self):
+        """Moves in memory content to a file at absolute_source_path"""
+        if self._content is None:
+            return
+        self._source_directory = helpers.get_temp_directory()
+        with open(self.absolute_source_path, 'wb') as fid:
+            fid.write(self._content)
+        self._content = None
 
 
 class ResourceCollection:
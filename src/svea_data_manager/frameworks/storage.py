@@ -1,28 +1,60 @@
+import contextlib
+import fnmatch
 import os
 import pathlib
 import shutil
 import subprocess
+import tempfile
+import threading
+import urllib.parse
 import xml.etree.ElementTree as ET
 import logging
 
 from abc import ABC, abstractmethod
 
 from svea_data_manager.frameworks import Package
+from svea_data_manager.frameworks import CancellationToken
+from svea_data_manager.frameworks import PlanItem, PackagePlan
 from svea_data_manager.frameworks import exceptions
+from svea_data_manager.frameworks import compression
+from svea_data_manager.frameworks import file_copy
+from svea_data_manager.frameworks.container import TarContainer
+from svea_data_manager.frameworks.resource import MAX_IN_MEMORY_CONTENT_SIZE
 from svea_data_manager.sdm_event import post_event
+from svea_data_manager.sdm_instrumentation import timed, count
 
 logger = logging.getLogger(__name__)
 
 
 class Storage(ABC):
+    # Set to True if different packages can be written to the storage from several threads at the same time.
+    # Instruments write packages to other storages one at a time, also with write_workers.
+    concurrent_writes = False
 
-    def write(self, package, force=False):
+    def write(self, package, force=False, cancel_token=None, plan=None):
+        """Writes the package. If a PackagePlan (from the plan method) is given the storage is not checked again
+        and only the resources planned to be copied are written."""
         if not isinstance(package, Package):
             raise TypeError(
                 'package must be an instance '
                 'of Package, not {}'.format(type(package))
             )
-        return self._write(package, force=force)
+        if plan is None:
+            plan = self._plan(package, force=force)
+        elif plan.package is not package or plan.storage is not self:
+            msg = f'Plan {plan} was not made for package {package} in this storage'
+            logger.error(msg)
+            raise ValueError(msg)
+        return self._write(package, plan, cancel_token=cancel_token or CancellationToken())
+
+    def plan(self, package, force=False):
+        """Returns a PackagePlan telling what writing the package would do, without writing anything"""
+        if not isinstance(package, Package):
+            raise TypeError(
+                'package must be an instance '
+                'of Package, not {}'.format(type(package))
+            )
+        return self._plan(package, force=force)
 
     def delete(self, package):
         if not isinstance(package, Package):
@@ -33,9 +65,26 @@ class Storage(ABC):
         return self._delete(package)
 
     @abstractmethod
-    def _write(self, package, **kwargs):
+    def _plan(self, package, force=False):
         pass
 
+    @abstractmethod
+    def _write(self, package, plan, **kwargs):
+        pass
+
+    @staticmethod
+    def _post_plan_events(package, plan):
+        for item in plan.items:
+            if item.action == PlanItem.NO_TARGET:
+                msg = f'Will not write file. No target path given for file: {item.resource.absolute_source_path}'
+                logger.info(msg)
+                post_event('on_target_path_not_given',
+                           dict(instrument=package.instrument, path=item.resource.absolute_source_path))
+            elif item.action in [PlanItem.SKIP, PlanItem.CONFLICT]:
+                msg = f'Will not write file. {item.reason}'
+                logger.warning(msg)
+                post_event('on_target_path_exists', dict(instrument=package.instrument, path=item.target_path))
+
     @abstractmethod
     def _delete(self, package):
         pass
@@ -44,65 +93,229 @@ class Storage(ABC):
 
 
 class FileStorage(Storage):
+    concurrent_writes = True
 
-    def __init__(self, root_directory):
+    def __init__(self, root_directory, copy_strategies=None, append_patterns=None):
         root_directory = pathlib.Path(root_directory).resolve()
         if not root_directory.is_dir():
             msg = f'root_directory must be an existing, writeable directory: {root_directory}'
             logger.error(msg)
             raise ValueError(msg)
+        unknown = [strategy for strategy in copy_strategies or [] if strategy not in file_copy.COPY_STRATEGIES]
+        if unknown:
+            msg = f'Unknown copy strategies {unknown}. Use some of: {", ".join(file_copy.COPY_STRATEGIES)}'
+            logger.error(msg)
+            raise ValueError(msg)
         self._root_directory = root_directory
-
-    def _write(self, package, force=False):
+        # Strategies tried in order when copying files (see file_copy.copy_file). None for all available.
+        self._copy_strategies = copy_strategies
+        # fnmatch patterns of the names of files that grow in the source (e.g. daily files written during the day).
+        # When such a file has grown since it was written only the new bytes are appended to the target file.
+        self._append_patterns = list(append_patterns or [])
+        # Listings of target directories with file name as key and os.DirEntry (or size of files written by this
+        # storage) as value. Each directory is listed once per run which saves a round trip per file on network
+        # shares. Files written by others during the run are not seen.
+        self._directory_listings = {}
+        self._listings_lock = threading.Lock()
+
+    def clear_directory_listings(self):
+        with self._listings_lock:
+            self._directory_listings = {}
+
+    def _plan(self, package, force=False):
         if force:
             msg = 'Not allowed to force writing to File Storage'
             logger.error(msg)
             raise exceptions.ForceNotAllowed(msg)
-        # list with tuples of (source_path, target_path, instrument, key).
-        files_to_copy = []
-
-        # first iteration: extract files to copy and check for existence.
-        for resource in package.resources:
-            instrument = package.instrument
-            key = str(package)
-            absolute_source_path = resource.absolute_source_path
+        # list with tuples of (resource number, PlanItem). Sorted to the order of the resources when done.
+        items = []
+        targets = {}
+        for nr, resource in enumerate(package.resources):
             if resource.target_path is None:
-                msg = f'Will not write file. No target path given for file: {resource.absolute_source_path}'
-                logger.info(msg)
-                post_event('on_target_path_not_given', dict(instrument=instrument, path=resource.absolute_source_path))
+                items.append((nr, PlanItem(PlanItem.NO_TARGET, resource)))
                 continue
             absolute_target_path = self._resolve_path(resource.target_path)
+            targets.setdefault(absolute_target_path.parent, []).append((nr, resource, absolute_target_path))
+
+        # Existence is checked with one (cached) listing per target directory instead of one lookup per file.
+        planned_paths = set()
+        for directory, resources in targets.items():
+            existing = self._get_directory_listing(directory, package.instrument)
+            for nr, resource, absolute_target_path in resources:
+                items.append((nr, self._plan_resource(resource, absolute_target_path, existing, planned_paths,
+                                                      package.instrument)))
+        items.sort(key=lambda item: item[0])
+        return PackagePlan(package, self, [item for nr, item in items])
+
+    def _plan_resource(self, resource, absolute_target_path, existing, planned_paths, instrument=None):
+        size = resource.size
+        if absolute_target_path in planned_paths:
+            reason = f'Another resource in the package has target path {absolute_target_path}.'
+            return PlanItem(PlanItem.CONFLICT, resource, absolute_target_path, size, reason)
+        planned_paths.add(absolute_target_path)
+        entry = existing.get(absolute_target_path.name)
+        if entry is None:
+            return PlanItem(PlanItem.COPY, resource, absolute_target_path, size)
+        reason = f'Resource with target path {absolute_target_path} already exists.'
+        if not isinstance(entry, int):
+            # The size of a listed file is one stat call
+            count('syscalls_stat', instrument)
+        existing_size = FileStorage._get_entry_size(entry)
+        if size is None or existing_size == size:
+            return PlanItem(PlanItem.SKIP, resource, absolute_target_path, size, reason)
+        if existing_size is not None and existing_size < size and self._can_append(resource, absolute_target_path):
+            if file_copy.is_prefix(absolute_target_path, resource.absolute_source_path, existing_size):
+                reason = f'Source file {resource.absolute_source_path} has grown by {size - existing_size} bytes.'
+                return PlanItem(PlanItem.APPEND, resource, absolute_target_path, size, reason, offset=existing_size)
+            reason = f'{reason} The existing file differs from the beginning of the source file.'
+            return PlanItem(PlanItem.CONFLICT, resource, absolute_target_path, size, reason)
+        reason = f'{reason} The existing file differs in size.'
+        return PlanItem(PlanItem.CONFLICT, resource, absolute_target_path, size, reason)
+
+    def _can_append(self, resource, absolute_target_path):
+        """True if new bytes of the source file of the resource may be appended to the existing target file"""
+        if resource.is_generated or not self._append_patterns:
+            return False
+        return any(fnmatch.fnmatchcase(absolute_target_path.name, pattern) for pattern in self._append_patterns)
+
+    def _get_directory_listing(self, directory, instrument=None):
+        with self._listings_lock:
+            listing = self._directory_listings.get(directory)
+        if listing is None:
+            # Listed without holding the lock. If two threads list the same directory the first listing is kept.
+            new_listing = self._list_directory(directory)
+            with self._listings_lock:
+                listing = self._directory_listings.setdefault(directory, new_listing)
+            count('directory_listings', instrument)
+            count('syscalls_scandir', instrument)
+        return listing
+
+    @staticmethod
+    def _list_directory(directory):
+        """Returns a dict with name as key and os.DirEntry as value for the content of directory"""
+        try:
+            with os.scandir(directory) as entries:
+                return {entry.name: entry for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            return {}
+
+    @staticmethod
+    def _get_entry_size(entry):
+        if isinstance(entry, int):
+            return entry
+        if not entry.is_file():
+            return None
+        return entry.stat().st_size
+
+    def _add_to_directory_listing(self, path, size):
+        with self._listings_lock:
+            listing = self._directory_listings.get(path.parent)
+            if listing is not None:
+                listing[path.name] = size
+
+    def _write(self, package, plan, cancel_token=None):
+        self._post_plan_events(package, plan)
+        inst = package.instrument
+        key = str(package)
 
-            if not force and absolute_target_path.exists():
-                msg = f'Will not write file. Resource with target path {absolute_target_path} already exists.'
-                logger.warning(msg)
-                post_event('on_target_path_exists', dict(instrument=instrument, path=absolute_target_path))
-                continue
-
-            files_to_copy.append(
-                (absolute_source_path, absolute_target_path, instrument, key)
-            )
-
-        # second iteration: write extracted files to target.
         copied_files = []
-        nr_files_to_copy = len(files_to_copy)
-        for nr, (source_path, target_path, inst, key) in enumerate(files_to_copy):
-            os.makedirs(target_path.parent, exist_ok=True)
-            copied_file = shutil.copyfile(source_path, target_path)
-            copied_files.append(copied_file)
+        items_to_copy = plan.items_to_copy
+        nr_files_to_copy = len(items_to_copy)
+        for nr, item in enumerate(items_to_copy):
+            cancel_token.check(f'Writing package {key} was cancelled after {nr} of {nr_files_to_copy} files')
+            strategy, size = self._copy_item(item, inst)
+            copied_files.append(item.target_path)
+            self._post_file_copied(package, item, size, nr + 1, nr_files_to_copy, strategy)
+
+        return copied_files + self._append_items(package, plan, cancel_token)
+
+    def _append_items(self, package, plan, cancel_token):
+        """Appends the new bytes of grown source files to the target files. Returns the target paths."""
+        inst = package.instrument
+        appended_files = []
+        items_to_append = plan.items_to_append
+        for nr, item in enumerate(items_to_append):
+            cancel_token.check(f'Writing package {package} was cancelled after appending to {nr} of '
+                               f'{len(items_to_append)} files')
+            with timed('append', inst):
+                nr_bytes = file_copy.append_file(item.resource.absolute_source_path, item.target_path, item.offset)
+            size = item.offset + nr_bytes
+            self._add_to_directory_listing(item.target_path, size)
+            appended_files.append(item.target_path)
             post_event('on_progress', dict(instrument=inst,
-                                           msg=f'Copying files from package {key} to file storage...',
-                                           percentage=int((nr+1)/nr_files_to_copy*100),
+                                           msg=f'Appending to files from package {package} in file storage...',
+                                           percentage=int((nr + 1) / len(items_to_append) * 100),
                                            ))
-            post_event('on_file_copied', dict(instrument=inst,
-                                           msg='Copying files to file storage...',
-                                           source_path=source_path,
-                                           target_path=target_path,
-                                           nr_files_total=nr_files_to_copy,
-                                           nr_files_copied=nr + 1
-                                           ))
-
-        return copied_files
+            post_event('on_file_appended', dict(instrument=inst,
+                                                msg='Appending to files in file storage...',
+                                                source_path=item.resource.absolute_source_path,
+                                                target_path=item.target_path,
+                                                size=size,
+                                                nr_bytes_appended=nr_bytes,
+                                                ))
+        return appended_files
+
+    def _copy_item(self, item, instrument=None):
+        """Writes the resource of the plan item to its own file. Returns the copy strategy used and the size"""
+        target_path = item.target_path
+        os.makedirs(target_path.parent, exist_ok=True)
+        with timed('copy', instrument):
+            strategy = self._write_file(item.resource, target_path, self._copy_strategies)
+        size = item.size
+        if size is None:
+            size = os.path.getsize(target_path)
+            count('syscalls_stat', instrument)
+        self._add_to_directory_listing(target_path, size)
+        return strategy, size
+
+    @staticmethod
+    def _post_file_copied(package, item, size, nr_files_copied, nr_files_total, strategy):
+        inst = package.instrument
+        post_event('on_progress', dict(instrument=inst,
+                                       msg=f'Copying files from package {package} to file storage...',
+                                       percentage=int(nr_files_copied/nr_files_total*100),
+                                       ))
+        post_event('on_file_copied', dict(instrument=inst,
+                                          msg='Copying files to file storage...',
+                                          source_path=item.resource.absolute_source_path,
+                                          target_path=item.target_path,
+                                          size=size,
+                                          nr_files_total=nr_files_total,
+                                          nr_files_copied=nr_files_copied,
+                                          strategy=strategy
+                                          ))
+
+    @staticmethod
+    def _write_file(resource, target_path, copy_strategies=None):
+        """Copies the source file, or writes the content of a generated resource, to target_path. The file is written
+        to a temporary name first so that an interrupted write never leaves a partial file at target_path (which
+        would be taken as already written on the next run). Returns the copy strategy used, or 'generated'."""
+        part_path = target_path.with_name(f'{target_path.name}.part')
+        try:
+            if resource.is_generated:
+                with open(part_path, 'wb') as fid:
+                    resource.write_content(fid)
+                strategy = 'generated'
+            else:
+                strategy = file_copy.copy_file(resource.absolute_source_path, part_path, copy_strategies)
+            os.replace(part_path, target_path)
+        finally:
+            if part_path.exists():
+                os.remove(part_path)
+        return strategy
+
+    @staticmethod
+    def _open_resource(resource, stack):
+        """Returns a binary file object with the content of the resource, closed with the given ExitStack, and the
+        size of the content"""
+        if resource.is_generated:
+            fid = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=MAX_IN_MEMORY_CONTENT_SIZE))
+            resource.write_content(fid)
+            size = fid.tell()
+            fid.seek(0)
+            return fid, size
+        fid = stack.enter_context(open(resource.absolute_source_path, 'rb'))
+        return fid, os.fstat(fid.fileno()).st_size
 
     def _delete(self, package):
         # TODO: Clean up left-overs: empty parent directories.
@@ -120,7 +333,191 @@ class FileStorage(Storage):
         return self._root_directory.joinpath(path)
 
 
+class ContainerStorage(FileStorage):
+    """File storage that packs the files of some target directories into one TarContainer per directory (e.g. one
+    per day of IFCB raw data) instead of writing a file for each resource. Appending to a container is sequential
+    I/O, while creating many small files is slow on some file systems. container_directories are fnmatch patterns of
+    target directories relative to the root directory, e.g. '*/data_raw/*/*'. Files in other directories are
+    written as in FileStorage. Files already written as separate files to a container directory are not written
+    again. Members of containers can not be deleted."""
+
+    def __init__(self, root_directory, container_directories, copy_strategies=None, append_patterns=None):
+        super().__init__(root_directory, copy_strategies=copy_strategies, append_patterns=append_patterns)
+        self._container_directories = list(container_directories)
+        # TarContainer and lock per directory. Packages of the same day are appended one at a time.
+        self._containers = {}
+        self._containers_lock = threading.Lock()
+
+    def is_container_directory(self, directory):
+        """True if files with target paths in the given (absolute) directory are written to a container"""
+        try:
+            relative_directory = pathlib.Path(directory).relative_to(self._root_directory).as_posix()
+        except ValueError:
+            return False
+        return any(fnmatch.fnmatchcase(relative_directory, pattern) for pattern in self._container_directories)
+
+    def get_container(self, directory):
+        return self._get_container_and_lock(directory)[0]
+
+    def _get_container_and_lock(self, directory):
+        with self._containers_lock:
+            if directory not in self._containers:
+                self._containers[directory] = (TarContainer.for_directory(directory), threading.Lock())
+            return self._containers[directory]
+
+    def _can_append(self, resource, absolute_target_path):
+        if self.is_container_directory(absolute_target_path.parent):
+            return False
+        return super()._can_append(resource, absolute_target_path)
+
+    def _list_directory(self, directory):
+        listing = FileStorage._list_directory(directory)
+        if self.is_container_directory(directory):
+            container, lock = self._get_container_and_lock(directory)
+            with lock:
+                listing.update(container.members)
+        return listing
+
+    def _write(self, package, plan, cancel_token=None):
+        self._post_plan_events(package, plan)
+        inst = package.instrument
+        key = str(package)
+
+        copied_files = []
+        items_to_copy = plan.items_to_copy
+        nr_files_to_copy = len(items_to_copy)
+        container_items = {}
+        for item in items_to_copy:
+            if self.is_container_directory(item.target_path.parent):
+                container_items.setdefault(item.target_path.parent, []).append(item)
+                continue
+            cancel_token.check(f'Writing package {key} was cancelled after {len(copied_files)} of '
+                               f'{nr_files_to_copy} files')
+            strategy, size = self._copy_item(item, inst)
+            copied_files.append(item.target_path)
+            self._post_file_copied(package, item, size, len(copied_files), nr_files_to_copy, strategy)
+
+        for directory, items in container_items.items():
+            cancel_token.check(f'Writing package {key} was cancelled after {len(copied_files)} of '
+                               f'{nr_files_to_copy} files')
+            sizes = self._append_to_container(directory, items, inst)
+            for item, size in zip(items, sizes):
+                copied_files.append(item.target_path)
+                self._post_file_copied(package, item, size, len(copied_files), nr_files_to_copy, 'container')
+
+        return copied_files + self._append_items(package, plan, cancel_token)
+
+    def _append_to_container(self, directory, items, instrument=None):
+        """Appends the resources of the plan items to the container of directory. Returns the sizes written."""
+        container, lock = self._get_container_and_lock(directory)
+        with contextlib.ExitStack() as stack:
+            members = []
+            for item in items:
+                fid, size = self._open_resource(item.resource, stack)
+                members.append((item.target_path.name, fid, size))
+            with lock, timed('container_append', instrument):
+                container.append(members)
+        sizes = [size for name, fid, size in members]
+        for item, size in zip(items, sizes):
+            self._add_to_directory_listing(item.target_path, size)
+        return sizes
+
+    def _delete(self, package):
+        for resource in package.resources:
+            absolute_target_path = self._resolve_path(resource.target_path)
+            if self.is_container_directory(absolute_target_path.parent):
+                logger.warning(f'Can not delete {absolute_target_path}. It is in a container.')
+        return super()._delete(package)
+
+
+class CompressedFileStorage(FileStorage):
+    """File storage that compresses files with the given suffixes (e.g. ['.roi', '.adc']) with zstd, one object
+    <name>.zst per file. A CompressionManifest in each directory maps the target file names to the objects and holds
+    the uncompressed sizes, so that existing files are found by name and size as in FileStorage. Other files are
+    copied as in FileStorage. Needs the optional dependency zstandard."""
+
+    def __init__(self, root_directory, compressed_suffixes, level=compression.DEFAULT_LEVEL,
+                 threads=compression.DEFAULT_THREADS, copy_strategies=None, append_patterns=None):
+        super().__init__(root_directory, copy_strategies=copy_strategies, append_patterns=append_patterns)
+        compression.get_zstandard()
+        self._compressed_suffixes = {suffix.lower() for suffix in compressed_suffixes}
+        self._level = level
+        self._threads = threads
+        self._manifests = {}
+        self._manifests_lock = threading.Lock()
+
+    def is_compressed(self, path):
+        """True if a file with the given target path is compressed"""
+        return pathlib.Path(path).suffix.lower() in self._compressed_suffixes
+
+    def get_manifest(self, directory):
+        with self._manifests_lock:
+            if directory not in self._manifests:
+                self._manifests[directory] = compression.CompressionManifest(directory)
+            return self._manifests[directory]
+
+    def _can_append(self, resource, absolute_target_path):
+        if self.is_compressed(absolute_target_path):
+            return False
+        return super()._can_append(resource, absolute_target_path)
+
+    def _list_directory(self, directory):
+        listing = FileStorage._list_directory(directory)
+        if compression.MANIFEST_NAME not in listing:
+            return listing
+        manifest = self.get_manifest(directory)
+        with manifest.lock:
+            listing.update({name: item['size'] for name, item in manifest.files.items()})
+        return listing
+
+    def _write(self, package, plan, cancel_token=None):
+        try:
+            return super()._write(package, plan, cancel_token=cancel_token)
+        finally:
+            self._save_manifests()
+
+    def _copy_item(self, item, instrument=None):
+        target_path = item.target_path
+        if not self.is_compressed(target_path):
+            return super()._copy_item(item, instrument)
+        os.makedirs(target_path.parent, exist_ok=True)
+        object_name = f'{target_path.name}{compression.ZSTD_SUFFIX}'
+        with contextlib.ExitStack() as stack, timed('compress', instrument):
+            fid, size = self._open_resource(item.resource, stack)
+            compressed_size = compression.compress_to_file(fid, target_path.with_name(object_name), size=size,
+                                                           level=self._level, threads=self._threads)
+        self.get_manifest(target_path.parent).add(target_path.name, object_name, size, compressed_size)
+        self._add_to_directory_listing(target_path, size)
+        count('compressed_bytes_saved', instrument, size - compressed_size)
+        return compression.ZSTD, size
+
+    def _save_manifests(self):
+        with self._manifests_lock:
+            manifests = list(self._manifests.values())
+        for manifest in manifests:
+            manifest.save()
+
+    def _delete(self, package):
+        removed_files = []
+        for resource in package.resources:
+            absolute_target_path = self._resolve_path(resource.target_path)
+            manifest = self.get_manifest(absolute_target_path.parent)
+            object_path = manifest.get_object_path(absolute_target_path.name)
+            if object_path is None:
+                continue
+            manifest.remove(absolute_target_path.name)
+            if object_path.is_file():
+                os.remove(object_path)
+                removed_files.append(object_path)
+        self._save_manifests()
+        return removed_files + super()._delete(package)
+
+
 class SubversionStorage(Storage):
+    # Every package is one commit. Concurrent commits to the same repository would just be serialised (or fail
+    # as out of date) by the server.
+    concurrent_writes = False
+
     class MissingExecutable(Exception):
         """An required external program could not be found on the system"""
         pass
@@ -129,6 +526,10 @@ class SubversionStorage(Storage):
         """An error occurred when executing the Subversion binary"""
         pass
 
+    # Error codes of svn list for a path that does not exist in the repository
+    NOT_FOUND_ERRORS = ['W160013', 'E200009', 'E170000']
+    ROOT_DIRECTORY = pathlib.PurePosixPath('.')
+
     def __init__(self, root_url, username=None, password=None):
         self._root_url = root_url
         self._username = username
@@ -145,77 +546,98 @@ class SubversionStorage(Storage):
 
         self._svn_exec = svn_exec
         self._svnmucc_exec = svnmucc_exec
-
-    def _write(self, package, force=False):
-        # list of files and dirs already in version control.
-        existing_paths = self._get_versioned_paths()
-
-        # list with tuples of (source_path, target_path) to add.
-        files_to_add = []
-
-        # first iteration: extract files to add and check for existence.
-        nr_files = len(package.resources)
-        messages = set()
-        for nr, resource in enumerate(package.resources):
-            instrument = package.instrument
-            absolute_source_path = resource.absolute_source_path
-            print(f'{resource.attributes=}')
-            svn_message = resource.attributes.get('svn_commit_message')
-            if svn_message:
-                messages.add(svn_message)
+        # Listings of the directories that packages are written to, with directory as key. The value is a dict with
+        # name as key and file size (None for dirs) as value, or None if the directory is not in version control.
+        # Only the target directories of the packages are listed, and each of them once per run. Listings are
+        # updated with what this storage commits, but commits by others during the run are not seen.
+        self._directory_listings = {}
+        self._listings_lock = threading.Lock()
+
+    def clear_directory_listings(self):
+        with self._listings_lock:
+            self._directory_listings = {}
+
+    def _plan(self, package, force=False):
+        items = []
+        planned_paths = set()
+        new_directories = set()
+        for resource in package.resources:
             if resource.target_path is None:
-                msg = f'Will not write file. No target path given for file: {resource.absolute_source_path}'
-                logger.info(msg)
-                post_event('on_target_path_not_given', dict(instrument=instrument, path=resource.absolute_source_path))
+                items.append(PlanItem(PlanItem.NO_TARGET, resource))
                 continue
             relative_target_path = pathlib.PurePosixPath(resource.target_path)
+            size = resource.size
 
-            post_event('on_progress',
-                       dict(instrument=package.instrument,
-                            msg='Checking file existence in SVN',
-                            percentage=int((nr+1)/nr_files*100),
-                            nr_files_total=nr_files,
-                            nr_files_copied=nr
-                            ))
+            if relative_target_path in planned_paths:
+                reason = f'Another resource in the package has target path {relative_target_path}.'
+                items.append(PlanItem(PlanItem.CONFLICT, resource, relative_target_path, size, reason))
+                continue
+            planned_paths.add(relative_target_path)
 
-            if not force and relative_target_path in existing_paths:
-                msg = f'Will not write file. Resource with target path {relative_target_path} already exists.'
-                logger.warning(msg)
-                post_event('on_target_path_exists', dict(instrument=instrument, path=relative_target_path))
+            existing_entries = self._get_directory_listing(relative_target_path.parent, package.instrument) or {}
+            if not force and relative_target_path.name in existing_entries:
+                reason = f'Resource with target path {relative_target_path} already exists.'
+                if size is None or existing_entries[relative_target_path.name] == size:
+                    items.append(PlanItem(PlanItem.SKIP, resource, relative_target_path, size, reason))
+                else:
+                    reason = f'{reason} The existing file differs in size.'
+                    items.append(PlanItem(PlanItem.CONFLICT, resource, relative_target_path, size, reason))
                 continue
-                # raise exceptions.ResourceAlreadyInStorage(
-                #     'resource with target path {} '
-                #     'already exists.'.format(relative_target_path)
-                # )
 
-            files_to_add.append(
-                (absolute_source_path, relative_target_path)
-            )
+            # schedule mkdir action for target's missing parents (if any).
+            item_directories = []
+            for parent_path in self._get_missing_directories(relative_target_path.parent, package.instrument):
+                if parent_path not in new_directories:
+                    item_directories.append(parent_path)
+                    new_directories.add(parent_path)
+
+            items.append(PlanItem(PlanItem.COPY, resource, relative_target_path, size,
+                                  new_directories=item_directories))
+        return PackagePlan(package, self, items)
+
+    def _write(self, package, plan, cancel_token=None):
+        self._post_plan_events(package, plan)
+
+        messages = set()
+        for resource in package.resources:
+            svn_message = resource.attributes.get('svn_commit_message')
+            if svn_message:
+                messages.add(svn_message)
 
-        # second iteration: build up multi command transaction (put, mkdir, etc).
+        # build up multi command transaction (put, mkdir, etc).
         multi_command = []
         commited_additions = []
-        nr_files = len(files_to_add)
-        for nr, (source_path, target_path) in enumerate(files_to_add):
-
-            # schedule mkdir action for target's missing parents (if any).
-            parent_path = None
-            for parent_name in target_path.parent.parts:
-                if parent_path == None:
-                    parent_path = pathlib.PurePosixPath(parent_name)
-                else:
-                    parent_path = parent_path.joinpath(parent_name)
-                if parent_path not in existing_paths + commited_additions:
-                    multi_command = multi_command + ['mkdir', str(parent_path)]
-                    commited_additions.append(parent_path)
+        # (path, size) of the committed files, for the directory listings
+        committed_files = []
+        # The missing directories are worked out again instead of taken from the plan. Packages planned together
+        # may share new directories, and they exist once the first of the packages has been committed.
+        new_directories = []
+        items_to_copy = plan.items_to_copy
+        nr_files = len(items_to_copy)
+        for nr, item in enumerate(items_to_copy):
+            cancel_token.check(f'Writing package {package} was cancelled before commit')
+
+            for parent_path in self._get_missing_directories(item.target_path.parent, package.instrument):
+                if parent_path in new_directories:
+                    continue
+                new_directories.append(parent_path)
+                multi_command = multi_command + ['mkdir', str(parent_path)]
+                commited_additions.append(parent_path)
+
+            source_path = item.resource.absolute_source_path
+            if item.resource.is_generated:
+                # svnmucc can only put files that exist on disk.
+                source_path = item.resource.materialize()
 
             # schedule put action for target.
-            multi_command = multi_command + ['put', str(source_path), str(target_path)]
-            commited_additions.append(target_path)
+            multi_command = multi_command + ['put', str(source_path), str(item.target_path)]
+            commited_additions.append(item.target_path)
+            committed_files.append((item.target_path,
+                                    item.size if item.size is not None else os.path.getsize(source_path)))
             post_event('on_svn_storage_prepared',
                        dict(instrument=package.instrument,
                             source_path=source_path,
-                            target_path=target_path,
+                            target_path=item.target_path,
                             nr_files_total=nr_files,
                             nr_files_copied=nr
                             ))
@@ -224,6 +646,9 @@ class SubversionStorage(Storage):
             logger.info('No files prepared for svn storage')
             return
 
+        # Last chance to cancel. The commit itself is atomic.
+        cancel_token.check(f'Writing package {package} was cancelled before commit')
+
         post_event('on_progress',
                    dict(instrument=package.instrument,
                         msg='Starting commit to SVN',
@@ -235,7 +660,9 @@ class SubversionStorage(Storage):
         if messages:
             add = '; '.join(messages)
             commit_message = f'{commit_message}: {add}'
-        self._run_svn_multi_command(*multi_command, commit_message=commit_message)
+        with timed('svn_commit', package.instrument):
+            self._run_svn_multi_command(*multi_command, commit_message=commit_message)
+        self._add_to_directory_listings(committed_files, new_directories)
 
         post_event('on_progress',
                    dict(instrument=package.instrument,
@@ -246,14 +673,12 @@ class SubversionStorage(Storage):
         return commited_additions
 
     def _delete(self, package):
-        # list of files and dirs already in version control.
-        existing_paths = self._get_versioned_paths()
-
         multi_command = []
         commited_removals = []
         for resource in package.resources:
             relative_target_path = pathlib.PurePosixPath(resource.target_path)
-            if relative_target_path in existing_paths:
+            existing_entries = self._get_directory_listing(relative_target_path.parent, package.instrument) or {}
+            if relative_target_path.name in existing_entries:
                 # target exists in repo, schedule removal.
                 multi_command = multi_command + ['rm', str(relative_target_path)]
                 commited_removals.append(relative_target_path)
@@ -262,16 +687,70 @@ class SubversionStorage(Storage):
         commit_message = 'Remove files for package: %s' % package
         self._run_svn_multi_command(*multi_command, commit_message=commit_message)
 
+        with self._listings_lock:
+            for path in commited_removals:
+                listing = self._directory_listings.get(path.parent)
+                if listing:
+                    listing.pop(path.name, None)
+
         return commited_removals
 
-    def _get_versioned_paths(self):
-        xml_output = self._run_svn_command(
-            'list', '--depth', 'infinity', '--xml', self._root_url
-        )
-        return [
-            pathlib.PurePosixPath(name.text)
-            for name in ET.fromstring(xml_output).findall('list/entry/name')
-        ]
+    def _get_directory_listing(self, directory, instrument=None):
+        """Returns a dict with name as key and file size (None for dirs) as value for the entries directly in
+        directory. Returns None if the directory is not in version control."""
+        with self._listings_lock:
+            if directory in self._directory_listings:
+                return self._directory_listings[directory]
+            # Known to be missing if the parent directory has been listed. No need to ask the server then.
+            known_missing = directory != self.ROOT_DIRECTORY and directory.parent in self._directory_listings and \
+                directory.name not in (self._directory_listings[directory.parent] or {})
+        if known_missing:
+            listing = None
+        else:
+            with timed('svn_list', instrument):
+                listing = self._list_directory(directory)
+            count('svn_directory_listings', instrument)
+        with self._listings_lock:
+            return self._directory_listings.setdefault(directory, listing)
+
+    def _list_directory(self, directory):
+        try:
+            xml_output = self._run_svn_command('list', '--depth', 'immediates', '--xml', self._get_url(directory))
+        except SubversionStorage.SubversionError as e:
+            if directory != self.ROOT_DIRECTORY and any(code in str(e) for code in self.NOT_FOUND_ERRORS):
+                return None
+            raise
+        entries = {}
+        for entry in ET.fromstring(xml_output).findall('list/entry'):
+            size = entry.findtext('size')
+            entries[entry.findtext('name')] = None if size is None else int(size)
+        return entries
+
+    def _get_missing_directories(self, directory, instrument=None):
+        """Returns the directories, from the top down, that has to be created for directory to exist. Parents are
+        listed only as long as they are missing."""
+        missing = []
+        while directory != self.ROOT_DIRECTORY and self._get_directory_listing(directory, instrument) is None:
+            missing.append(directory)
+            directory = directory.parent
+        return list(reversed(missing))
+
+    def _add_to_directory_listings(self, files, directories):
+        with self._listings_lock:
+            for path in directories:
+                self._directory_listings[path] = {}
+                parent_listing = self._directory_listings.get(path.parent)
+                if parent_listing is not None:
+                    parent_listing[path.name] = None
+            for path, size in files:
+                listing = self._directory_listings.get(path.parent)
+                if listing is not None:
+                    listing[path.name] = size
+
+    def _get_url(self, directory):
+        if directory == self.ROOT_DIRECTORY:
+            return self._root_url
+        return f'{self._root_url.rstrip("/")}/{urllib.parse.quote(directory.as_posix())}'
 
     def _run_command(self, exec_path, *args, **kwargs):
         cmd = [exec_path, '--non-interactive']
@@ -284,12 +763,13 @@ class SubversionStorage(Storage):
 
         cmd = cmd + list(args)
 
-        completed_process = subprocess.run(
-            cmd,
-            capture_output=True,
-            universal_newlines=True,
-            **kwargs
-        )
+        with timed(f'subprocess_{pathlib.Path(exec_path).stem}'):
+            completed_process = subprocess.run(
+                cmd,
+                capture_output=True,
+                universal_newlines=True,
+                **kwargs
+            )
 
         if completed_process.returncode != 0:
             raise SubversionStorage.SubversionError(
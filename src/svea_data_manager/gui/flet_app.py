@@ -13,8 +13,8 @@ import yaml
 
 from svea_data_manager import SveaDataManager
 from svea_data_manager.sdm_logger import SDMLogger
-from svea_data_manager import sdm_event
 from svea_data_manager.sdm_event import subscribe
+from svea_data_manager.sdm_worker import ArchiveJob, JobWorker, JobCancelled, ThrottledCallback
 from svea_data_manager.gui.tooltip_texts import TooltipTexts, get_tooltip_widget
 
 logger = logging.getLogger(__name__)
@@ -64,6 +64,12 @@ INSTRUMENT_BG_COLORS = {
 
 CLEANUP_LOG_AFTER_NR_DAYS = 7
 
+# Number of instruments that can be archived at the same time.
+MAX_PARALLEL_JOBS = 3
+
+# Minimum time in seconds between page updates triggered by progress events.
+PAGE_UPDATE_INTERVAL = 0.2
+
 
 def get_instrument_bg_color(inst):
     return INSTRUMENT_BG_COLORS.get(inst.lower(), DEFAULT_INSTRUMENT_BG_COLOR)
@@ -115,8 +121,11 @@ class FletApp:
         self._current_source_instrument = None
 
         self._toggle_buttons = []
+        self._cancel_button = None
+        self._finished_jobs = []
 
-        sdm_event.subscribe('after_write_packages', self._on_archiving_finished)
+        self._worker = JobWorker(nr_threads=MAX_PARALLEL_JOBS, on_idle=self._on_archiving_finished)
+        self._throttled_update_page = ThrottledCallback(self.update_page, interval=PAGE_UPDATE_INTERVAL)
 
         self.logging_level = 'DEBUG'
         self.logging_format = '%(asctime)s [%(levelname)10s]    %(pathname)s [%(lineno)d] => %(funcName)s():    %(message)s'
@@ -343,7 +352,10 @@ class FletApp:
         btn = ft.ElevatedButton(text=f'Arkivera data från alla instrument',
                                                   on_click=self._archive_all_data)
         self._toggle_buttons.append(btn)
-        self._instrument_listview.controls.append(btn)
+        self._cancel_button = ft.ElevatedButton(text='Avbryt arkivering',
+                                                on_click=self._cancel_archiving,
+                                                disabled=True)
+        self._instrument_listview.controls.append(ft.Row([btn, self._cancel_button]))
         if not self._config:
             return
         for key, value in self._config.items():
@@ -476,7 +488,6 @@ class FletApp:
         self._archive_data()
 
     def _archive_data(self, inst=None):
-        self._disable_toggle_buttons()
         self._close_banner()
         self._update_config_items()
         self._update_config_attributes()
@@ -488,23 +499,36 @@ class FletApp:
         if not config:
             self._show_info('Du har inte angivit källmapp för något instrument!')
             return
-        self._progress_bars[inst.upper()].value = 0.1
-        self.update_page()
-        sdm = SveaDataManager.from_config(config)
-        print('Reading')
-        sdm.read_packages()
-        print('Transforming')
-        sdm.transform_packages()
-        print('Writing')
-        sdm.write_packages()
-        report_dir = self._write_report()
-        self._show_result_ok(report_dir)
-
+        self._disable_toggle_buttons()
+        self._cancel_button.disabled = False
+        self._finished_jobs = []
         for ins in config:
             self._progress_bars[ins.upper()].value = 0
-            self._progress_texts[ins.upper()].value = 'Allt klart!'
+            self._progress_texts[ins.upper()].value = 'Väntar...'
+            # One job per instrument so that the instruments are archived in parallel.
+            self._worker.submit(ArchiveJob({ins: config[ins]}, on_finished=self._on_job_finished))
         self.update_page()
 
+    def _cancel_archiving(self, e=None):
+        self._worker.cancel_all()
+        self._cancel_button.disabled = True
+        for job in self._worker.jobs:
+            for ins in job.instruments:
+                self._progress_texts[ins.upper()].value = 'Avbryter...'
+        self.update_page()
+
+    def _on_job_finished(self, job):
+        self._finished_jobs.append(job)
+        for ins in job.instruments:
+            self._progress_bars[ins.upper()].value = 0
+            if isinstance(job.error, JobCancelled):
+                self._progress_texts[ins.upper()].value = 'Avbruten!'
+            elif job.error:
+                self._progress_texts[ins.upper()].value = 'Något gick fel!'
+            else:
+                self._progress_texts[ins.upper()].value = 'Allt klart!'
+        self._throttled_update_page()
+
     def _disable_toggle_buttons(self):
         for btn in self._toggle_buttons:
             btn.disabled = True
@@ -627,15 +651,16 @@ class FletApp:
         self._report_bottom_sheet.update()
         self._logger.reset()
 
-    def _show_result_except(self, ex):
+    def _show_result_except(self, ex, trace=None):
+        trace = trace or traceback.format_exc()
         cont = ft.Container(bgcolor='red', padding=10)
         col = ft.Column(expand=True)
         cont.content = col
         col.controls.append(ft.Text('Något gick fel!'))
         lv = ft.ListView()
         col.controls.append(lv)
-        lv.controls.append(f'{ex}\n{traceback.format_exc()}')
-        logger.critical(traceback.format_exc())
+        lv.controls.append(ft.Text(f'{ex}\n{trace}'))
+        logger.critical(trace)
         self._report_container.content = cont
         self._open_report_bottom_sheet()
         self._logger.reset()
@@ -661,7 +686,7 @@ class FletApp:
             return
         pbar.value = data['percentage'] / 100
         text.value = data.get('msg', '')
-        self.update_page()
+        self._throttled_update_page()
 
     # def _callback_file_storage(self, data):
     #     pbar = self._progress_bars.get(data['instrument'].upper())
@@ -677,8 +702,18 @@ class FletApp:
     #     pbar.value = data['nr_files_copied'] / data['nr_files_total']
     #     self.update_page()
 
-    def _on_archiving_finished(self, data):
+    def _on_archiving_finished(self):
+        failed_jobs = [job for job in self._finished_jobs
+                       if job.error and not isinstance(job.error, JobCancelled)]
         self._enable_toggle_buttons()
+        if self._cancel_button:
+            self._cancel_button.disabled = True
+        report_dir = self._write_report()
+        if failed_jobs:
+            self._show_result_except(failed_jobs[0].error, failed_jobs[0].traceback)
+        else:
+            self._show_result_ok(report_dir)
+        self.update_page()
 
 
 def main():
@@ -3,6 +3,7 @@ import logging
 import logging.handlers
 import os
 import pathlib
+import queue
 import re
 import shutil
 import sys
@@ -14,8 +15,9 @@ from tkinter import messagebox
 import yaml
 from yaml import SafeLoader
 
-from svea_data_manager import SveaDataManager
+from svea_data_manager.sdm_event import subscribe
 from svea_data_manager.sdm_logger import SDMLogger
+from svea_data_manager.sdm_worker import ArchiveJob, JobWorker, JobCancelled
 
 logger = logging.getLogger(__file__)
 
@@ -25,6 +27,9 @@ if getattr(sys, 'frozen', False):
 elif __file__:
     DIRECTORY = pathlib.Path(__file__).parent
 
+# How often (in milliseconds) events from the running job are checked.
+POLL_INTERVAL_MS = 200
+
 
 class App(tk.Tk):
     def __init__(self, *args, **kwargs):
@@ -52,9 +57,19 @@ class App(tk.Tk):
 
         self._logger = SDMLogger()
 
+        # Events from the worker thread are put on this queue and handled in the Tk main thread.
+        self._event_queue = queue.Queue()
+        self._worker = JobWorker(nr_threads=1)
+        self._job = None
+        self._on_job_done = None
+        self._progress = {}
+        self._stringvars_status = {}
+        subscribe('on_progress', self._on_progress_event)
+
         self._create_config_stringvars()
         self._build()
         self._startup()
+        self.after(POLL_INTERVAL_MS, self._poll_event_queue)
 
     @property
     def _default_config_path(self):
@@ -159,6 +174,14 @@ class App(tk.Tk):
         self._button_run_all.grid(row=r, column=1, **grid, sticky='e')
         self._button_run_all.configure(state='disabled')
 
+        self._button_cancel = tk.Button(frame, text='Avbryt', command=self._cancel_run)
+        self._button_cancel.grid(row=r, column=0, **grid, sticky='w')
+        self._button_cancel.configure(state='disabled')
+
+        r += 1
+        self._frame_status = tk.Frame(frame)
+        self._frame_status.grid(row=r, column=0, columnspan=2, **grid, sticky='w')
+
         grid_configure(frame, nr_columns=2, nr_rows=r+1)
 
     def _build_frame_config(self):
@@ -331,34 +354,29 @@ class App(tk.Tk):
                 logger.debug(msg)
                 return
         self._write_latest_config(self._config)
-        try:
-            report_dir = self._run_with_config(self._config)
-            nr_accepted_str = '\n'.join(
-                [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_resources_added().items()])
-            nr_rejected_str = '\n'.join(
-                [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_resources_rejected().items()])
-            nr_transformed_str = '\n'.join(
-                [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_transform_added_files().items()])
-            nr_copied_str = '\n'.join(
-                [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_files_copied().items()])
-            nr_not_copied_str = '\n'.join(
-                [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_target_path_exists().items()])
-
-            msg = f'Hanteringen är klar för samtliga instrument. ' \
-                  f'Antal filer som hanterats: \n{nr_accepted_str}\n\n' \
-                  f'Antal filer som inte hanterats: \n{nr_rejected_str}\n\n' \
-                  f'Antal filer som lagts till under prosessen: \n{nr_transformed_str}\n\n' \
-                  f'Antal filer som kopierats: \n{nr_copied_str}\n\n' \
-                  f'Antal filer som inte kopierats: \n{nr_not_copied_str}\n\n' \
-                  f'Se fullständig rapport under: {report_dir}.'
-            messagebox.showinfo('Hanterar alla instrument', msg)
-            logger.debug(msg)
-            self._logger.reset()
-        except Exception as e:
-            messagebox.showerror('Något gick fel', f'{e}\n\n{traceback.format_exc()}')
-            logger.critical(e)
-            logger.critical(traceback.format_exc())
-            raise
+        self._start_job(self._config, self._show_result_all_instruments)
+
+    def _show_result_all_instruments(self, report_dir):
+        nr_accepted_str = '\n'.join(
+            [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_resources_added().items()])
+        nr_rejected_str = '\n'.join(
+            [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_resources_rejected().items()])
+        nr_transformed_str = '\n'.join(
+            [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_transform_added_files().items()])
+        nr_copied_str = '\n'.join(
+            [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_files_copied().items()])
+        nr_not_copied_str = '\n'.join(
+            [f'{inst}: {nr}' for inst, nr in self._logger.get_nr_target_path_exists().items()])
+
+        msg = f'Hanteringen är klar för samtliga instrument. ' \
+              f'Antal filer som hanterats: \n{nr_accepted_str}\n\n' \
+              f'Antal filer som inte hanterats: \n{nr_rejected_str}\n\n' \
+              f'Antal filer som lagts till under prosessen: \n{nr_transformed_str}\n\n' \
+              f'Antal filer som kopierats: \n{nr_copied_str}\n\n' \
+              f'Antal filer som inte kopierats: \n{nr_not_copied_str}\n\n' \
+              f'Se fullständig rapport under: {report_dir}.'
+        messagebox.showinfo('Hanterar alla instrument', msg)
+        logger.debug(msg)
 
     def _run_instrument(self, inst, show_message=False):
         self._add_attributes_to_config()
@@ -372,38 +390,109 @@ class App(tk.Tk):
             return
         config = {inst: data}
         self._write_latest_config(config)
-        try:
-            report_dir = self._run_with_config(config)
-            msg = f'Hanteringen är klar för instrument: {inst.upper()}. \n\n' \
-                  f'Antal filer som hanterats: {self._logger.get_nr_resources_added(inst)}\n' \
-                  f'Antal filer som inte hanterats: {self._logger.get_nr_resources_rejected(inst)}\n' \
-                  f'Antal filer som lagts till under prosessen: {self._logger.get_nr_transform_added_files(inst)}\n' \
-                  f'Antal filer som kopierats: {self._logger.get_nr_files_copied(inst)}\n' \
-                  f'Antal filer som inte kopierats: {self._logger.get_nr_target_path_exists(inst)}\n\n' \
-                  f'Se fullständig rapport under: {report_dir}.'
-            messagebox.showinfo('Hanterar alla instrument', msg)
-            logger.debug(msg)
-            self._logger.reset()
-        except Exception as e:
-            messagebox.showerror('Något gick fel', f'{e}\n\n{traceback.format_exc()}')
-            logger.critical(e)
-            logger.critical(traceback.format_exc())
-            raise
+        self._start_job(config, lambda report_dir: self._show_result_instrument(inst, report_dir))
+
+    def _show_result_instrument(self, inst, report_dir):
+        msg = f'Hanteringen är klar för instrument: {inst.upper()}. \n\n' \
+              f'Antal filer som hanterats: {self._logger.get_nr_resources_added(inst)}\n' \
+              f'Antal filer som inte hanterats: {self._logger.get_nr_resources_rejected(inst)}\n' \
+              f'Antal filer som lagts till under prosessen: {self._logger.get_nr_transform_added_files(inst)}\n' \
+              f'Antal filer som kopierats: {self._logger.get_nr_files_copied(inst)}\n' \
+              f'Antal filer som inte kopierats: {self._logger.get_nr_target_path_exists(inst)}\n\n' \
+              f'Se fullständig rapport under: {report_dir}.'
+        messagebox.showinfo('Hanterar alla instrument', msg)
+        logger.debug(msg)
 
     @staticmethod
     def _write_latest_config(config):
         with open(pathlib.Path(DIRECTORY, 'latest_config.yaml'), 'w') as fid:
             yaml.dump(config, fid)
 
-    def _run_with_config(self, config):
-        sdm = SveaDataManager.from_config(config)
-        sdm.read_packages()
-        sdm.transform_packages()
-        sdm.write_packages()
+    def _start_job(self, config, on_done):
+        """Runs the given config in the worker thread. on_done(report_dir) is called in the Tk main thread when
+        the job has finished successfully."""
+        if self._job and not self._job.done:
+            messagebox.showwarning('Hantering pågår', 'Vänta tills pågående hantering är klar eller avbryt den.')
+            return
+        self._on_job_done = on_done
+        self._build_status_frame(config)
+        self._set_run_state(running=True)
+        self._job = self._worker.submit(ArchiveJob(config, on_finished=self._on_job_finished))
+
+    def _cancel_run(self):
+        if not self._job:
+            return
+        self._job.cancel()
+        self._button_cancel.configure(state='disabled')
+        for inst in self._job.instruments:
+            self._progress[inst.upper()] = 'Avbryter efter pågående paket...'
+
+    def _set_run_state(self, running):
+        self._button_run_all.configure(state='disabled' if running else 'normal')
+        self._button_cancel.configure(state='normal' if running else 'disabled')
+        for button in getattr(self, '_buttons_run', {}).values():
+            button.configure(state='disabled' if running else 'normal')
+
+    def _build_status_frame(self, config):
+        for child in self._frame_status.winfo_children():
+            child.destroy()
+        self._progress = {}
+        self._stringvars_status = {}
+        for r, inst in enumerate(config):
+            self._progress[inst.upper()] = 'Väntar...'
+            self._stringvars_status[inst.upper()] = tk.StringVar()
+            tk.Label(self._frame_status, textvariable=self._stringvars_status[inst.upper()]).grid(row=r, column=0,
+                                                                                                   sticky='w')
+        self._update_status()
+
+    def _update_status(self):
+        for inst, stringvar in self._stringvars_status.items():
+            stringvar.set(f'{inst}: {self._progress.get(inst, "")}    '
+                          f'hanterade: {self._logger.get_nr_resources_added(inst)}, '
+                          f'ej hanterade: {self._logger.get_nr_resources_rejected(inst)}, '
+                          f'kopierade: {self._logger.get_nr_files_copied(inst)}, '
+                          f'fanns redan: {self._logger.get_nr_target_path_exists(inst)}')
+
+    def _on_progress_event(self, data):
+        """Called from the worker thread"""
+        self._event_queue.put(('progress', data))
+
+    def _on_job_finished(self, job):
+        """Called from the worker thread"""
+        self._event_queue.put(('finished', job))
+
+    def _poll_event_queue(self):
+        try:
+            while True:
+                event, data = self._event_queue.get_nowait()
+                if event == 'progress':
+                    self._progress[data['instrument'].upper()] = f"{data.get('msg', '')} {data['percentage']}%"
+                elif event == 'finished':
+                    self._handle_finished_job(data)
+        except queue.Empty:
+            pass
+        self._update_status()
+        self.after(POLL_INTERVAL_MS, self._poll_event_queue)
+
+    def _handle_finished_job(self, job):
+        self._set_run_state(running=False)
         report_dir = self._logger.write_reports(self._report_directory)
-        return report_dir
-        # messagebox.showinfo('Arkivering klar!', f'Arkiveringen av instrument {", ".join(config.keys())} är färdig\n'
-        #                                         f'Se rapport under: {report_dir}')
+        if isinstance(job.error, JobCancelled):
+            for inst in job.instruments:
+                self._progress[inst.upper()] = 'Avbruten!'
+            self._update_status()
+            messagebox.showinfo('Hanteringen avbröts', f'Hanteringen avbröts.\n\n'
+                                                       f'Se rapport för det som hann hanteras under: {report_dir}.')
+        elif job.error:
+            messagebox.showerror('Något gick fel', f'{job.error}\n\n{job.traceback}')
+            logger.critical(job.error)
+            logger.critical(job.traceback)
+        else:
+            for inst in job.instruments:
+                self._progress[inst.upper()] = 'Klar!'
+            self._update_status()
+            self._on_job_done(report_dir)
+        self._logger.reset()
 
     #     self._report = sdm.get_report_text()
     #     self._show_report_frame()
@@ -1,10 +1,15 @@
+import collections
 import datetime
+import json
 import logging
 import os
 import pathlib
 import shutil
 import sys
+import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
@@ -19,6 +24,15 @@ else:
 # TEMP_DIRECTORY = pathlib.Path(ROOT_DIR, 'sdm_temp')
 TEMP_DIRECTORY = pathlib.Path(pathlib.Path.home(), 'sdm_temp')
 
+# Unlike the temp directory, the cache directory is kept between runs.
+CACHE_DIRECTORY = pathlib.Path(pathlib.Path.home(), 'sdm_cache')
+
+# Members with these suffixes are already compressed and are stored as is in zip files.
+ZIP_STORED_SUFFIXES = ['.zip', '.mat', '.png', '.jpg', '.gz', '.nc']
+
+# Files larger than this are streamed by the zip writer instead of being read ahead by the worker threads.
+ZIP_READ_AHEAD_MAX_SIZE = 64 * 1024 * 1024
+
 
 def get_temp_directory():
     create_temp_directory()
@@ -29,6 +43,80 @@ def create_temp_directory():
     TEMP_DIRECTORY.mkdir(parents=True, exist_ok=True)
 
 
+def get_cache_directory():
+    CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    return CACHE_DIRECTORY
+
+
+def get_file_signature(path):
+    """Returns [modification time, size] of path. Stored in caches to see if the file has been modified."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class PersistentCache:
+    """Key/value cache stored as a json file in the cache directory. Values must be json serializable."""
+
+    def __init__(self, name):
+        self._path = pathlib.Path(CACHE_DIRECTORY, f'{name}.json')
+        self._data = None
+        self._changed = False
+        # Reentrant since set holds the lock when data is loaded
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def data(self):
+        with self._lock:
+            if self._data is None:
+                self._data = {}
+                if self._path.exists():
+                    try:
+                        with open(self._path, encoding='utf8') as fid:
+                            self._data = json.load(fid)
+                    except (ValueError, OSError) as e:
+                        logger.warning(f'Could not read cache file {self._path}. Starting with empty cache: {e}')
+            return self._data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            self._changed = True
+
+    def remove(self, key):
+        with self._lock:
+            if key in self.data:
+                del self.data[key]
+                self._changed = True
+
+    def clear(self):
+        with self._lock:
+            self._data = {}
+            self._changed = True
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            get_cache_directory()
+            # Unique temp name since other instances (e.g. of jobs running at the same time) may save the same file
+            fd, temp_path = tempfile.mkstemp(dir=self._path.parent, prefix=f'{self._path.name}.', suffix='.part')
+            try:
+                with open(fd, 'w', encoding='utf8') as fid:
+                    json.dump(self.data, fid)
+                os.replace(temp_path, self._path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            self._changed = False
+
+
 def clear_temp_dir(days_old=0):
     """ Deletes old files in the temp folder """
     if not TEMP_DIRECTORY.exists():
@@ -48,14 +136,52 @@ def clear_temp_dir(days_old=0):
                 pass
 
 
-def create_zip_file(file_paths, output_path, rel_path):
-    with zipfile.ZipFile(output_path, 'w') as zipf:
-        for file_path in file_paths:
-            if file_path.is_file():
-                # Get the relative path of the file
-                relative_path = file_path.relative_to(rel_path)
-                # Add the file to the zip using the relative path
-                zipf.write(file_path, arcname=relative_path)
+def get_zip_compression(path):
+    """Returns the zip compression method to use for the given file path"""
+    if Path(path).suffix.lower() in ZIP_STORED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _read_zip_member(file_path, rel_path):
+    """Returns (zip_info, content) for the given file. content is None for files that are too large to be read
+    ahead. Returns None if file_path is not a file."""
+    if not file_path.is_file():
+        return None
+    zip_info = zipfile.ZipInfo.from_file(file_path, arcname=file_path.relative_to(rel_path))
+    zip_info.compress_type = get_zip_compression(file_path)
+    if zip_info.file_size > ZIP_READ_AHEAD_MAX_SIZE:
+        return zip_info, None
+    return zip_info, file_path.read_bytes()
+
+
+def create_zip_file(file_paths, output_path, rel_path, max_workers=None):
+    """Creates a zip file with the given file_paths stored relative to rel_path. output_path can be a path or a
+    writable binary file object. Files are stat:ed and read by a pool of worker threads ahead of the zip writer and
+    the compression is chosen per file type, see get_zip_compression."""
+    file_paths = [Path(path) for path in file_paths]
+    max_workers = max_workers or min(8, (os.cpu_count() or 1) + 4)
+    with zipfile.ZipFile(output_path, 'w', allowZip64=True) as zipf, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        file_paths_iter = iter(file_paths)
+        while True:
+            # Keep a bounded number of members read ahead so that memory use stays limited.
+            for file_path in file_paths_iter:
+                pending.append((file_path, executor.submit(_read_zip_member, file_path, rel_path)))
+                if len(pending) >= max_workers * 2:
+                    break
+            if not pending:
+                break
+            file_path, future = pending.popleft()
+            member = future.result()
+            if member is None:
+                continue
+            zip_info, content = member
+            if content is None:
+                zipf.write(file_path, arcname=zip_info.filename, compress_type=zip_info.compress_type)
+            else:
+                zipf.writestr(zip_info, content)
 
 
 def check_path(path):
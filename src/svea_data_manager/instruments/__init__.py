@@ -1,5 +1,39 @@
-from svea_data_manager.instruments.adcp import ADCP
-from svea_data_manager.instruments.ctd import CTD
-from svea_data_manager.instruments.ferrybox import Ferrybox
-from svea_data_manager.instruments.mvp import MVP
-from svea_data_manager.instruments.ifcb import IFCB
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Instrument classes by upper case instrument name. The modules are imported first when the instrument class is
+# requested so that a run (or GUI) handling one instrument does not import the dependencies of all the others.
+INSTRUMENT_CLASSES = {
+    'ADCP': ('svea_data_manager.instruments.adcp', 'ADCP'),
+    'CTD': ('svea_data_manager.instruments.ctd', 'CTD'),
+    'FERRYBOX': ('svea_data_manager.instruments.ferrybox', 'Ferrybox'),
+    'MVP': ('svea_data_manager.instruments.mvp', 'MVP'),
+    'IFCB': ('svea_data_manager.instruments.ifcb', 'IFCB'),
+}
+
+__all__ = [class_name for module_name, class_name in INSTRUMENT_CLASSES.values()]
+
+
+def get_instrument_names():
+    return list(INSTRUMENT_CLASSES)
+
+
+def get_instrument_class(name):
+    """Returns the instrument class registered for the given instrument name (case insensitive)"""
+    try:
+        module_name, class_name = INSTRUMENT_CLASSES[name.upper()]
+    except KeyError:
+        msg = f'No instrument registered with name {name}'
+        logger.error(msg)
+        raise ValueError(msg)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def __getattr__(name):
+    # Keeps "from svea_data_manager.instruments import IFCB" working without importing all instrument modules.
+    for module_name, class_name in INSTRUMENT_CLASSES.values():
+        if class_name == name:
+            return getattr(importlib.import_module(module_name), class_name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,3 +1,5 @@
+import bisect
+import csv
 import logging
 import pathlib
 import re
@@ -5,8 +7,11 @@ import shutil
 import datetime
 
 from svea_data_manager.frameworks import Instrument, Resource
-from svea_data_manager.frameworks import FileStorage
+from svea_data_manager.frameworks import FileStorage, CompressedFileStorage
+from svea_data_manager.frameworks import compression
 from svea_data_manager.frameworks import exceptions
+from svea_data_manager import helpers
+from svea_data_manager.sdm_event import post_event
 
 
 CRUISE_NOT_NEEDED_AFTER_DATE = datetime.date(2023, 1, 1)
@@ -23,16 +28,73 @@ CRUISE_MAPPING = {
 }
 
 
+# Only the beginning of log files is searched for the start date.
+LOG_FILE_MAX_READ_BYTES = 64 * 1024
+
+DATE_PATTERN = re.compile(r'\d{4}/\d{2}/\d{2}')
+
+# Suffixes of the binary raw files (VmDas) compressed when compressed_storage is set
+COMPRESSED_SUFFIXES = ['.enr', '.ens', '.enx', '.sta', '.lta', '.n1r', '.n2r']
+
+
 logger = logging.getLogger(__name__)
 
 
-def get_start_date_from_log_file(path):
-    with open(path) as fid:
-        for line in fid:
-            date_strings = re.findall(r'\d{4}/\d{2}/\d{2}', line)
-            if not date_strings:
+class CruiseIndex:
+    """Maps dates to cruise numbers. The cruise periods are kept sorted on start date so that lookups are done with
+    bisect instead of scanning all periods."""
+
+    def __init__(self, mapping):
+        self._periods = sorted((fr, to, str(cruise)) for (fr, to), cruise in mapping.items())
+        self._starts = [fr for fr, to, cruise in self._periods]
+        for (fr, to, cruise), (next_fr, next_to, next_cruise) in zip(self._periods, self._periods[1:]):
+            if next_fr <= to:
+                msg = f'Overlapping cruise periods: {fr} - {to} (cruise {cruise}) and ' \
+                      f'{next_fr} - {next_to} (cruise {next_cruise})'
+                logger.error(msg)
+                raise ValueError(msg)
+
+    def __len__(self):
+        return len(self._periods)
+
+    def get(self, date):
+        """Returns the cruise number for the given date or None if the date is not within any cruise period"""
+        index = bisect.bisect_right(self._starts, date) - 1
+        if index < 0:
+            return None
+        fr, to, cruise = self._periods[index]
+        if date <= to:
+            return cruise
+        return None
+
+    @classmethod
+    def from_file(cls, path):
+        """Reads a tab, semicolon or comma separated file with header start_date, end_date, cruise.
+        Dates are given as YYYY-MM-DD."""
+        with open(path, encoding='utf8') as fid:
+            content = fid.read()
+        header = content.split('\n', 1)[0]
+        delimiter = next((sep for sep in '\t;,' if sep in header), ',')
+        mapping = {}
+        for row in csv.DictReader(content.splitlines(), delimiter=delimiter):
+            if not row.get('start_date'):
                 continue
-            return datetime.datetime.strptime(date_strings[0], '%Y/%m/%d').date()
+            fr = datetime.date.fromisoformat(row['start_date'].strip())
+            to = datetime.date.fromisoformat(row['end_date'].strip())
+            mapping[(fr, to)] = row['cruise'].strip()
+        return cls(mapping)
+
+
+CRUISE_INDEX = CruiseIndex(CRUISE_MAPPING)
+
+
+def get_start_date_from_log_file(path, max_bytes=LOG_FILE_MAX_READ_BYTES):
+    with open(path, 'rb') as fid:
+        content = fid.read(max_bytes).decode('latin-1')
+    match = DATE_PATTERN.search(content)
+    if not match:
+        return None
+    return datetime.datetime.strptime(match.group(), '%Y/%m/%d').date()
 
 
 def get_start_date_from_cruise_info_file(path):
@@ -45,24 +107,45 @@ def get_start_date_from_cruise_info_file(path):
                 return datetime.datetime.strptime(date_strings[0], '%Y/%m/%d').date()
 
 
-def get_cruise_number_for_date(date):
+def get_cruise_number_for_date(date, cruise_index=CRUISE_INDEX):
     if date > CRUISE_NOT_NEEDED_AFTER_DATE:
         return True
-    for key, value in CRUISE_MAPPING.items():
-        fr, to = key
-        if fr <= date <= to:
-            return value
-    return False
+    cruise = cruise_index.get(date)
+    if cruise is None:
+        return False
+    return cruise
 
 
 class ADCP(Instrument):
     name = 'ADCP'
     desc = 'ADCP monitoring from Svea'
+    # The readme files are added to every data package in transform_packages
+    transform_barrier = True
 
     def __init__(self, config):
         super().__init__(config)
-        self._storage = FileStorage(self._config['target_directory'])
+        if self._config.get('compressed_storage', False):
+            # Binary raw files compressed with zstd
+            self._storage = CompressedFileStorage(
+                self._config['target_directory'],
+                compressed_suffixes=self._config.get('compressed_suffixes', COMPRESSED_SUFFIXES),
+                level=self._config.get('compression_level', compression.DEFAULT_LEVEL),
+                threads=self._config.get('compression_threads', compression.DEFAULT_THREADS),
+                copy_strategies=self._config.get('copy_strategies'))
+        else:
+            self._storage = FileStorage(self._config['target_directory'],
+                                        copy_strategies=self._config.get('copy_strategies'))
         self._package_key_attributes = {}
+        self._cruise_index = CRUISE_INDEX
+        if self._config.get('cruise_table'):
+            self._cruise_index = CruiseIndex.from_file(self._config['cruise_table'])
+        # Start dates found in log and cruise info files. Path as key and [modification time, size, date] as value,
+        # so that a file that grows replaces its entry.
+        self._date_cache = helpers.PersistentCache('adcp_start_dates')
+
+    @property
+    def resource_classes(self):
+        return [ADCPResourceProcessed, ADCPResourceRaw, ADCPResourceReadme]
 
     def prepare_resource(self, source_file):
         resource = ADCPResourceProcessed.from_source_file(self.source_directory, source_file)
@@ -104,11 +187,53 @@ class ADCP(Instrument):
 
     def transform_packages(self, **kwargs):
         self._package_key_attributes = {}
+        readme_package = None
+        data_packages = []
         for package in self.packages:
             attributes = self.transform_package(package, **kwargs)
             if str(package) == 'readme':
+                readme_package = package
                 continue
             self._package_key_attributes[str(package)] = attributes
+            data_packages.append(package)
+        self._date_cache.save()
+        if readme_package:
+            self._add_readme_resources(readme_package, data_packages)
+            self.packages.remove(readme_package)
+
+    def _add_readme_resources(self, readme_package, data_packages):
+        """Adds a copy of each readme resource to every data package so that the readme files are written together
+        with the rest of the package"""
+        for package in data_packages:
+            attributes = dict(self._package_key_attributes[str(package)], package_key=str(package))
+            for readme in readme_package.resources:
+                resource = ADCPResourceReadme(readme.source_directory,
+                                              readme.source_path,
+                                              dict(readme.attributes, **attributes))
+                package.resources.add(resource)
+                post_event('on_transform_add_file', dict(instrument=self.name, resource=resource,
+                                                         name=resource.target_path))
+
+    def _get_start_date(self, resource):
+        if resource.source_path.stem == 'cruise_info':
+            get_start_date = get_start_date_from_cruise_info_file
+        elif resource.source_path.suffix.upper() == '.LOG':
+            get_start_date = get_start_date_from_log_file
+        else:
+            return None
+        path = resource.absolute_source_path
+        key = str(path)
+        signature = helpers.get_file_signature(path)
+        item = self._date_cache.get(key)
+        if item is None or item[:2] != signature:
+            date = get_start_date(path)
+            # An empty string means that the file has been read but no date was found.
+            self._date_cache.set(key, signature + [date.isoformat() if date else ''])
+            return date
+        date_str = item[2]
+        if not date_str:
+            return None
+        return datetime.date.fromisoformat(date_str)
 
     def transform_package(self, package, **kwargs):
         date = None
@@ -116,12 +241,9 @@ class ADCP(Instrument):
         resource = {}
         for resource in package.resources:
             if not date:
-                if resource.source_path.stem == 'cruise_info':
-                    date = get_start_date_from_cruise_info_file(resource.absolute_source_path)
-                elif resource.source_path.suffix.upper() == '.LOG':
-                    date = get_start_date_from_log_file(resource.absolute_source_path)
+                date = self._get_start_date(resource)
                 if date:
-                    cruise = get_cruise_number_for_date(date)
+                    cruise = get_cruise_number_for_date(date, self._cruise_index)
                     if cruise is True:
                         break
                     elif cruise is False:
@@ -145,15 +267,7 @@ class ADCP(Instrument):
 
     def write_package(self, package):
         logger.info('Writing package %s to subversion repo' % package)
-        # return self._storage.write(package, self._config.get('force', False))
-        if str(package) == 'readme':
-            for key, attr in self._package_key_attributes.items():
-                attr['package_key'] = key
-                for resource in package.resources:
-                    resource.attributes.update(attr)
-                self._storage.write(package, self._config.get('force', False))
-        else:
-            return self._storage.write(package, self._config.get('force', False))
+        return self._storage.write(package, self._config.get('force', False), cancel_token=self.cancel_token)
 
 
 class ADCPResource(Resource):
@@ -296,7 +410,7 @@ class ADCPResourceReadme(ADCPResource):
     @staticmethod
     def from_source_file(root_directory, source_file):
         if 'readme' in str(source_file):
-            resource = ADCPResourceReadme(root_directory, source_file)
+            resource = ADCPResourceReadme(root_directory, source_file, {})
             return resource
         logger.info(f'Not patterns match for file: {source_file}')
 
@@ -27,6 +27,10 @@ class CTD(Instrument):
         self._storage = SubversionStorage(self._config['subversion_repo_url'])
         # self._storage = FileStorage(self._config['target_directory'])
 
+    @property
+    def resource_classes(self):
+        return [CTDResource]
+
     def prepare_resource(self, source_file):
         return CTDResource.from_source_file(self.source_directory, source_file)
 
@@ -35,7 +39,7 @@ class CTD(Instrument):
 
     def write_package(self, package):
         logger.info('Writing package %s to subversion repo' % package)
-        return self._storage.write(package, self._config.get('force', False))
+        return self._storage.write(package, self._config.get('force', False), cancel_token=self.cancel_token)
 
 
 class CTDResource(Resource):
@@ -3,17 +3,24 @@ import pathlib
 import re
 import datetime
 
-from svea_data_manager.frameworks import FileStorage
+from svea_data_manager.frameworks import FileStorage, ContainerStorage
 from svea_data_manager.frameworks import Instrument, Resource, Package
 from svea_data_manager.frameworks import SubversionStorage
 from svea_data_manager.frameworks import exceptions
 
 logger = logging.getLogger(__name__)
 
+# Target directories written to containers when container_storage is set, i.e. <year>/DeviceData/<device>/...
+CONTAINER_DIRECTORIES = ['*/DeviceData/*']
+# Daily files that grow during the day. New bytes are appended to the archived file unless append_growing_files is
+# set to false.
+APPEND_PATTERNS = ['All_sensors_*', 'CO2FT *']
+
 
 class Ferrybox(Instrument):
     name = 'Ferrybox'
     desc = 'Ferrybox monitoring from Svea'
+    stream_packages = True
 
     def __init__(self, config):
         super().__init__(config)
@@ -25,9 +32,23 @@ class Ferrybox(Instrument):
         #     msg = 'Missing required configuration wiski_directory.'
         #     logger.error(msg)
         #     raise exceptions.ImproperlyConfiguredInstrument(msg)
-        self._file_storage = FileStorage(self._config['target_directory'])
+        append_patterns = APPEND_PATTERNS if self._config.get('append_growing_files', True) else None
+        if self._config.get('container_storage', False):
+            # One container per DeviceData directory for the many small device files
+            self._file_storage = ContainerStorage(self._config['target_directory'],
+                                                  container_directories=CONTAINER_DIRECTORIES,
+                                                  copy_strategies=self._config.get('copy_strategies'),
+                                                  append_patterns=append_patterns)
+        else:
+            self._file_storage = FileStorage(self._config['target_directory'],
+                                             copy_strategies=self._config.get('copy_strategies'),
+                                             append_patterns=append_patterns)
         # self._wiski_storage = FileStorage(self._config['wiski_directory'])  # Wiski
 
+    @property
+    def resource_classes(self):
+        return [FerryboxResourceRaw, FerryboxResourceCO2, FerryboxResourceWiski]
+
     def prepare_resource(self, source_file):
         resource = FerryboxResourceRaw.from_source_file(self.source_directory, source_file)
         if not resource:
@@ -45,13 +66,18 @@ class Ferrybox(Instrument):
     def get_package_key_for_resource(self, resource):
         return resource.package_key
 
+    def get_storage(self, package):
+        if isinstance(package, FerryboxPackageWiski):
+            return self._wiski_storage
+        return self._file_storage
+
     def write_package(self, package):
         if isinstance(package, FerryboxPackageStorage):
             logger.info('Writing package %s to subversion repo' % package)
-            return self._file_storage.write(package, self._config.get('force', False))
+            return self._file_storage.write(package, self._config.get('force', False), cancel_token=self.cancel_token)
         elif isinstance(package, FerryboxPackageWiski):
             logger.info('Writing package %s to wiski file storage repo' % package)
-            return self._wiski_storage.write(package, self._config.get('force', False))
+            return self._wiski_storage.write(package, self._config.get('force', False), cancel_token=self.cancel_token)
 
 
 class FerryboxPackageStorage(Package):
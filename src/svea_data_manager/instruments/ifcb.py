@@ -1,23 +1,31 @@
+import functools
 import logging
 import pathlib
 import re
 import datetime
+import threading
 
 from svea_data_manager.frameworks import Instrument, Resource
-from svea_data_manager.frameworks import FileStorage
+from svea_data_manager.frameworks import FileStorage, ContainerStorage, CompressedFileStorage
+from svea_data_manager.frameworks import compression
 from svea_data_manager.frameworks import exceptions
 from svea_data_manager.sdm_event import post_event
+from svea_data_manager.sdm_instrumentation import timed
 from svea_data_manager import helpers
 
-from ifcb.metadata import MetadataIFCB
-from ifcb.hdr_file import HdrFile
-
 logger = logging.getLogger(__name__)
 
+# Target directories written to containers when container_storage is set, i.e. <instrument>/data_raw/D<year>/D<date>
+CONTAINER_DIRECTORIES = ['*/data_raw/*/*']
+# Suffixes of the target files compressed when compressed_storage is set
+COMPRESSED_SUFFIXES = ['.adc', '.hdr', '.roi']
+
 
 class IFCB(Instrument):
     name = 'IFCB'
     desc = 'Imaging FlowCytobot (IFCB)'
+    parallel_transform = True
+    stream_packages = True
 
     def __init__(self, config):
         super().__init__(config)
@@ -26,10 +34,34 @@ class IFCB(Instrument):
             msg = 'Missing required configuration target_directory.'
             logger.error(msg)
             raise exceptions.ImproperlyConfiguredInstrument(msg)
-        self._storage = FileStorage(self._config['target_directory'])
+        if self._config.get('container_storage', False) and self._config.get('compressed_storage', False):
+            msg = 'Configurations container_storage and compressed_storage can not be combined.'
+            logger.error(msg)
+            raise exceptions.ImproperlyConfiguredInstrument(msg)
+        if self._config.get('container_storage', False):
+            # One container per day for the raw files (.adc, .hdr, .roi). See ifcb.archive.data_raw for reading.
+            self._storage = ContainerStorage(self._config['target_directory'],
+                                             container_directories=CONTAINER_DIRECTORIES,
+                                             copy_strategies=self._config.get('copy_strategies'))
+        elif self._config.get('compressed_storage', False):
+            # Raw files compressed with zstd. See ifcb.archive.data_raw for reading.
+            self._storage = CompressedFileStorage(
+                self._config['target_directory'],
+                compressed_suffixes=self._config.get('compressed_suffixes', COMPRESSED_SUFFIXES),
+                level=self._config.get('compression_level', compression.DEFAULT_LEVEL),
+                threads=self._config.get('compression_threads', compression.DEFAULT_THREADS),
+                copy_strategies=self._config.get('copy_strategies'))
+        else:
+            self._storage = FileStorage(self._config['target_directory'],
+                                        copy_strategies=self._config.get('copy_strategies'))
+        self._result_lock = threading.Lock()
+        self._reset_result_info()
+        # Last stem of the result files and the number of results with that stem, by instrument
+        self._last_result_stems = {}
 
-    def prepare_resource(self, source_file: pathlib.Path):
-        for cls in [
+    @property
+    def resource_classes(self):
+        return [
             IFCBResourceResult,
             IFCBResourceRaw,
             IFCBResourceProcessed,
@@ -37,13 +69,11 @@ class IFCB(Instrument):
             IFCBResourceManual,
             IFCBResourceConfig,
             IFCBResourceSummary,
+        ]
 
-        ]:
-            source_directory = self.source_directory
-            if helpers.get_temp_directory() in source_file.parents:
-                source_directory = helpers.get_temp_directory()
-                source_file = source_file.relative_to(helpers.get_temp_directory())
-            resource = cls.from_source_file(source_directory, source_file)
+    def prepare_resource(self, source_file: pathlib.Path):
+        for cls in self.resource_classes:
+            resource = cls.from_source_file(self.source_directory, source_file)
             if resource:
                 return resource
 
@@ -55,11 +85,19 @@ class IFCB(Instrument):
     def get_package_key_for_resource(self, resource):
         return resource.package_key
 
-    def transform_packages(self):
-        super().transform_packages()
+    def finish_transform(self, **kwargs):
         self._create_result_package()
 
     def transform_package(self, package, **kwargs):
+        self._add_metadata_resource(package, **kwargs)
+        # Collected here since the packages might be released before the result package is created
+        self._add_to_result_info(package)
+
+    def _add_metadata_resource(self, package, **kwargs):
+        # The ifcb package is only needed when transforming
+        from ifcb.metadata import MetadataIFCB
+        from ifcb.hdr_file import HdrFile
+
         # Look for hdr and metadata file
         metadata_file = None
         hdr_resource = None
@@ -74,10 +112,11 @@ class IFCB(Instrument):
             metadata_file = MetadataIFCB(id=hdr_resource.absolute_source_path.stem)
 
         # Get metadata from hdr file
-        meta = HdrFile(hdr_resource.absolute_source_path).metadata
+        with timed('parse_hdr', self.name):
+            meta = HdrFile(hdr_resource.absolute_source_path).metadata
 
-        # Add external metadata:
-        ext_meta = kwargs.get('attributes', self.config.get('attributes', {}))
+        # Add external metadata. Copied since packages might be transformed in parallel.
+        ext_meta = dict(kwargs.get('attributes', self.config.get('attributes', {})))
         if meta.get('quality_flag') == 'B':
             ext_meta.pop('quality_flag', None)
         meta.update(ext_meta)
@@ -89,41 +128,62 @@ class IFCB(Instrument):
 
     def write_package(self, package):
         logger.info('Writing package %s to file storage' % package)
-        return self._storage.write(package, self.config.get('force', False))
-
-    @staticmethod
-    def _get_result_file_stem(instrument):
-        return f'result_{instrument}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}'
-
-    def _create_result_package(self):
-        raw_file_stems = {}
-        include_file_paths = {}
-        instrument_name = None
-        for pack in self.packages:
-            for resource in pack.resources:
-                if not instrument_name:
-                    instrument_name = resource.attributes.get('instrument')
+        return self._storage.write(package, self.config.get('force', False), cancel_token=self.cancel_token)
+
+    def _get_result_file_stem(self, instrument):
+        """Returns a new stem for the result files. Results made within the same second (e.g. by the batches of a
+        watch) get a number added: result_IFCB134_20240110_120000_2"""
+        stem = f'result_{instrument}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        last_stem, nr = self._last_result_stems.get(instrument, (None, 0))
+        nr = nr + 1 if stem == last_stem else 1
+        self._last_result_stems[instrument] = (stem, nr)
+        if nr > 1:
+            return f'{stem}_{nr}'
+        return stem
+
+    def _reset_result_info(self):
+        self._result_instrument_name = None
+        self._raw_file_stems = {}
+        self._include_file_paths = {}
+
+    def _add_to_result_info(self, package):
+        with self._result_lock:
+            for resource in package.resources:
+                if not self._result_instrument_name:
+                    self._result_instrument_name = resource.attributes.get('instrument')
+                instrument_name = self._result_instrument_name
                 if isinstance(resource, (IFCBResourceRaw, IFCBResourceProcessed)):
-                    raw_file_stems.setdefault(instrument_name, set())
-                    raw_file_stems[instrument_name].add(resource.absolute_source_path.stem)
+                    self._raw_file_stems.setdefault(instrument_name, set())
+                    self._raw_file_stems[instrument_name].add(resource.absolute_source_path.stem)
                     continue
-                include_file_paths.setdefault(instrument_name, [])
-                include_file_paths[instrument_name].append(resource.absolute_source_path)
+                self._include_file_paths.setdefault(instrument_name, [])
+                self._include_file_paths[instrument_name].append(resource.absolute_source_path)
+
+    def _create_result_package(self):
+        with self._result_lock:
+            raw_file_stems = self._raw_file_stems
+            include_file_paths = self._include_file_paths
+            self._reset_result_info()
         for instrument, file_paths in include_file_paths.items():
             file_stem = self._get_result_file_stem(instrument)
-            zip_file_path = pathlib.Path(helpers.get_temp_directory(), f'{file_stem}.zip')
-            txt_file_path = pathlib.Path(helpers.get_temp_directory(), f'{file_stem}.txt')
-            helpers.create_zip_file(file_paths, zip_file_path, rel_path=self.config['source_directory'])
-            self._create_result_txt_file(sorted(raw_file_stems[instrument]), txt_file_path)
-            print(f'{zip_file_path=}')
-            reso = self.add_file(zip_file_path)
-            post_event('on_transform_add_file', dict(instrument=self.name, resource=reso, name=zip_file_path))
-
-    def _create_result_txt_file(self, file_paths, txt_result_file_path):
-        with open(txt_result_file_path, 'w') as fid:
-            fid.write('\n'.join([str(path) for path in file_paths]))
-        reso = self.add_file(txt_result_file_path)
-        post_event('on_transform_add_file', dict(instrument=self.name, resource=reso, name=txt_result_file_path))
+            self._create_result_txt_file(sorted(raw_file_stems[instrument]), f'{file_stem}.txt')
+            # The zip file is written directly to the storage when the package is written.
+            zip_file_name = pathlib.Path(f'{file_stem}.zip')
+            reso = IFCBResourceResult.from_source_file(helpers.TEMP_DIRECTORY, zip_file_name)
+            reso.set_content_writer(functools.partial(self._write_result_zip, sorted(file_paths)))
+            self.add_resource(reso)
+            post_event('on_transform_add_file', dict(instrument=self.name, resource=reso, name=zip_file_name))
+
+    def _write_result_zip(self, file_paths, fid):
+        with timed('build_zip', self.name):
+            helpers.create_zip_file(file_paths, fid, rel_path=self.config['source_directory'],
+                                    max_workers=self.config.get('zip_workers'))
+
+    def _create_result_txt_file(self, file_stems, file_name):
+        reso = IFCBResourceResult.from_source_file(helpers.TEMP_DIRECTORY, pathlib.Path(file_name))
+        reso.set_string_content('\n'.join([str(stem) for stem in file_stems]))
+        self.add_resource(reso)
+        post_event('on_transform_add_file', dict(instrument=self.name, resource=reso, name=file_name))
 
 
 class IFCBResource(Resource):
@@ -148,7 +208,8 @@ class IFCBResource(Resource):
                    f"{self.attributes['minute']}" \
                    f"{self.attributes['second']}" \
                    f"_" \
-                   f"{self.attributes['instrument']}"
+                   f"{self.attributes['instrument']}" \
+                   f"{'_' + self.attributes['nr'] if self.attributes.get('nr') else ''}"
         elif self.source_path.suffix == '.csv':
             return f"summary"
         elif self.source_path.suffix == '.mat':
@@ -372,7 +433,7 @@ class IFCBResourceResult(IFCBResource):
                                                          '(?P<hour>\d{2})',
                                                          '(?P<minute>\d{2})',
                                                          '(?P<second>\d{2})',
-                                                         '(?P<suffix>\.zip|\.txt)',
+                                                         '(?:_(?P<nr>\d+))?(?P<suffix>\.zip|\.txt)',
                                                          )
                    ),
 
@@ -388,8 +449,7 @@ class IFCBResourceResult(IFCBResource):
             name_match = PATTERN.search(source_file.name)
             if name_match:
                 attributes = name_match.groupdict()
-                print(f'{root_directory=}')
-                print(f'{source_file=}')
+                logger.debug(f'{root_directory=}, {source_file=}')
                 return IFCBResourceResult(root_directory, source_file, attributes)
 
 
@@ -22,6 +22,10 @@ class MVP(Instrument):
             )
         self._storage = SubversionStorage(self._config['subversion_repo_url'])
 
+    @property
+    def resource_classes(self):
+        return [MVPResource]
+
     def prepare_resource(self, source_file):
         return MVPResource.from_source_file(self.source_directory, source_file)
 
@@ -30,7 +34,7 @@ class MVP(Instrument):
 
     def write_package(self, package):
         logger.info('Writing package %s to subversion repo' % package)
-        return self._storage.write(package, self._config.get('force', False))
+        return self._storage.write(package, self._config.get('force', False), cancel_token=self.cancel_token)
 
 
 class MVPResource(Resource):
@@ -104,7 +108,7 @@ class MVPResource(Resource):
             return None
         for PATTERN in MVPResource.PATTERNS:
             name_match = PATTERN.search(source_file.stem.upper())
-            print(f'{name_match=}')
+            logger.debug(f'{name_match=}')
             if name_match:
                 attributes = name_match.groupdict()
                 if not attributes.get('transect') and 'RAWDATA' in source_file.parts:
@@ -1,3 +1,8 @@
+import contextlib
+import contextvars
+import functools
+import threading
+
 _sdm_subscribers = dict(
     on_resource_added={},
     on_resource_rejected={},
@@ -6,6 +11,7 @@ _sdm_subscribers = dict(
     on_target_path_not_given={},
     on_progress={},
     on_file_copied={},
+    on_file_appended={},
     on_svn_storage_prepared={},
     log={},
     on_transform_add_file={},
@@ -15,9 +21,18 @@ _sdm_subscribers = dict(
     after_transform_packages={},
     before_write_packages={},
     after_write_packages={},
+    on_timing={},
+    on_count={},
 )
 
 
+_local = threading.local()
+
+# The run (e.g. a SveaDataManager) that the events posted in the current context belong to. Lets subscribers tell
+# apart the events of runs made at the same time in different threads.
+_run = contextvars.ContextVar('sdm_run', default=None)
+
+
 class SDMEventNotFound(Exception):
     pass
 
@@ -33,10 +48,68 @@ def subscribe(event: str, func, prio=50):
     _sdm_subscribers[event][prio].append(func)
 
 
+def unsubscribe(event: str, func):
+    if event not in _sdm_subscribers:
+        raise SDMEventNotFound(event)
+    for funcs in _sdm_subscribers[event].values():
+        if func in funcs:
+            funcs.remove(func)
+
+
+def get_run():
+    """Returns the run that events posted now belong to, or None if not posted in a run"""
+    return _run.get()
+
+
+@contextlib.contextmanager
+def run_context(run):
+    """Events posted in the with block, and in threads started with bind_run, belong to run"""
+    token = _run.set(run)
+    try:
+        yield
+    finally:
+        _run.reset(token)
+
+
+def bind_run(func):
+    """Returns func wrapped to be called in the run of the calling thread. New threads and thread pools do not
+    inherit the run, so wrap the functions given to them."""
+    run = _run.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with run_context(run):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def collect_events():
+    """Collects the events posted by the current thread instead of passing them to the subscribers. Yields a list
+    of (event, data) tuples that can be posted later with post_events."""
+    events = []
+    previous = getattr(_local, 'collected_events', None)
+    _local.collected_events = events
+    try:
+        yield events
+    finally:
+        _local.collected_events = previous
+
+
+def post_events(events):
+    for event, data in events:
+        post_event(event, data)
+
+
 def post_event(event: str, data=None):
     if event not in _sdm_subscribers:
         raise SDMEventNotFound(event)
+    collected_events = getattr(_local, 'collected_events', None)
+    if collected_events is not None:
+        collected_events.append((event, data))
+        return
     for prio in sorted(_sdm_subscribers[event]):
-        for func in _sdm_subscribers[event][prio]:
+        # Copy since subscribers are allowed to unsubscribe when called
+        for func in list(_sdm_subscribers[event][prio]):
             func(data)
 
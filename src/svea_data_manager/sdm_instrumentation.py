@@ -0,0 +1,246 @@
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from svea_data_manager.sdm_event import post_event, subscribe, unsubscribe, get_run
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+PHASES = ['read_packages', 'transform_packages', 'write_packages']
+
+
+@contextlib.contextmanager
+def timed(section, instrument=None):
+    """Measures the time spent in the with block and posts it as an on_timing event"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        post_event('on_timing', dict(section=section, instrument=instrument, duration=time.perf_counter() - start))
+
+
+def count(counter, instrument=None, value=1):
+    """Adds value to the given counter by posting an on_count event"""
+    post_event('on_count', dict(counter=counter, instrument=instrument, value=value))
+
+
+class SDMInstrumentation:
+    """Collects timers and counters of a run from the sdm events and writes them as a json report. Timers are given
+    per phase (read, transform and write) and per instrument and section (discover, classify, copy, svn_list,
+    svn_commit etc). Counters are given per instrument (files and bytes copied, directory listings etc). The
+    syscalls_stat and syscalls_scandir counters tell how many file system calls the source discovery, the
+    classification cache and the FileStorage listings and plans made. Optionally a profiler (cProfile or pyinstrument) runs from before_read_packages to
+    after_write_packages. The profiler only samples the thread running the manager, not the worker threads.
+
+    Only the events posted in run (see sdm_event.run_context) are collected, so that runs made at the same time in
+    other threads (e.g. parallel jobs of the Flet app) are not counted. A SveaDataManager sets itself as the run of
+    its instrumentation. With run None the events of all runs are collected.
+
+    The report is written after_write_packages. Give finish_after_write=False to collect several runs (e.g. parallel
+    jobs of the cli) into one report and call finish when all of them are done. Overlapping phases of parallel runs
+    are timed from the first start to the last stop."""
+
+    def __init__(self, report_directory=None, profiler=None, finish_after_write=True, run=None):
+        if profiler and profiler not in PROFILERS:
+            msg = f'Unknown profiler {profiler}. Use one of: {", ".join(PROFILERS)}'
+            logger.error(msg)
+            raise ValueError(msg)
+        self._report_directory = Path(report_directory) if report_directory else None
+        self._profiler_name = profiler
+        self._profiler = None
+        self._lock = threading.Lock()
+        # Start time and number of runs in the phase, by phase
+        self._phase_start = {}
+        self._phases = {}
+        self._sections = {}
+        self._counters = {}
+        self._started = None
+        self._finished = None
+        self._report_path = None
+        self.run = run
+        self._subscriptions = [
+            ('on_timing', self._on_timing),
+            ('on_count', self._on_count),
+            ('on_resource_added', self._on_resource_added),
+            ('on_resource_rejected', self._on_resource_rejected),
+            ('on_transform_add_file', self._on_transform_add_file),
+            ('on_target_path_exists', self._on_target_path_exists),
+            ('on_file_copied', self._on_file_copied),
+            ('on_file_appended', self._on_file_appended),
+            ('on_svn_storage_prepared', self._on_svn_prepared),
+        ]
+        for phase in PHASES:
+            self._subscriptions.append((f'before_{phase}', functools.partial(self._on_phase_start, phase)))
+            self._subscriptions.append((f'after_{phase}', functools.partial(self._on_phase_stop, phase)))
+        self._subscriptions = [(event, self._in_run(func)) for event, func in self._subscriptions]
+        for event, func in self._subscriptions:
+            subscribe(event, func)
+        if finish_after_write:
+            # Low priority so that the write phase is stopped before the report is written.
+            func = self._in_run(self._on_after_write_packages)
+            self._subscriptions.append(('after_write_packages', func))
+            subscribe('after_write_packages', func, prio=100)
+
+    @property
+    def report_path(self):
+        return self._report_path
+
+    def _in_run(self, func):
+        """Wraps the event handler func so that it is only called for events posted in the run"""
+        def handler(data):
+            if self.run is None or get_run() is self.run:
+                func(data)
+        return handler
+
+    def _on_phase_start(self, phase, data):
+        if not self._started:
+            self._started = datetime.datetime.now()
+            self._start_profiler()
+        with self._lock:
+            start, nr_running = self._phase_start.get(phase, (time.perf_counter(), 0))
+            self._phase_start[phase] = (start, nr_running + 1)
+
+    def _on_phase_stop(self, phase, data):
+        with self._lock:
+            if phase not in self._phase_start:
+                return
+            start, nr_running = self._phase_start.pop(phase)
+            if nr_running > 1:
+                self._phase_start[phase] = (start, nr_running - 1)
+                return
+            self._phases[phase] = self._phases.get(phase, 0) + time.perf_counter() - start
+
+    def _on_timing(self, data):
+        with self._lock:
+            sections = self._sections.setdefault(self._instrument_key(data), {})
+            section = sections.setdefault(data['section'], dict(duration=0, count=0))
+            section['duration'] += data['duration']
+            section['count'] += 1
+
+    def _on_count(self, data):
+        self._add_to_counter(data['counter'], data, data.get('value', 1))
+
+    def _on_resource_added(self, data):
+        self._add_to_counter('resources_added', data)
+
+    def _on_resource_rejected(self, data):
+        self._add_to_counter('resources_rejected', data)
+
+    def _on_transform_add_file(self, data):
+        self._add_to_counter('transform_added_files', data)
+
+    def _on_target_path_exists(self, data):
+        self._add_to_counter('target_path_exists', data)
+
+    def _on_file_copied(self, data):
+        self._add_to_counter('files_copied', data)
+        if data.get('strategy'):
+            self._add_to_counter(f'files_copied_{data["strategy"]}', data)
+        if data.get('size') is not None:
+            self._add_to_counter('bytes_copied', data, data['size'])
+
+    def _on_file_appended(self, data):
+        self._add_to_counter('files_appended', data)
+        self._add_to_counter('bytes_appended', data, data['nr_bytes_appended'])
+
+    def _on_svn_prepared(self, data):
+        self._add_to_counter('svn_prepared', data)
+
+    def _on_after_write_packages(self, data):
+        self.finish()
+
+    def _add_to_counter(self, counter, data, value=1):
+        with self._lock:
+            counters = self._counters.setdefault(self._instrument_key(data), {})
+            counters[counter] = counters.get(counter, 0) + value
+
+    @staticmethod
+    def _instrument_key(data):
+        instrument = data.get('instrument')
+        return instrument.upper() if instrument else 'ALL'
+
+    def _start_profiler(self):
+        if self._profiler_name == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self._profiler_name == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                msg = 'Profiler pyinstrument is not installed. Install it or use cprofile.'
+                logger.error(msg)
+                raise
+            self._profiler = pyinstrument.Profiler()
+            self._profiler.start()
+
+    def _stop_profiler(self, root_directory=None):
+        """Stops the profiler and writes the profile to root_directory (if given). Returns the path to the profile."""
+        profiler, self._profiler = self._profiler, None
+        if not profiler:
+            return None
+        if self._profiler_name == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        if not root_directory:
+            return None
+        if self._profiler_name == 'cprofile':
+            path = Path(root_directory, 'profile.prof')
+            profiler.dump_stats(path)
+        else:
+            path = Path(root_directory, 'profile.html')
+            path.write_text(profiler.output_html(), encoding='utf8')
+        return path
+
+    def get_report(self):
+        with self._lock:
+            finished = self._finished or datetime.datetime.now()
+            return dict(
+                started=self._started.isoformat() if self._started else None,
+                finished=finished.isoformat(),
+                duration=(finished - self._started).total_seconds() if self._started else None,
+                phases=dict(self._phases),
+                sections={key: {name: dict(value) for name, value in sections.items()}
+                          for key, sections in self._sections.items()},
+                counters={key: dict(counters) for key, counters in self._counters.items()},
+            )
+
+    def finish(self):
+        """Stops the profiler, writes the report if a report directory is given and stops listening to events.
+        Called automatically after_write_packages. Call it if the run is aborted."""
+        if self._finished:
+            return
+        self._finished = datetime.datetime.now()
+        for event, func in self._subscriptions:
+            unsubscribe(event, func)
+        if self._report_directory:
+            self._report_path = self.write_report(self._report_directory)
+        else:
+            self._stop_profiler()
+
+    def write_report(self, directory):
+        """Writes the report (and profile) to a time stamped directory under the given directory, the same way as
+        SDMLogger.write_reports, and returns the path to the report file"""
+        root_directory = Path(directory, datetime.datetime.now().strftime('%Y%m%d_%H%M'))
+        root_directory.mkdir(parents=True, exist_ok=True)
+        report = self.get_report()
+        profile_path = self._stop_profiler(root_directory)
+        if profile_path:
+            report['profile'] = str(profile_path)
+        path = Path(root_directory, 'timing_report.json')
+        with open(path, 'w', encoding='utf8') as fid:
+            json.dump(report, fid, indent=2)
+        logger.info(f'Timing report written to {path}')
+        return path
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(report_directory=config.get('report_directory'), profiler=config.get('profiler'), **kwargs)
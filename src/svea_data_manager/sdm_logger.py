@@ -32,6 +32,7 @@ class SDMLogger:
             target_path_exists={},
             transform_added_files={},
             files_copied={},
+            files_appended={},
             svn_prepared={},
             log=[],
             before_read_packages={},
@@ -47,6 +48,7 @@ class SDMLogger:
         subscribe('on_resource_rejected', self._on_resource_rejected)
         subscribe('on_target_path_exists', self._on_target_path_exists)
         subscribe('on_file_copied', self._on_file_copied)
+        subscribe('on_file_appended', self._on_file_appended)
         subscribe('on_svn_storage_prepared', self._on_svn_prepared)
         subscribe('on_transform_add_file', self.on_transform_add_file)
         subscribe('log', self._on_log)
@@ -72,6 +74,10 @@ class SDMLogger:
         self._callbacks['files_copied'].setdefault(data['instrument'].upper(), [])
         self._callbacks['files_copied'][data['instrument'].upper()].append(data['target_path'])
 
+    def _on_file_appended(self, data):
+        self._callbacks['files_appended'].setdefault(data['instrument'].upper(), [])
+        self._callbacks['files_appended'][data['instrument'].upper()].append(data['target_path'])
+
     def _on_svn_prepared(self, data):
         self._callbacks['svn_prepared'].setdefault(data['instrument'].upper(), [])
         self._callbacks['svn_prepared'][data['instrument'].upper()].append(data['target_path'])
@@ -117,6 +123,12 @@ class SDMLogger:
         else:
             return self._callbacks['files_copied']
 
+    def get_files_appended(self, instrument=None):
+        if instrument:
+            return self._callbacks['files_appended'][instrument.upper()]
+        else:
+            return self._callbacks['files_appended']
+
     def get_nr_resources_added(self, instrument=None):
         if instrument:
             return self._get_len(self._callbacks['resources_added'].get(instrument.upper()))
@@ -147,6 +159,12 @@ class SDMLogger:
         else:
             return dict((key, len(values)) for key, values in self._callbacks['files_copied'].items())
 
+    def get_nr_files_appended(self, instrument=None):
+        if instrument:
+            return self._get_len(self._callbacks['files_appended'].get(instrument.upper()))
+        else:
+            return dict((key, len(values)) for key, values in self._callbacks['files_appended'].items())
+
     def get_nr_svn_prepared(self, instrument=None):
         if instrument:
             return self._get_len(self._callbacks['svn_prepared'].get(instrument.upper()))
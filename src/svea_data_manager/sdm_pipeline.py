@@ -0,0 +1,262 @@
+"""Pipelined executor: reads, transforms and writes packages in overlapping stages connected by bounded queues.
+
+    reader thread -> transform queue -> transform workers -> write queue -> writer thread
+
+The reader reads one instrument at a time and hands each package to the transform stage as soon as the
+instrument has been read. Each package goes on to the writer as soon as it has been transformed. So one
+instrument is written while the next one is read, and packages are written while others are transformed. The
+bounded queues stop the reader when the later stages fall behind.
+
+finish_transform of an instrument is called when all its packages have been transformed. Packages added by
+finish_transform (e.g. the IFCB result package) are written after that. Instruments with transform_barrier are
+transformed as a whole with transform_packages, and their packages are written only after that.
+
+With stream=True, instruments with stream_packages are read with iter_packages: each package is passed on as soon
+as the directory walk has left its directory, and is released when it has been written. Memory use is then bounded
+by the queue sizes instead of the size of the source directory.
+
+Packages of instruments with the configuration write_workers > 1 are written by a thread pool. Their events are
+posted by the writer thread in the order the packages were queued."""
+import collections
+import datetime
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from svea_data_manager.sdm_event import post_event, post_events, bind_run
+from svea_data_manager.sdm_instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+
+class _PipelineAborted(Exception):
+    """Raised in the stages when another stage has failed"""
+    pass
+
+
+class _InstrumentState:
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.nr_read = 0
+        self.nr_transformed = 0
+        self.read_done = False
+        self.queued_keys = set()
+        self.started_writing = False
+        # Streamed packages are not kept in instrument.packages
+        self.streaming = False
+        # Packages of instruments without parallel_transform are transformed one at a time
+        self.transform_lock = threading.Lock()
+
+
+class Pipeline:
+    """Runs read, transform and write for the instruments of a SveaDataManager as a pipeline. Posts the same
+    before_ and after_ events as the phased run, but the phases overlap. The first error in any stage stops the
+    pipeline and is raised by run."""
+
+    def __init__(self, sdm, transform_workers=2, queue_size=50, resume=False, stream=True):
+        self._sdm = sdm
+        self._nr_transform_workers = max(1, int(transform_workers))
+        self._resume = resume
+        self._stream = stream
+        self._transform_queue = queue.Queue(maxsize=queue_size)
+        self._write_queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._aborted = threading.Event()
+        self._error = None
+        self._states = [_InstrumentState(instrument) for instrument in sdm.instruments]
+
+    def run(self):
+        post_event('before_read_packages')
+        post_event('before_transform_packages')
+        post_event('before_write_packages')
+        post_event('log', dict(msg=f'Running pipeline with {self._nr_transform_workers} transform workers'))
+        reader = self._start_thread(self._read, 'sdm_pipeline_read')
+        transformers = [self._start_thread(self._transform, f'sdm_pipeline_transform_{nr}')
+                        for nr in range(self._nr_transform_workers)]
+        writer = self._start_thread(self._write, 'sdm_pipeline_write')
+
+        reader.join()
+        for thread in transformers:
+            thread.join()
+        if not self._aborted.is_set():
+            post_event('after_transform_packages')
+            try:
+                self._put(self._write_queue, None)
+            except _PipelineAborted:
+                pass
+        writer.join()
+        if self._error:
+            raise self._error
+        post_event('after_write_packages')
+
+    def _start_thread(self, func, name):
+        thread = threading.Thread(target=bind_run(self._run_stage), args=(func,), name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def _run_stage(self, func):
+        try:
+            func()
+        except _PipelineAborted:
+            pass
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._aborted.set()
+
+    def _put(self, q, item):
+        while True:
+            if self._aborted.is_set():
+                raise _PipelineAborted()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while True:
+            if self._aborted.is_set():
+                raise _PipelineAborted()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _read(self):
+        for state in self._states:
+            instrument = state.instrument
+            if self._stream and instrument.stream_packages and not instrument.transform_barrier:
+                self._read_streamed(state)
+                continue
+            with timed('read', instrument.name):
+                instrument.read_packages()
+            if instrument.transform_barrier:
+                self._put(self._transform_queue, (state, None))
+                continue
+            for package in instrument.packages:
+                with self._lock:
+                    state.nr_read += 1
+                    state.queued_keys.add(str(package))
+                self._put(self._transform_queue, (state, package))
+            with self._lock:
+                state.read_done = True
+                last = state.nr_transformed == state.nr_read
+            if last:
+                self._finish_transform(state)
+        post_event('after_read_packages')
+        for _ in range(self._nr_transform_workers):
+            self._put(self._transform_queue, None)
+
+    def _read_streamed(self, state):
+        state.streaming = True
+        for package in state.instrument.iter_packages():
+            with self._lock:
+                state.nr_read += 1
+            self._put(self._transform_queue, (state, package))
+        with self._lock:
+            state.read_done = True
+            last = state.nr_transformed == state.nr_read
+        if last:
+            self._finish_transform(state)
+
+    def _transform(self):
+        while True:
+            item = self._get(self._transform_queue)
+            if item is None:
+                return
+            state, package = item
+            instrument = state.instrument
+            if package is None:
+                with timed('transform', instrument.name):
+                    instrument.transform_packages()
+                for package in instrument.packages:
+                    self._put(self._write_queue, (state, package))
+                self._put(self._write_queue, (state, None))
+                continue
+            self._sdm.cancel_token.check(f'Transforming package {package} was cancelled')
+            with timed('transform', instrument.name):
+                if instrument.parallel_transform:
+                    instrument.transform_package(package)
+                else:
+                    with state.transform_lock:
+                        instrument.transform_package(package)
+            # Queued before it is counted so that the package is written before the instrument is finished.
+            self._put(self._write_queue, (state, package))
+            with self._lock:
+                state.nr_transformed += 1
+                last = state.read_done and state.nr_transformed == state.nr_read
+            if last:
+                self._finish_transform(state)
+
+    def _finish_transform(self, state):
+        """Called once for every instrument without transform_barrier, when all its packages are transformed"""
+        instrument = state.instrument
+        with timed('transform', instrument.name):
+            instrument.finish_transform()
+        for package in instrument.packages:
+            if not state.streaming and str(package) in state.queued_keys:
+                continue
+            state.queued_keys.add(str(package))
+            self._put(self._write_queue, (state, package))
+        # Tells the writer that the instrument is done
+        self._put(self._write_queue, (state, None))
+
+    def _write(self):
+        nr_write_workers = {state: state.instrument._get_nr_workers('write_workers') for state in self._states}
+        max_nr_write_workers = max(nr_write_workers.values(), default=1)
+        executor = ThreadPoolExecutor(max_workers=max_nr_write_workers) if max_nr_write_workers > 1 else None
+        # (package, future) of packages written by the executor that have not been finished by the writer thread
+        pending = collections.deque()
+        write_package = bind_run(self._write_package_in_worker)
+        try:
+            while True:
+                item = self._get(self._write_queue)
+                if item is None:
+                    self._finish_writes(pending)
+                    return
+                state, package = item
+                instrument = state.instrument
+                if package is None:
+                    self._finish_writes(pending)
+                    # All packages of the instrument are written
+                    instrument.journal.clear()
+                    instrument.journal.save()
+                    post_event('on_stop_write', dict(time=datetime.datetime.now()))
+                    continue
+                self._sdm.cancel_token.check(f'Writing package {package} was cancelled')
+                state.started_writing = True
+                if nr_write_workers[state] > 1:
+                    pending.append((package, executor.submit(write_package, instrument, package)))
+                    self._finish_writes(pending, max_pending=2 * max_nr_write_workers)
+                    continue
+                # Written in the writer thread after the pending packages to keep the order of the events
+                self._finish_writes(pending)
+                with timed('write', instrument.name):
+                    instrument.write_journaled_package(package, resume=self._resume)
+        finally:
+            if executor:
+                for package, future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+            for state in self._states:
+                if state.started_writing:
+                    state.instrument.journal.save()
+
+    def _write_package_in_worker(self, instrument, package):
+        with timed('write', instrument.name):
+            return instrument.write_package_collecting_events(package, resume=self._resume)
+
+    @staticmethod
+    def _finish_writes(pending, max_pending=0):
+        """Posts the events of the pending packages in order until at most max_pending are left. Raises the error
+        of the first failed package."""
+        while pending and (len(pending) > max_pending or pending[0][1].done()):
+            package, future = pending.popleft()
+            events, written, error = future.result()
+            post_events(events)
+            if error is not None:
+                raise error
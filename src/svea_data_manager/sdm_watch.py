@@ -0,0 +1,359 @@
+"""Watch mode: archives files continuously as the instruments produce them.
+
+New and changed files are detected with inotify (Linux) or, where inotify is not available, by polling the source
+directories. A file is added to its package first when it has settled, i.e. not changed for settle_time seconds, so
+that partially written files are not archived. A package is transformed and written when no file has been added to
+it for package_idle_time seconds, or at the latest max_latency seconds after its first file was added."""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import stat
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+from svea_data_manager.frameworks import PackageCollection
+from svea_data_manager.frameworks import exceptions
+from svea_data_manager.sdm_event import post_event
+from svea_data_manager.sdm_instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+WATCH_METHODS = ['auto', 'inotify', 'polling']
+
+# From sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def _walk_files(directory):
+    """Returns a dict with path as key and (size, mtime_ns) as value for all files under directory"""
+    files = {}
+    try:
+        entries = list(os.scandir(directory))
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return files
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                files.update(_walk_files(entry.path))
+            elif entry.is_file():
+                entry_stat = entry.stat()
+                files[Path(entry.path)] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+        except FileNotFoundError:
+            continue
+    return files
+
+
+class PollingWatcher:
+    """Finds new and changed files by scanning the directory tree every poll_interval seconds"""
+    method = 'polling'
+
+    def __init__(self, root_directory, poll_interval=10, initial_scan=True):
+        self._root_directory = Path(root_directory)
+        self._poll_interval = poll_interval
+        self._snapshot = {} if initial_scan else _walk_files(self._root_directory)
+        self._last_poll = None
+
+    def read_changes(self):
+        """Returns a set with the paths of the files that are new or changed since the last call"""
+        now = time.monotonic()
+        if self._last_poll is not None and now - self._last_poll < self._poll_interval:
+            return set()
+        self._last_poll = now
+        snapshot = _walk_files(self._root_directory)
+        changes = {path for path, signature in snapshot.items() if self._snapshot.get(path) != signature}
+        self._snapshot = snapshot
+        return changes
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Finds new and changed files with inotify. Every directory in the tree is watched. Directories created
+    later are added when they show up."""
+    method = 'inotify'
+
+    def __init__(self, root_directory, initial_scan=True):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, f'inotify not found in {libc_name}')
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._root_directory = Path(root_directory)
+        self._watches = {}
+        try:
+            files = self._add_tree(self._root_directory)
+        except OSError:
+            self.close()
+            raise
+        self._initial_changes = files if initial_scan else set()
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), INOTIFY_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(error, f'Could not watch directory {directory}: {os.strerror(error)}')
+        self._watches[wd] = Path(directory)
+
+    def _add_tree(self, directory):
+        """Watches directory and all sub directories. The watches are added before the files are listed so that
+        no file is missed. Returns the files found."""
+        files = set()
+        for root, dirs, file_names in os.walk(directory):
+            self._add_watch(root)
+            files.update(Path(root, name) for name in file_names)
+        return files
+
+    def read_changes(self):
+        """Returns a set with the paths of the files that are new or changed since the last call"""
+        changes, self._initial_changes = self._initial_changes, set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning(f'inotify queue overflow. Rescanning {self._root_directory}')
+                    changes.update(self._add_tree(self._root_directory))
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = Path(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        changes.update(self._add_tree(path))
+                    continue
+                changes.add(path)
+        return changes
+
+    def close(self):
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+
+
+def get_file_watcher(root_directory, method='auto', poll_interval=10, initial_scan=True):
+    """Returns an InotifyWatcher if possible (and method is auto or inotify), else a PollingWatcher"""
+    if method not in WATCH_METHODS:
+        msg = f'Unknown watch method {method}. Use one of: {", ".join(WATCH_METHODS)}'
+        logger.error(msg)
+        raise ValueError(msg)
+    if method in ['auto', 'inotify']:
+        try:
+            return InotifyWatcher(root_directory, initial_scan=initial_scan)
+        except OSError as e:
+            if method == 'inotify':
+                logger.error(e)
+                raise
+            logger.warning(f'Could not use inotify for {root_directory} ({e}). Polling every {poll_interval} s.')
+    return PollingWatcher(root_directory, poll_interval=poll_interval, initial_scan=initial_scan)
+
+
+class InstrumentWatch:
+    """Keeps track of the files and packages of one instrument in watch mode"""
+
+    def __init__(self, instrument, file_watcher, settle_time=5, package_idle_time=30, max_latency=600):
+        self.instrument = instrument
+        self._file_watcher = file_watcher
+        self._settle_time = settle_time
+        self._package_idle_time = package_idle_time
+        self._max_latency = max_latency
+        # Files not yet settled. Path as key and ((size, mtime_ns), time first seen with that signature) as value.
+        self._pending = {}
+        # Signature of the files already added, so that they are not added again until they change.
+        self._added = {}
+        # Package key by path for files added to packages not yet written.
+        self._unwritten = {}
+        self._first_activity = {}
+        self._last_activity = {}
+        self.instrument.packages = PackageCollection()
+
+    def close(self):
+        self._file_watcher.close()
+
+    def update(self):
+        """Adds the files that have settled to their packages. Returns the number of files added."""
+        now = time.monotonic()
+        for path in self._file_watcher.read_changes():
+            self._pending.setdefault(path, None)
+        nr_added = 0
+        for path, observed in list(self._pending.items()):
+            try:
+                path_stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            if not stat.S_ISREG(path_stat.st_mode):
+                del self._pending[path]
+                continue
+            signature = (path_stat.st_size, path_stat.st_mtime_ns)
+            if self._added.get(path) == signature:
+                del self._pending[path]
+                continue
+            if observed is None or observed[0] != signature:
+                observed = self._pending[path] = (signature, now)
+            # Timed from when the signature was first seen and not from mtime, since files copied with their mtime
+            # preserved have an old mtime while they are written.
+            if now - observed[1] < self._settle_time:
+                continue
+            del self._pending[path]
+            self._added[path] = signature
+            self._add_file(path, now)
+            nr_added += 1
+        return nr_added
+
+    def _add_file(self, path, now):
+        key = self._unwritten.get(path)
+        if key is None:
+            source_file = path.relative_to(self.instrument.source_directory)
+            try:
+                resource = self.instrument.add_file(source_file)
+            except exceptions.RunCancelled:
+                raise
+            except Exception as e:
+                msg = f'Could not add file {path} in watch mode: {e}'
+                logger.error(msg)
+                post_event('log', dict(msg=msg))
+                return
+            if not resource:
+                return
+            key = str(self.instrument.get_package_key_for_resource(resource))
+            self._unwritten[path] = key
+        # A file that changes after it has been added is already in its package. The latest content is written.
+        self._first_activity.setdefault(key, now)
+        self._last_activity[key] = now
+
+    def get_complete_package_keys(self, now=None):
+        """Returns the keys of the packages that are idle or have reached max_latency"""
+        now = now or time.monotonic()
+        keys = []
+        for key, last in self._last_activity.items():
+            if now - last >= self._package_idle_time or now - self._first_activity[key] >= self._max_latency:
+                keys.append(key)
+        return keys
+
+    def get_package_keys(self):
+        return list(self._last_activity)
+
+    def write_packages(self, package_keys):
+        """Transforms and writes the packages with the given keys. Files added later to the same package keys end
+        up in new packages that are written later on. Each batch is transformed on its own, so instruments making
+        a summary package in finish_transform (e.g. the IFCB result) make one per batch."""
+        instrument = self.instrument
+        package_keys = set(package_keys)
+        for key in package_keys:
+            self._first_activity.pop(key, None)
+            self._last_activity.pop(key, None)
+        self._unwritten = {path: key for path, key in self._unwritten.items() if key not in package_keys}
+        remaining = instrument.packages
+        instrument.packages = instrument.detach_packages(package_keys)
+        if not len(instrument.packages):
+            instrument.packages = remaining
+            return
+        msg = f'Writing {len(instrument.packages)} complete packages for {instrument.name}'
+        logger.info(msg)
+        post_event('log', dict(msg=msg))
+        try:
+            with timed('transform', instrument.name):
+                instrument.transform_packages()
+            with timed('write', instrument.name):
+                instrument.write_packages(resume=True)
+        except exceptions.RunCancelled:
+            raise
+        except Exception as e:
+            # The watch goes on. The packages are written again the next time the source directory is scanned.
+            msg = f'Could not write packages for {instrument.name} in watch mode: {e}'
+            logger.exception(msg)
+            post_event('log', dict(msg=msg))
+        finally:
+            instrument.packages = remaining
+            instrument.save_classification_cache()
+
+
+class Watcher:
+    """Archives files for the instruments of a SveaDataManager as they appear in the source directories. run blocks
+    until stop is called (from another thread or a signal handler) or the run is cancelled. On stop the packages
+    collected so far are written. Files that have not yet settled are left for the next watch or run. Files already
+    in the source directories when the watch starts are archived as well if initial_scan is True. Packages already
+    written in an earlier run are skipped (see Instrument.write_packages with resume)."""
+
+    def __init__(self, sdm, interval=1, settle_time=5, package_idle_time=30, max_latency=600, method='auto',
+                 poll_interval=10, initial_scan=True):
+        self._sdm = sdm
+        self._interval = interval
+        self._settle_time = settle_time
+        self._package_idle_time = package_idle_time
+        self._max_latency = max_latency
+        self._method = method
+        self._poll_interval = poll_interval
+        self._initial_scan = initial_scan
+        self._stop_event = threading.Event()
+        self._watches = []
+
+    def stop(self):
+        """Stops the watch after the packages collected so far have been written"""
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        cancel_token = self._sdm.cancel_token
+        try:
+            for instrument in self._sdm.instruments:
+                file_watcher = get_file_watcher(instrument.source_directory, method=self._method,
+                                                poll_interval=self._poll_interval, initial_scan=self._initial_scan)
+                msg = f'Watching {instrument.source_directory} for {instrument.name} ({file_watcher.method})'
+                logger.info(msg)
+                post_event('log', dict(msg=msg))
+                self._watches.append(InstrumentWatch(instrument, file_watcher,
+                                                     settle_time=self._settle_time,
+                                                     package_idle_time=self._package_idle_time,
+                                                     max_latency=self._max_latency))
+            while not self._stop_event.is_set():
+                cancel_token.check('Watch was cancelled')
+                for watch in self._watches:
+                    watch.update()
+                    keys = watch.get_complete_package_keys()
+                    if keys:
+                        watch.write_packages(keys)
+                self._stop_event.wait(self._interval)
+            post_event('log', dict(msg='Stopping watch. Writing remaining packages...'))
+            for watch in self._watches:
+                cancel_token.check('Watch was cancelled')
+                watch.update()
+                watch.write_packages(watch.get_package_keys())
+        finally:
+            for watch in self._watches:
+                watch.close()
+            self._watches = []
@@ -0,0 +1,210 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+
+from svea_data_manager import SveaDataManager
+from svea_data_manager import RESERVED_CONFIG_KEYS
+from svea_data_manager import helpers
+from svea_data_manager.frameworks import exceptions
+
+logger = logging.getLogger(__name__)
+
+JobCancelled = exceptions.RunCancelled
+
+
+class ArchiveJob:
+    """Reads, transforms and writes the packages for the instruments in config. The job can be cancelled from
+    another thread and then stops before the next package. With dry_run the packages are only planned (see plan).
+    With resume packages written in an earlier run are skipped (see Instrument.write_packages). With pipelined the
+    phases overlap (see SveaDataManager.run_pipelined)."""
+
+    def __init__(self, config, on_finished=None, dry_run=False, resume=False, pipelined=False,
+                 transform_workers=2):
+        self._config = config
+        self._on_finished = on_finished
+        self._dry_run = dry_run
+        self._resume = resume
+        self._pipelined = pipelined
+        self._transform_workers = transform_workers
+        self._plan = None
+        self._cancel_event = threading.Event()
+        self._sdm = None
+        self._error = None
+        self._traceback = None
+        self._done = threading.Event()
+
+    def __str__(self):
+        return ', '.join(self.instruments)
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def instruments(self):
+        return [key for key in self._config if key not in RESERVED_CONFIG_KEYS]
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def dry_run(self):
+        return self._dry_run
+
+    @property
+    def plan(self):
+        """WritePlan made by a dry run job. None until the job is done."""
+        return self._plan
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def traceback(self):
+        return self._traceback
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self._sdm:
+            self._sdm.cancel()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            msg = f'Job for {self} was cancelled'
+            logger.warning(msg)
+            raise JobCancelled(msg)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run_phases(self, sdm):
+        for step in [sdm.read_packages, sdm.transform_packages]:
+            self.check_cancelled()
+            step()
+        self.check_cancelled()
+        if self._dry_run:
+            self._plan = sdm.plan_packages()
+        else:
+            # The temp directory might be in use by other jobs. It is cleared by the JobWorker when idle.
+            sdm.write_packages(clear_temp_dir=False, resume=self._resume)
+
+    def run(self):
+        try:
+            self.check_cancelled()
+            self._sdm = sdm = SveaDataManager.from_config(self._config)
+            if self.cancelled:
+                sdm.cancel()
+            if self._pipelined and not self._dry_run:
+                sdm.run_pipelined(resume=self._resume, transform_workers=self._transform_workers,
+                                  clear_temp_dir=False)
+            else:
+                self._run_phases(sdm)
+        except Exception as e:
+            self._error = e
+            self._traceback = traceback.format_exc()
+            if not isinstance(e, JobCancelled):
+                logger.critical(self._traceback)
+        finally:
+            if self._sdm and self._sdm.instrumentation:
+                # Writes the timing report also when the job failed or was cancelled
+                self._sdm.instrumentation.finish()
+            self._done.set()
+            if self._on_finished:
+                self._on_finished(self)
+
+
+class JobWorker:
+    """Runs ArchiveJobs from a queue in nr_threads background threads. on_idle is called (from a worker thread)
+    every time the queue has been emptied and all running jobs are finished."""
+
+    def __init__(self, nr_threads=1, on_idle=None):
+        self._queue = queue.Queue()
+        self._on_idle = on_idle
+        self._lock = threading.Lock()
+        self._nr_unfinished = 0
+        self._jobs = []
+        self._threads = []
+        for nr in range(max(1, nr_threads)):
+            thread = threading.Thread(target=self._work, name=f'sdm_worker_{nr}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def busy(self):
+        return self._nr_unfinished > 0
+
+    @property
+    def jobs(self):
+        """Jobs that are queued or running"""
+        with self._lock:
+            return [job for job in self._jobs if not job.done]
+
+    def submit(self, job):
+        with self._lock:
+            self._nr_unfinished += 1
+            self._jobs.append(job)
+        self._queue.put(job)
+        return job
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def stop(self):
+        self.cancel_all()
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.run()
+            with self._lock:
+                self._nr_unfinished -= 1
+                self._jobs = [job for job in self._jobs if not job.done]
+                idle = self._nr_unfinished == 0
+            if idle:
+                helpers.clear_temp_dir()
+                if self._on_idle:
+                    self._on_idle()
+
+
+class ThrottledCallback:
+    """Wraps func so that it is called at most once every interval seconds. Calls in between are merged into one
+    call made when the interval has passed, so the last call is never lost."""
+
+    def __init__(self, func, interval=0.2):
+        self._func = func
+        self._interval = interval
+        self._last_call = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._timer:
+                return
+            wait = self._last_call + self._interval - time.monotonic()
+            if wait > 0:
+                self._timer = threading.Timer(wait, self._call)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+            self._last_call = time.monotonic()
+        self._func()
+
+    def _call(self):
+        with self._lock:
+            self._timer = None
+            self._last_call = time.monotonic()
+        self._func()
@@ -0,0 +1,52 @@
+import datetime
+import pathlib
+
+import pytest
+
+START_TIME = datetime.datetime(2024, 1, 10, 6, 0)
+
+
+@pytest.fixture(autouse=True)
+def sdm_directories(tmp_path, monkeypatch):
+    """Keeps temp files and caches of the tested code out of the home directory"""
+    from svea_data_manager import helpers
+    monkeypatch.setattr(helpers, 'TEMP_DIRECTORY', tmp_path / 'sdm_temp')
+    monkeypatch.setattr(helpers, 'CACHE_DIRECTORY', tmp_path / 'sdm_cache')
+
+
+def write_file(path, content=b'\x00' * 1024):
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, str):
+        path.write_text(content)
+    else:
+        path.write_bytes(content)
+    return path
+
+
+@pytest.fixture
+def ferrybox_source(tmp_path):
+    """Ferrybox daily files (All_sensors, GPS and CO2FT device data) for three days"""
+    root = tmp_path / 'ferrybox_source'
+    for nr in range(3):
+        date = START_TIME + datetime.timedelta(days=nr)
+        write_file(root / 'Ferrybox' / f'All_sensors_{date:%Y-%m-%d}.txt')
+        write_file(root / 'Ferrybox' / 'Working' / 'GPS' / f'GPS_{date:%Y%m%d}.txt')
+        write_file(root / 'Ferrybox' / 'Working' / 'CO2FT_A' / f'CO2FT {date:%Y%m%d} 120000.txt')
+    return root
+
+
+@pytest.fixture
+def ifcb_source(tmp_path):
+    """IFCB samples (adc, hdr and roi) with classifier mat files on two days"""
+    root = tmp_path / 'ifcb_source'
+    for nr in range(6):
+        time = START_TIME + datetime.timedelta(hours=8 * nr)
+        stem = f'D{time:%Y%m%dT%H%M%S}_IFCB134'
+        directory = root / 'data' / f'{time:%Y}' / f'D{time:%Y%m%d}'
+        write_file(directory / f'{stem}.adc')
+        write_file(directory / f'{stem}.roi')
+        write_file(directory / f'{stem}.hdr', f'sampleTime: {time:%Y-%m-%d %H:%M:%S}\n'
+                                              f'gpsLatitude: 57.1234\ngpsLongitude: 11.5678\n')
+        write_file(root / 'class' / f'{time:%Y}' / f'{stem}_class_v1.mat')
+    return root
@@ -0,0 +1,30 @@
+import datetime
+import os
+import pathlib
+
+from svea_data_manager import helpers
+from svea_data_manager.instruments.adcp import ADCP, ADCPResourceRaw
+
+from .conftest import write_file
+
+
+def test_start_date_cache_has_one_entry_per_file_when_the_file_grows(tmp_path):
+    source = tmp_path / 'adcp_source'
+    rel_path = pathlib.Path('raw', '01', 'ADCPOS150_77SE_2022_01_000_00000.LOG')
+    path = write_file(source / rel_path, 'header\nstart 2022/01/11 12:00\n')
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument = ADCP(dict(source_directory=str(source), target_directory=str(target)))
+    resource = ADCPResourceRaw.from_source_file(source, rel_path)
+
+    assert instrument._get_start_date(resource) == datetime.date(2022, 1, 11)
+    with open(path, 'a') as fid:
+        fid.write('ping 2022/01/12 08:00\n')
+    # Make sure that the modification time changes even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert instrument._get_start_date(resource) == datetime.date(2022, 1, 11)
+
+    assert list(instrument._date_cache.data) == [str(path)]
+    assert instrument._date_cache.get(str(path)) == helpers.get_file_signature(path) + ['2022-01-11']
+
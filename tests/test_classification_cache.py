@@ -0,0 +1,64 @@
+import os
+
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.sdm_instrumentation import SDMInstrumentation
+
+
+def _read(source, target, monkeypatch):
+    """Reads the packages of a new instrument. Returns the instrument and the source files it classified."""
+    instrument = Ferrybox(dict(source_directory=str(source), target_directory=str(target)))
+    classified = []
+    prepare_resource = instrument.prepare_resource
+
+    def prepare_resource_counted(source_file):
+        classified.append(source_file.as_posix())
+        return prepare_resource(source_file)
+
+    monkeypatch.setattr(instrument, 'prepare_resource', prepare_resource_counted)
+    instrument.read_packages()
+    return instrument, sorted(classified)
+
+
+def test_unchanged_files_are_not_classified_again(tmp_path, ferrybox_source, monkeypatch):
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument, classified = _read(ferrybox_source, target, monkeypatch)
+    nr_source_files = len([path for path in ferrybox_source.rglob('*') if path.is_file()])
+    assert len(classified) == nr_source_files
+
+    instrumentation = SDMInstrumentation()
+    cached, classified = _read(ferrybox_source, target, monkeypatch)
+    instrumentation.finish()
+    assert classified == []
+    assert instrumentation.get_report()['counters']['FERRYBOX']['classification_cache_hits'] == nr_source_files
+    assert sorted(str(package) for package in cached.packages) == \
+           sorted(str(package) for package in instrument.packages)
+    assert sorted(str(resource.target_path) for package in cached.packages for resource in package.resources) == \
+           sorted(str(resource.target_path) for package in instrument.packages for resource in package.resources)
+
+
+def test_files_with_new_size_or_mtime_are_classified_again(tmp_path, ferrybox_source, monkeypatch):
+    target = tmp_path / 'target'
+    target.mkdir()
+    _read(ferrybox_source, target, monkeypatch)
+    grown = ferrybox_source / 'Ferrybox' / 'All_sensors_2024-01-10.txt'
+    with open(grown, 'ab') as fid:
+        fid.write(b'more')
+    touched = ferrybox_source / 'Ferrybox' / 'All_sensors_2024-01-11.txt'
+    stat = touched.stat()
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    instrument, classified = _read(ferrybox_source, target, monkeypatch)
+    assert classified == ['Ferrybox/All_sensors_2024-01-10.txt', 'Ferrybox/All_sensors_2024-01-11.txt']
+
+
+def test_deleted_files_are_removed_from_the_cache(tmp_path, ferrybox_source, monkeypatch):
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument, classified = _read(ferrybox_source, target, monkeypatch)
+    os.remove(ferrybox_source / 'Ferrybox' / 'All_sensors_2024-01-10.txt')
+
+    instrument, classified = _read(ferrybox_source, target, monkeypatch)
+    cache_data = instrument.classification_cache._cache.data
+    assert 'Ferrybox/All_sensors_2024-01-10.txt' not in cache_data
+    assert 'Ferrybox/All_sensors_2024-01-11.txt' in cache_data
@@ -0,0 +1,29 @@
+import json
+
+import yaml
+
+from svea_data_manager import cli
+
+
+def test_run_writes_one_timing_report_for_all_jobs(tmp_path, ferrybox_source, ifcb_source, capsys):
+    report_directory = tmp_path / 'reports'
+    config = dict(
+        instrumentation=dict(report_directory=str(report_directory)),
+        Ferrybox=dict(source_directory=str(ferrybox_source), target_directory=str(tmp_path / 'ferrybox_target')),
+        IFCB=dict(source_directory=str(ifcb_source), target_directory=str(tmp_path / 'ifcb_target')),
+    )
+    for name in ['ferrybox_target', 'ifcb_target']:
+        (tmp_path / name).mkdir()
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config))
+
+    assert cli.main(['run', str(config_path), '--workers', '2', '--no-progress']) == cli.EXIT_OK
+
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    reports = list(report_directory.rglob('timing_report.json'))
+    assert len(reports) == 1
+    assert summary['timing_report'] == str(reports[0])
+    counters = json.loads(reports[0].read_text())['counters']
+    for instrument, nr_files in summary['files_copied'].items():
+        assert counters[instrument]['files_copied'] == nr_files
+    assert counters['IFCB']['transform_added_files'] == summary['transform_added_files']['IFCB']
@@ -0,0 +1,109 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from svea_data_manager.frameworks import ContainerStorage, Package, Resource
+from svea_data_manager.frameworks.container import TarContainer
+
+
+class FailingReader(io.BytesIO):
+    """Fails after the first bytes have been read, as a source file on a lost network share"""
+
+    def read(self, size=-1):
+        if self.tell() > 0:
+            raise OSError('Source went away')
+        return super().read(min(size, 100))
+
+
+def _members(contents):
+    return [(name, io.BytesIO(content), len(content)) for name, content in contents.items()]
+
+
+def _read_all(container):
+    return {name: container.open_member(name).read() for name in container.members}
+
+
+@pytest.fixture
+def contents():
+    return {f'file_{nr}.bin': os.urandom(700 * (nr + 1)) for nr in range(4)}
+
+
+def test_interrupted_append_keeps_existing_members(tmp_path, contents):
+    container = TarContainer(tmp_path / 'day.tar')
+    container.append(_members(dict(list(contents.items())[:2])))
+    with pytest.raises(OSError):
+        container.append([('file_2.bin', io.BytesIO(contents['file_2.bin']), len(contents['file_2.bin'])),
+                          ('file_3.bin', FailingReader(contents['file_3.bin']), len(contents['file_3.bin']))])
+
+    reopened = TarContainer(tmp_path / 'day.tar')
+    assert _read_all(reopened) == dict(list(contents.items())[:2])
+
+    # The next append overwrites the incomplete members
+    reopened.append(_members(dict(list(contents.items())[2:])))
+    assert _read_all(TarContainer(tmp_path / 'day.tar')) == contents
+    with tarfile.open(tmp_path / 'day.tar') as tar:
+        assert sorted(tar.getnames()) == sorted(contents)
+
+
+def test_index_is_rebuilt_after_interrupted_append(tmp_path, contents):
+    container = TarContainer(tmp_path / 'day.tar')
+    container.append(_members(dict(list(contents.items())[:2])))
+    with pytest.raises(OSError):
+        container.append([('file_2.bin', io.BytesIO(contents['file_2.bin']), len(contents['file_2.bin'])),
+                          ('file_3.bin', FailingReader(contents['file_3.bin']), len(contents['file_3.bin']))])
+    # As if the process died before the index was written
+    os.remove(container.index_path)
+
+    rebuilt = TarContainer(tmp_path / 'day.tar')
+    # file_2.bin was completely written before the failure. The incomplete file_3.bin is not a member.
+    assert _read_all(rebuilt) == dict(list(contents.items())[:3])
+    assert rebuilt.index_path.exists()
+
+    rebuilt.append(_members({'file_3.bin': contents['file_3.bin']}))
+    assert _read_all(TarContainer(tmp_path / 'day.tar')) == contents
+
+
+def test_index_is_rebuilt_for_empty_container(tmp_path, contents):
+    (tmp_path / 'day.tar').write_bytes(b'')
+    container = TarContainer(tmp_path / 'day.tar')
+    assert container.members == {}
+    container.append(_members(contents))
+    assert _read_all(TarContainer(tmp_path / 'day.tar')) == contents
+
+
+def test_container_storage_rewrites_package_after_interrupted_append(tmp_path, contents, monkeypatch):
+    source = tmp_path / 'source'
+    for name, content in contents.items():
+        (source / 'day' / name).parent.mkdir(parents=True, exist_ok=True)
+        (source / 'day' / name).write_bytes(content)
+    target = tmp_path / 'target'
+    target.mkdir()
+
+    def package():
+        package = Package('day', instrument='TEST')
+        for name in contents:
+            package.resources.add(Resource(source, f'day/{name}'))
+        return package
+
+    open_resource = ContainerStorage._open_resource
+
+    def fail_on_last_file(resource, stack):
+        fid, size = open_resource(resource, stack)
+        if resource.source_path.name == 'file_3.bin':
+            return FailingReader(fid.read()), size
+        return fid, size
+
+    monkeypatch.setattr(ContainerStorage, '_open_resource', staticmethod(fail_on_last_file))
+    with pytest.raises(OSError):
+        ContainerStorage(target, container_directories=['day']).write(package())
+    monkeypatch.setattr(ContainerStorage, '_open_resource', staticmethod(open_resource))
+
+    # The whole package is appended at once, so no index was written. It is rebuilt from the complete members.
+    assert not TarContainer.for_directory(target / 'day').index_path.exists()
+    ContainerStorage(target, container_directories=['day']).write(package())
+
+    container = TarContainer.for_directory(target / 'day')
+    assert _read_all(container) == contents
+    assert not (target / 'day').exists()
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from svea_data_manager.frameworks import file_copy
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / 'source.bin'
+    path.write_bytes(os.urandom(3000))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def clear_unsupported(monkeypatch):
+    monkeypatch.setattr(file_copy, '_unsupported', set())
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='os.copy_file_range is not available')
+def test_copy_file_range_copying_nothing_falls_back_to_buffered(tmp_path, source_path, monkeypatch):
+    monkeypatch.setattr(os, 'copy_file_range', lambda *args: 0)
+    target_path = tmp_path / 'target.bin'
+    strategy = file_copy.copy_file(source_path, target_path, [file_copy.COPY_FILE_RANGE, file_copy.BUFFERED])
+    assert strategy == file_copy.BUFFERED
+    assert target_path.read_bytes() == source_path.read_bytes()
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='os.copy_file_range is not available')
+def test_incomplete_copy_file_range_falls_back_to_buffered(tmp_path, source_path, monkeypatch):
+    copy_file_range = os.copy_file_range
+    calls = []
+
+    def stop_after_first_chunk(src, dst, count, offset_src, offset_dst):
+        calls.append(offset_src)
+        if len(calls) > 1:
+            return 0
+        return copy_file_range(src, dst, min(count, 1000), offset_src, offset_dst)
+
+    monkeypatch.setattr(os, 'copy_file_range', stop_after_first_chunk)
+    target_path = tmp_path / 'target.bin'
+    strategy = file_copy.copy_file(source_path, target_path, [file_copy.COPY_FILE_RANGE, file_copy.BUFFERED])
+    assert strategy == file_copy.BUFFERED
+    assert target_path.read_bytes() == source_path.read_bytes()
+    # A short copy does not mark the strategy as unsupported for the file systems
+    assert not file_copy._unsupported
+
+
+def test_incomplete_copy_raises_if_no_strategy_left(tmp_path, source_path, monkeypatch):
+    monkeypatch.setitem(file_copy._copy_functions, file_copy.BUFFERED,
+                        lambda source, target, size: file_copy._check_copied(size - 1, size))
+    with pytest.raises(file_copy.CopyStrategyNotSupported):
+        file_copy.copy_file(source_path, tmp_path / 'target.bin', [file_copy.BUFFERED])
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='os.copy_file_range is not available')
+def test_append_file_falls_back_when_copy_file_range_stops(tmp_path, source_path, monkeypatch):
+    target_path = tmp_path / 'target.bin'
+    target_path.write_bytes(source_path.read_bytes()[:1000])
+    monkeypatch.setattr(os, 'copy_file_range', lambda *args: 0)
+    assert file_copy.append_file(source_path, target_path, 1000) == 2000
+    assert target_path.read_bytes() == source_path.read_bytes()
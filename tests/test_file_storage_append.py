@@ -0,0 +1,101 @@
+import errno
+import os
+
+import pytest
+
+from svea_data_manager.frameworks import FileStorage, Package, PlanItem, Resource
+from svea_data_manager.frameworks import file_copy
+
+
+@pytest.fixture
+def source_directory(tmp_path):
+    directory = tmp_path / 'source'
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def target_directory(tmp_path):
+    directory = tmp_path / 'target'
+    directory.mkdir()
+    return directory
+
+
+def _package(source_directory, name):
+    package = Package('daily', instrument='TEST')
+    package.resources.add(Resource(source_directory, name))
+    return package
+
+
+def _plan_item(storage, source_directory, name):
+    return storage.plan(_package(source_directory, name)).items[0]
+
+
+def _write_once(source_directory, target_directory, name, content):
+    (source_directory / name).write_bytes(content)
+    FileStorage(target_directory, append_patterns=['daily_*']).write(_package(source_directory, name))
+
+
+def test_grown_file_is_appended(source_directory, target_directory):
+    content = os.urandom(5000)
+    _write_once(source_directory, target_directory, 'daily_1.txt', content)
+    with open(source_directory / 'daily_1.txt', 'ab') as fid:
+        fid.write(os.urandom(3000))
+
+    storage = FileStorage(target_directory, append_patterns=['daily_*'])
+    package = _package(source_directory, 'daily_1.txt')
+    plan = storage.plan(package)
+    item = plan.items[0]
+    assert item.action == PlanItem.APPEND
+    assert item.offset == 5000
+    assert plan.nr_bytes_to_append == 3000
+
+    storage.write(package, plan=plan)
+    assert (target_directory / 'daily_1.txt').read_bytes() == (source_directory / 'daily_1.txt').read_bytes()
+
+
+def test_file_with_same_size_is_skipped(source_directory, target_directory):
+    _write_once(source_directory, target_directory, 'daily_1.txt', os.urandom(5000))
+    storage = FileStorage(target_directory, append_patterns=['daily_*'])
+    assert _plan_item(storage, source_directory, 'daily_1.txt').action == PlanItem.SKIP
+
+
+def test_changed_file_that_has_not_only_grown_is_a_conflict(source_directory, target_directory):
+    content = os.urandom(5000)
+    _write_once(source_directory, target_directory, 'daily_1.txt', content)
+    changed = bytearray(content)
+    changed[-1] ^= 0xff
+    (source_directory / 'daily_1.txt').write_bytes(bytes(changed) + os.urandom(100))
+
+    storage = FileStorage(target_directory, append_patterns=['daily_*'])
+    item = _plan_item(storage, source_directory, 'daily_1.txt')
+    assert item.action == PlanItem.CONFLICT
+    storage.write(_package(source_directory, 'daily_1.txt'))
+    assert (target_directory / 'daily_1.txt').read_bytes() == content
+
+
+def test_grown_file_not_matching_append_patterns_is_a_conflict(source_directory, target_directory):
+    _write_once(source_directory, target_directory, 'other_1.txt', os.urandom(5000))
+    with open(source_directory / 'other_1.txt', 'ab') as fid:
+        fid.write(os.urandom(100))
+
+    storage = FileStorage(target_directory, append_patterns=['daily_*'])
+    assert _plan_item(storage, source_directory, 'other_1.txt').action == PlanItem.CONFLICT
+
+
+def test_append_fails_if_target_changed_size_after_plan(source_directory, target_directory):
+    _write_once(source_directory, target_directory, 'daily_1.txt', os.urandom(5000))
+    with open(source_directory / 'daily_1.txt', 'ab') as fid:
+        fid.write(os.urandom(100))
+    storage = FileStorage(target_directory, append_patterns=['daily_*'])
+    package = _package(source_directory, 'daily_1.txt')
+    plan = storage.plan(package)
+    assert plan.items[0].action == PlanItem.APPEND
+    with open(target_directory / 'daily_1.txt', 'ab') as fid:
+        fid.write(b'written by someone else')
+
+    with pytest.raises(OSError) as error:
+        file_copy.append_file(source_directory / 'daily_1.txt', target_directory / 'daily_1.txt', 5000)
+    assert error.value.errno == errno.EAGAIN
+    with pytest.raises(OSError):
+        storage.write(package, plan=plan)
@@ -0,0 +1,48 @@
+from ifcb.hdr_file import HdrFile, convert_hdr_value, read_hdr_fields, read_hdr_table
+
+from .conftest import write_file
+
+HDR_CONTENT = '''softwareVersion: Imaging FlowCytobot Acquire 2.4.1.0
+sampleTime: 2024-01-10 06:00:00
+gpsLatitude: 57.1234
+gpsLongitude: N/A
+runTime:  1200.5 
+triggerPulse: true
+'''
+
+
+def test_values_containing_colons_are_kept_intact(tmp_path):
+    path = write_file(tmp_path / 'D20240110T060000_IFCB134.hdr', HDR_CONTENT)
+    fields = read_hdr_fields(path)
+    assert fields['sampleTime'] == '2024-01-10 06:00:00'
+    assert fields['runTime'] == '1200.5'
+    assert HdrFile(path).get('sampleTime') == '2024-01-10 06:00:00'
+
+
+def test_not_available_values(tmp_path):
+    path = write_file(tmp_path / 'D20240110T060000_IFCB134.hdr', HDR_CONTENT)
+    assert read_hdr_fields(path, ['gpsLongitude']) == dict(gpsLongitude='N/A')
+    assert convert_hdr_value('N/A') is None
+    hdr_file = HdrFile(path)
+    assert hdr_file.get('gpsLongitude') is None
+    assert hdr_file.lat == '57.1234'
+    assert hdr_file.lon == ''
+    assert hdr_file.metadata == dict(latitude='57.1234', longitude='', quality_flag='B')
+
+
+def test_reading_stops_when_the_requested_keys_are_found(tmp_path):
+    path = write_file(tmp_path / 'D20240110T060000_IFCB134.hdr',
+                      f'{HDR_CONTENT}gpsLatitude: 99.0\nrunTime: 0\n')
+    assert read_hdr_fields(path, ['gpsLatitude', 'runTime']) == dict(gpsLatitude='57.1234', runTime='1200.5')
+    assert read_hdr_fields(path)['gpsLatitude'] == '99.0'
+    assert read_hdr_fields(path, ['gpsLatitude', 'missingKey']) == dict(gpsLatitude='99.0')
+
+
+def test_values_are_converted_in_the_table(tmp_path):
+    paths = [write_file(tmp_path / f'D2024011{nr}T060000_IFCB134.hdr', HDR_CONTENT) for nr in range(3)]
+    table = read_hdr_table(paths, ['runTime', 'triggerPulse', 'gpsLongitude', 'missingKey'])
+    assert table['path'] == paths
+    assert table['runTime'] == [1200.5] * 3
+    assert table['triggerPulse'] == [True] * 3
+    assert table['gpsLongitude'] == [None] * 3
+    assert table['missingKey'] == [None] * 3
@@ -0,0 +1,25 @@
+import threading
+
+from svea_data_manager import helpers
+
+
+def test_caches_with_the_same_name_can_be_saved_at_the_same_time():
+    caches = [helpers.PersistentCache('shared') for _ in range(8)]
+    for nr, cache in enumerate(caches):
+        cache.set('key', nr)
+    barrier = threading.Barrier(len(caches))
+
+    def save(cache):
+        barrier.wait()
+        for _ in range(20):
+            cache._changed = True
+            cache.save()
+
+    threads = [threading.Thread(target=save, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert helpers.PersistentCache('shared').get('key') in range(len(caches))
+    assert [path.name for path in caches[0].path.parent.iterdir()] == ['shared.json']
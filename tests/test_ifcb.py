@@ -0,0 +1,39 @@
+import datetime
+import pathlib
+import types
+
+from svea_data_manager.instruments import ifcb
+from svea_data_manager.instruments.ifcb import IFCB, IFCBResourceResult
+
+
+class FrozenDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 10, 12, 0, 0)
+
+
+def test_results_made_within_the_same_second_get_unique_names(tmp_path, ifcb_source, monkeypatch):
+    monkeypatch.setattr(ifcb, 'datetime', types.SimpleNamespace(datetime=FrozenDatetime))
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument = IFCB(dict(source_directory=str(ifcb_source), target_directory=str(target)))
+    instrument.read_packages()
+    all_packages = instrument.packages
+    keys = sorted(str(package) for package in all_packages)
+
+    # Two batches as written by the watch mode
+    for batch in [keys[:3], keys[3:]]:
+        instrument.packages = all_packages
+        instrument.packages = instrument.detach_packages(batch)
+        instrument.transform_packages()
+        instrument.write_packages()
+
+    results = sorted(path.name for path in (target / 'IFCB134' / 'results').iterdir())
+    assert results == ['result_IFCB134_20240110_120000.txt', 'result_IFCB134_20240110_120000.zip',
+                       'result_IFCB134_20240110_120000_2.txt', 'result_IFCB134_20240110_120000_2.zip']
+
+
+def test_numbered_result_file_is_recognized(tmp_path):
+    resource = IFCBResourceResult.from_source_file(tmp_path, pathlib.Path('result_IFCB134_20240110_120000_2.zip'))
+    assert resource.attributes['nr'] == '2'
+    assert resource.package_key == 'D20240110T120000_IFCB134_2'
@@ -0,0 +1,28 @@
+"""Heavy modules are imported first when they are needed, checked in a fresh interpreter"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ['yaml', 'scipy', 'numpy', 'pandas', 'shapely', 'flet', 'ifcb']
+
+# Only needed to run pipelined or in watch mode. sdm_watch sets up inotify with ctypes.
+RUN_MODE_MODULES = ['svea_data_manager.sdm_pipeline', 'svea_data_manager.sdm_watch', 'ctypes']
+
+
+def _get_imported_modules(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    result = subprocess.run([sys.executable, '-c', f'{code}\nimport sys\nprint("\\n".join(sys.modules))'], env=env,
+                            check=True, capture_output=True, text=True)
+    return set(result.stdout.split())
+
+
+@pytest.mark.parametrize('code, not_imported', [
+    ('import svea_data_manager', HEAVY_MODULES + RUN_MODE_MODULES + ['svea_data_manager.instruments.ifcb']),
+    ('from svea_data_manager import instruments; instruments.get_instrument_class("CTD")',
+     HEAVY_MODULES + RUN_MODE_MODULES + ['svea_data_manager.instruments.ifcb', 'svea_data_manager.instruments.adcp']),
+    ('from svea_data_manager.instruments import IFCB', HEAVY_MODULES),
+], ids=['package', 'ctd', 'ifcb'])
+def test_heavy_modules_not_imported(code, not_imported):
+    assert not _get_imported_modules(code) & set(not_imported)
@@ -0,0 +1,47 @@
+import threading
+
+from svea_data_manager import SveaDataManager
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.sdm_instrumentation import SDMInstrumentation
+
+
+def _get_manager(tmp_path, source, name, instrumentation=None):
+    target = tmp_path / name
+    target.mkdir()
+    instrument = Ferrybox(dict(source_directory=str(source), target_directory=str(target), write_workers=2))
+    return SveaDataManager([instrument], instrumentation=instrumentation)
+
+
+def test_runs_at_the_same_time_are_counted_in_their_own_report(tmp_path, ferrybox_source):
+    nr_source_files = len([path for path in ferrybox_source.rglob('*') if path.is_file()])
+    first = SDMInstrumentation()
+    second = SDMInstrumentation()
+    managers = [_get_manager(tmp_path, ferrybox_source, 'first', first),
+                _get_manager(tmp_path, ferrybox_source, 'second', second),
+                _get_manager(tmp_path, ferrybox_source, 'third')]
+
+    threads = [threading.Thread(target=managers[0].run_pipelined),
+               threading.Thread(target=managers[1].run),
+               threading.Thread(target=managers[2].run)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for instrumentation in [first, second]:
+        counters = instrumentation.get_report()['counters']
+        assert counters['FERRYBOX']['files_copied'] == nr_source_files
+        assert counters['FERRYBOX']['resources_added'] == nr_source_files
+
+
+def test_file_system_calls_are_counted(tmp_path, ferrybox_source):
+    instrumentation = SDMInstrumentation()
+    manager = _get_manager(tmp_path, ferrybox_source, 'target', instrumentation)
+    manager.run()
+    nr_source_files = len([path for path in ferrybox_source.rglob('*') if path.is_file()])
+    nr_source_directories = len([path for path in ferrybox_source.rglob('*') if path.is_dir()])
+
+    counters = instrumentation.get_report()['counters']['FERRYBOX']
+    # Discovery and classification cache stat each source file. Discovery lists each source directory.
+    assert counters['syscalls_stat'] == nr_source_directories + 2 * nr_source_files
+    assert counters['syscalls_scandir'] == nr_source_directories + 1 + counters['directory_listings']
@@ -0,0 +1,94 @@
+import collections
+import json
+
+import pytest
+
+from svea_data_manager import SveaDataManager
+from svea_data_manager.frameworks import FileStorage, exceptions
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.sdm_event import subscribe, unsubscribe
+
+NR_FILES_BEFORE_CANCEL = 4
+
+
+@pytest.fixture
+def copied_files():
+    copied = collections.Counter()
+
+    def on_file_copied(data):
+        copied[data['target_path']] += 1
+
+    subscribe('on_file_copied', on_file_copied)
+    yield copied
+    unsubscribe('on_file_copied', on_file_copied)
+
+
+@pytest.fixture
+def written_packages(monkeypatch):
+    written = collections.Counter()
+    write_journaled_package = Ferrybox.write_journaled_package
+
+    def count_written(self, package, **kwargs):
+        result = write_journaled_package(self, package, **kwargs)
+        if result:
+            written[str(package)] += 1
+        return result
+
+    monkeypatch.setattr(Ferrybox, 'write_journaled_package', count_written)
+    return written
+
+
+@pytest.mark.parametrize('write_workers', [1, 4])
+def test_resume_after_cancel_writes_every_package_once(tmp_path, ferrybox_source, monkeypatch, copied_files,
+                                                       written_packages, write_workers):
+    target = tmp_path / 'target'
+    target.mkdir()
+    config = dict(source_directory=str(ferrybox_source), target_directory=str(target), write_workers=write_workers)
+
+    instrument = Ferrybox(config)
+    instrument.read_packages()
+    nr_packages = len(list(instrument.packages))
+    write_file = FileStorage._write_file
+    nr_files = [0]
+
+    def cancel_after_some_files(*args):
+        result = write_file(*args)
+        nr_files[0] += 1
+        if nr_files[0] == NR_FILES_BEFORE_CANCEL:
+            instrument.cancel()
+        return result
+
+    monkeypatch.setattr(FileStorage, '_write_file', staticmethod(cancel_after_some_files))
+    with pytest.raises(exceptions.RunCancelled):
+        instrument.write_packages(resume=True)
+    monkeypatch.setattr(FileStorage, '_write_file', staticmethod(write_file))
+    assert 0 < sum(written_packages.values()) < nr_packages
+
+    resumed = Ferrybox(config)
+    resumed.read_packages()
+    resumed.write_packages(resume=True)
+
+    source_files = [path for path in ferrybox_source.rglob('*') if path.is_file()]
+    assert len(copied_files) == len(source_files)
+    assert set(copied_files.values()) == {1}
+    assert all(path.exists() for path in copied_files)
+    assert len(written_packages) == nr_packages
+    assert set(written_packages.values()) == {1}
+
+    # The journal is only kept for interrupted runs
+    assert json.loads(resumed.journal._cache.path.read_text()) == {}
+
+    # A third run finds all files in the storage and copies nothing
+    again = Ferrybox(config)
+    again.read_packages()
+    again.write_packages(resume=True)
+    assert set(copied_files.values()) == {1}
+
+
+def test_journal_is_cleared_when_a_pipelined_run_finishes(tmp_path, ferrybox_source):
+    target = tmp_path / 'target'
+    target.mkdir()
+    instrument = Ferrybox(dict(source_directory=str(ferrybox_source), target_directory=str(target)))
+    SveaDataManager([instrument]).run_pipelined(resume=True)
+
+    assert json.loads(instrument.journal._cache.path.read_text()) == {}
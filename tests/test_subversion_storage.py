@@ -0,0 +1,71 @@
+import pathlib
+import xml.etree.ElementTree as ET
+
+from svea_data_manager.frameworks import Package, Resource, SubversionStorage, storage
+
+from .conftest import write_file
+
+
+class FakeSubversionStorage(SubversionStorage):
+    """SubversionStorage working against an in-memory repository instead of the svn and svnmucc executables"""
+
+    def __init__(self, root_url):
+        super().__init__(root_url)
+        self.directories = {self.ROOT_DIRECTORY}
+        self.files = {}
+        self.commits = []
+
+    def _run_svn_command(self, *args, **kwargs):
+        directory = pathlib.PurePosixPath(args[-1][len(self._root_url):].lstrip('/') or '.')
+        if directory not in self.directories:
+            raise SubversionStorage.SubversionError(f"svn: E200009: '{args[-1]}' non-existent in revision 1")
+        lists = ET.Element('lists')
+        list_element = ET.SubElement(lists, 'list')
+        for path in self.directories:
+            if path != self.ROOT_DIRECTORY and path.parent == directory:
+                ET.SubElement(ET.SubElement(list_element, 'entry', kind='dir'), 'name').text = path.name
+        for path, size in self.files.items():
+            if path.parent == directory:
+                entry = ET.SubElement(list_element, 'entry', kind='file')
+                ET.SubElement(entry, 'name').text = path.name
+                ET.SubElement(entry, 'size').text = str(size)
+        return ET.tostring(lists, encoding='unicode')
+
+    def _run_svn_multi_command(self, *args, **kwargs):
+        args = list(args)
+        directories = set(self.directories)
+        files = dict(self.files)
+        while args:
+            action = args.pop(0)
+            if action == 'mkdir':
+                path = pathlib.PurePosixPath(args.pop(0))
+                if path in directories:
+                    raise SubversionStorage.SubversionError(f"svnmucc: E160020: Path '{path}' already exists")
+                directories.add(path)
+            elif action == 'put':
+                source_path, path = args.pop(0), pathlib.PurePosixPath(args.pop(0))
+                if path.parent not in directories:
+                    raise SubversionStorage.SubversionError(f"svnmucc: E160013: Path '{path.parent}' not found")
+                files[path] = pathlib.Path(source_path).stat().st_size
+        self.directories = directories
+        self.files = files
+        self.commits.append(kwargs.get('commit_message'))
+
+def test_planned_packages_with_the_same_new_parent_are_executed(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.shutil, 'which', lambda name: f'/usr/bin/{name}')
+    svn_storage = FakeSubversionStorage('https://svn.example.org/repo')
+    source = tmp_path / 'source'
+    packages = []
+    for key in ['cast_1', 'cast_2']:
+        write_file(source / '2024' / 'cnv' / f'{key}.cnv')
+        package = Package(key, instrument='CTD')
+        package.resources.add(Resource(source, pathlib.Path('2024', 'cnv', f'{key}.cnv')))
+        packages.append(package)
+
+    plans = [svn_storage.plan(package) for package in packages]
+    for package, plan in zip(packages, plans):
+        svn_storage.write(package, plan=plan)
+
+    assert len(svn_storage.commits) == 2
+    assert sorted(svn_storage.files) == [pathlib.PurePosixPath('2024/cnv/cast_1.cnv'),
+                                         pathlib.PurePosixPath('2024/cnv/cast_2.cnv')]
@@ -0,0 +1,60 @@
+import os
+
+from svea_data_manager import sdm_watch
+from svea_data_manager.instruments.ferrybox import Ferrybox
+from svea_data_manager.sdm_watch import InstrumentWatch
+
+from .conftest import write_file
+
+SETTLE_TIME = 5
+
+
+class FakeFileWatcher:
+
+    def __init__(self):
+        self.changes = []
+
+    def read_changes(self):
+        changes, self.changes = self.changes, []
+        return changes
+
+    def close(self):
+        pass
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_file_with_old_mtime_is_added_when_it_has_not_changed_for_settle_time(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sdm_watch.time, 'monotonic', clock.monotonic)
+    source = tmp_path / 'source'
+    target = tmp_path / 'target'
+    target.mkdir()
+    path = write_file(source / 'Ferrybox' / 'All_sensors_2024-01-10.txt')
+    # Copied with the modification time preserved (cp -p) while it is still being written
+    os.utime(path, (0, 0))
+    file_watcher = FakeFileWatcher()
+    watch = InstrumentWatch(Ferrybox(dict(source_directory=str(source), target_directory=str(target))),
+                            file_watcher, settle_time=SETTLE_TIME)
+
+    file_watcher.changes.append(path)
+    assert watch.update() == 0
+
+    clock.now += SETTLE_TIME - 1
+    with open(path, 'ab') as fid:
+        fid.write(b'more')
+    os.utime(path, (0, 0))
+    file_watcher.changes.append(path)
+    assert watch.update() == 0
+
+    clock.now += SETTLE_TIME - 1
+    assert watch.update() == 0
+    clock.now += 1
+    assert watch.update() == 1